@@ -0,0 +1,115 @@
+"""Load test: requests/sec against the local JSON API (api/server.py).
+
+Runs add-task writes and root-page reads over several keep-alive
+connections, one request in flight per connection, pipelined, and through
+/batch. Without --port or --unix it starts a server on a temporary
+database in this process; otherwise it targets the running instance (and
+adds tasks to it).
+
+Usage: python benchmarks/bench_api.py [--requests N] [--connections C] [--depth D]
+                                      [--host H --port P | --unix PATH]
+"""
+import os
+import sys
+import json
+import shutil
+import asyncio
+import argparse
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from db import database, shards
+from api.server import ApiServer, HOST
+
+
+def encode(method, path, body=None):
+    data = b'' if body is None else json.dumps(body).encode()
+    return f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data
+
+
+async def read_response(reader):
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while (line := await reader.readline()) != b'\r\n':
+        name, _, value = line.decode().partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def run_connection(connect, requests, depth):
+    """Sends ``requests`` keeping up to ``depth`` of them in flight; returns the count of non-2xx answers."""
+    reader, writer = await connect()
+    failures = 0
+    try:
+        for start in range(0, len(requests), depth):
+            chunk = requests[start:start + depth]
+            writer.write(b''.join(chunk))
+            for _ in chunk:
+                failures += not 200 <= await read_response(reader) < 300
+    finally:
+        writer.close()
+    return failures
+
+
+async def measure(connect, label, requests, connections, depth, weight=1):
+    """Spreads ``requests`` over ``connections``; ``weight`` is how many operations one request carries."""
+    shares = [requests[n::connections] for n in range(connections)]
+    start = time.perf_counter()
+    failures = sum(await asyncio.gather(*(run_connection(connect, share, depth) for share in shares)))
+    elapsed = time.perf_counter() - start
+    operations = len(requests) * weight
+    print(f"  {label:34} {operations / elapsed:9.0f} ops/s  ({operations} in {elapsed:.2f} s"
+          f"{f', {failures} failed' if failures else ''})")
+
+
+async def run(args, connect):
+    count, connections, depth = args.requests, args.connections, args.depth
+    add = [encode('POST', '/tasks', {'title': f'load {n}'}) for n in range(count)]
+    read = [encode('GET', '/tasks/roots?limit=20') for _ in range(count)]
+    batch_size = depth
+    batches = [encode('POST', '/batch', {'requests': [{'method': 'POST', 'path': '/tasks', 'body': {'title': f'batch {n}'}}
+                                                      for n in range(batch_size)]})
+               for _ in range(max(1, count // batch_size))]
+
+    print(f"{count} requests over {connections} connections")
+    for label, requests in (("add task", add), ("root page", read)):
+        await measure(connect, f"{label}, 1 in flight", requests, connections, 1)
+        await measure(connect, f"{label}, pipelined x{depth}", requests, connections, depth)
+    await measure(connect, f"add task, /batch of {batch_size}", batches, connections, 1, weight=batch_size)
+
+
+async def main(args):
+    if args.port or args.unix:
+        connect = (lambda: asyncio.open_unix_connection(args.unix)) if args.unix else \
+                  (lambda: asyncio.open_connection(args.host, args.port))
+        await run(args, connect)
+        return
+
+    tmp_dir = tempfile.mkdtemp()
+    database.configure(path=os.path.join(tmp_dir, 'bench.db'))
+    database.create_table()
+    server = await ApiServer().start(port=0)
+    try:
+        host, port = server.address[:2]
+        await run(args, lambda: asyncio.open_connection(host, port))
+        print(f"  server: {server.requests} requests, {server.writes.commits} commits")
+    finally:
+        await server.close()
+        shards.close_all()
+        database.get_manager().close_all()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--connections', type=int, default=8)
+    parser.add_argument('--depth', type=int, default=32, help="pipelining depth and /batch size")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int)
+    parser.add_argument('--unix', metavar='PATH')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,64 @@
+"""Benchmark: clearing a large task tree, row-by-row DELETE vs. database.clear_tasks.
+
+Also reports the file size before and after an idle-time maintenance run.
+
+Usage: python benchmarks/bench_clear.py [task_count]
+"""
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from db import database, maintenance
+from logic.task_manager import TaskManager
+
+
+def populate(tm, task_count, batch=50000):
+    """Adds ``task_count`` tasks as parent/child pairs plus a dependency chain over the parents."""
+    for first in range(0, task_count, batch):
+        pairs = min(batch, task_count - first) // 2
+        tm.add_tasks([{'title': f'task {first + n}', 'description': 'benchmark task',
+                       'children': [{'title': f'task {first + n}.1'}]} for n in range(pairs)])
+    roots = [row[0] for row in database.fetch_all("SELECT id FROM tasks WHERE parent_id IS NULL LIMIT 10000")]
+    with database.transaction() as conn:
+        conn.executemany("INSERT INTO task_dependencies (task_id, depends_on) VALUES (?, ?)",
+                         zip(roots[1:], roots))
+
+
+def file_size(conn):
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return os.path.getsize(database.DATABASE_PATH) / 2**20
+
+
+def main(task_count=200000):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        for label, clear in (("DELETE FROM tasks", lambda: database.execute("DELETE FROM tasks")),
+                             ("clear_tasks", database.clear_tasks)):
+            database.configure(path=os.path.join(tmp_dir, f'bench-{len(label)}.db'))
+            database.create_table()
+            populate(TaskManager(), task_count)
+            conn = database.get_connection()
+            before = file_size(conn)
+
+            start = time.perf_counter()
+            clear()
+            elapsed = time.perf_counter() - start
+            print(f"{label}: {task_count} tasks in {elapsed:.2f} s, file {before:.1f} MiB -> {file_size(conn):.1f} MiB")
+
+            runs = 0
+            while True:
+                runs += 1
+                if not maintenance.run()['reclaimable_pages']:
+                    break
+            print(f"  after {runs} maintenance run(s) of {maintenance.BUDGET} s: {file_size(conn):.1f} MiB")
+    finally:
+        database.get_manager().close_all()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
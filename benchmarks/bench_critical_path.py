@@ -0,0 +1,95 @@
+"""Benchmark: critical-path schedule over a 50k-node dependency graph.
+
+Times the full O(V + E) computation and the incremental updates after a
+status change or a new edge, both on the bare Schedule and through
+TaskManager (which also reads the graph from SQLite).
+
+Usage: python benchmarks/bench_critical_path.py [node_count]
+"""
+import os
+import sys
+import random
+import shutil
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from db import database
+from logic.dependency_graph import Schedule
+from logic.task_manager import TaskManager
+
+TODAY = 20000  # 纪元日，约为 2024-10
+
+
+def build_edges(node_count, rng, fan_in=2, reach=50):
+    """Each task depends on up to ``fan_in`` of the ``reach`` tasks created just before it."""
+    edges = set()
+    for task_id in range(1, node_count):
+        for _ in range(fan_in):
+            edges.add((task_id, rng.randrange(max(0, task_id - reach), task_id)))
+    return sorted(edges)
+
+
+def timed(label, func, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{label}: {elapsed * 1000:.2f} ms")
+    return result
+
+
+def bench_schedule(node_count, rng):
+    tasks = [(task_id, 'not_started', rng.choice([None, None, TODAY + task_id // 10])) for task_id in range(node_count)]
+    edges = build_edges(node_count, rng)
+    schedule = timed(f"Schedule build ({node_count} nodes, {len(edges)} edges)",
+                     lambda: Schedule(tasks, edges, TODAY))
+    print(f"  critical path length: {len(schedule.critical_path())}")
+
+    targets = [rng.randrange(node_count) for _ in range(100)]
+    statuses = iter(['completed', 'in_progress'] * 100)
+    timed("Schedule.set_status (avg of 100)",
+          lambda: schedule.set_status([targets[rng.randrange(100)]], next(statuses)), repeat=100)
+    timed("Schedule.critical_path", schedule.critical_path)
+
+    # 依赖指向更早的任务时拓扑序保持不变，无需重排
+    timed("Schedule.add_edge, order kept (avg of 100)",
+          lambda: schedule.add_edge(node_count - 1 - rng.randrange(100), rng.randrange(100)), repeat=100)
+
+
+def bench_task_manager(node_count, rng):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        database.configure(path=os.path.join(tmp_dir, 'bench.db'))
+        database.create_table()
+        tm = TaskManager()
+
+        ids = tm.add_tasks([{'title': f'task {n}'} for n in range(node_count)])
+        with database.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO task_dependencies (task_id, depends_on) VALUES (?, ?)",
+                [(ids[task], ids[depends_on]) for task, depends_on in build_edges(node_count, rng)]
+            )
+
+        timed("TaskManager.get_schedule, cold (loads from SQLite)", tm.get_schedule)
+        timed("TaskManager.get_critical_path, cached", tm.get_critical_path)
+        timed("TaskManager.update_task_status + get_critical_path",
+              lambda: (tm.update_task_status(ids[rng.randrange(node_count)], 'completed'), tm.get_critical_path()),
+              repeat=20)
+        timed("TaskManager.add_dependency + get_critical_path",
+              lambda: (tm.add_dependency(ids[-1 - rng.randrange(100)], ids[rng.randrange(100)]), tm.get_critical_path()),
+              repeat=20)
+    finally:
+        database.get_manager().close_all()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def main(node_count=50000):
+    rng = random.Random(0)
+    bench_schedule(node_count, rng)
+    bench_task_manager(node_count, rng)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,74 @@
+"""Benchmark: a small active project next to a large archived one, before and after splitting the archive off.
+
+Times the calls the window makes on every refresh or edit of the active
+project, a check that scans the main file, and the split itself.
+
+Usage: python benchmarks/bench_shards.py [archived_task_count]
+"""
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from db import database, shards
+from logic.task_manager import TaskManager
+
+ROUNDS = 50
+
+
+def populate(tm, archived_count, batch=500):
+    """Adds an archived project of ``archived_count`` tasks and an active one of 100; returns both root ids."""
+    archive = tm.add_task("archive", status='completed')
+    for first in range(0, archived_count, batch):
+        tm.add_tasks([{'title': f'archived {n}', 'status': 'completed'}
+                      for n in range(first, min(first + batch, archived_count))], parent_id=archive)
+    active = tm.add_tasks([{'title': 'active', 'children': [{'title': f'step {n}'} for n in range(100)]}])
+    return archive, active
+
+
+def measure(tm, active):
+    calls = {
+        'root page': lambda: tm.get_root_tasks(limit=100),
+        'update subtree status': lambda: tm.update_task_status(active[0], 'in_progress'),
+        'get_children': lambda: tm.get_children(active[0]),
+        'search': lambda: tm.search('step', 50),
+        'stats': tm.get_stats,
+        'hierarchy check': tm.check_hierarchy_index,
+    }
+    timings = {}
+    for label, call in calls.items():
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            call()
+        timings[label] = (time.perf_counter() - start) / ROUNDS * 1000
+    return timings
+
+
+def main(archived_count=100000):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        database.configure(path=os.path.join(tmp_dir, 'bench.db'))
+        database.create_table()
+        tm = TaskManager()
+        archive, active = populate(tm, archived_count)
+        before = measure(tm, active)
+
+        start = time.perf_counter()
+        tm.split_project(archive)
+        split = time.perf_counter() - start
+        after = measure(tm, active)
+
+        print(f"archived project: {archived_count} tasks, split in {split:.2f} s")
+        for label in before:
+            print(f"  {label:24} {before[label]:8.2f} ms -> {after[label]:8.2f} ms")
+    finally:
+        shards.close_all()
+        database.get_manager().close_all()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,56 @@
+"""Benchmark: status propagation over a 10k-node subtree.
+
+Usage: python benchmarks/bench_subtree_status.py [node_count]
+"""
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from db import database
+from logic.task_manager import TaskManager
+
+
+def build_tree(node_count, fanout=10):
+    """Builds a balanced tree with ``node_count`` nodes for add_tasks."""
+    root = {'title': 'root', 'children': []}
+    level, created = [root], 1
+    while created < node_count:
+        next_level = []
+        for parent in level:
+            for _ in range(fanout):
+                if created >= node_count:
+                    break
+                child = {'title': f'task {created}', 'children': []}
+                parent['children'].append(child)
+                next_level.append(child)
+                created += 1
+        level = next_level
+    return root
+
+
+def main(node_count=10000):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        database.configure(path=os.path.join(tmp_dir, 'bench.db'))
+        database.create_table()
+        tm = TaskManager()
+
+        root_id = tm.add_tasks([build_tree(node_count)])[0]
+
+        start = time.perf_counter()
+        affected = tm.update_task_status(root_id, 'completed')
+        elapsed = time.perf_counter() - start
+
+        assert len(affected) == node_count
+        print(f"update_task_status over {node_count} nodes: {elapsed * 1000:.1f} ms")
+    finally:
+        database.get_manager().close_all()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,70 @@
+"""Benchmark: streaming JSONL/CSV export and import of 1M tasks.
+
+Reports the throughput of each phase. With --heap it also reports the peak
+Python heap (tracemalloc, which slows the run down several times); the
+peak should stay flat as the task count grows.
+
+Usage: python benchmarks/bench_transfer.py [task_count] [jsonl|csv] [--heap]
+"""
+import os
+import sys
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from db import database
+from logic.task_manager import TaskManager
+
+
+def populate(tm, task_count, batch=50000):
+    """Adds ``task_count`` tasks as parent/child pairs, ``batch`` at a time."""
+    for first in range(0, task_count, batch):
+        pairs = min(batch, task_count - first) // 2
+        tm.add_tasks([{'title': f'task {first + n}', 'description': 'benchmark task',
+                       'children': [{'title': f'task {first + n}.1'}]} for n in range(pairs)])
+
+
+def measured(label, count, func, heap=False):
+    if heap:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func()
+    finally:
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if heap else None
+        tracemalloc.stop()
+    line = f"{label}: {count} tasks in {elapsed:.1f} s ({count / elapsed:,.0f} tasks/s)"
+    if heap:
+        line += f", peak heap {peak / 2**20:.1f} MiB"
+    print(line)
+    return result
+
+
+def main(task_count=1000000, format='jsonl', heap=False):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        database.configure(path=os.path.join(tmp_dir, 'source.db'))
+        database.create_table()
+        source = TaskManager()
+        populate(source, task_count)
+
+        path = os.path.join(tmp_dir, f'tasks.{format}')
+        exported = measured("export", task_count, lambda: source.export_tasks(path), heap)
+        print(f"  file size: {os.path.getsize(path) / 2**20:.1f} MiB")
+
+        database.configure(path=os.path.join(tmp_dir, 'target.db'))
+        database.create_table()
+        result = measured("import", exported, lambda: TaskManager().import_tasks(path), heap)
+        assert result['tasks'] == exported
+    finally:
+        database.get_manager().close_all()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if arg != '--heap']
+    main(int(args[0]) if args else 1000000, args[1] if len(args) > 1 else 'jsonl', '--heap' in sys.argv)
@@ -0,0 +1,493 @@
+"""Local JSON API over TaskManager for scripts and editor plugins, without the Qt window.
+
+A small HTTP/1.1 server on asyncio streams (standard library only), bound
+to localhost or a Unix socket. Every read runs on one reader thread that
+keeps its SQLite connection open for the life of the server; every write
+goes through a WriteQueue, so writes that arrive together, whether
+pipelined, from several clients or in one ``/batch`` call, share a commit.
+
+Connections are kept alive and may pipeline requests. Each connection's
+requests are answered in order and behave as if run one after another: a
+run of consecutive reads is served together, as is a run of consecutive
+writes, and a run starts only after the previous one has finished.
+
+Endpoints (JSON bodies; ids are task ids)::
+
+    GET    /tasks                       full task tree
+    GET    /tasks/roots?after=&limit=   root tasks, keyset-paginated
+    GET    /tasks/page?after=&limit=&status=&priority=&parent_id=&descendants=1
+    GET    /tasks/search?q=&limit=
+    GET    /tasks/<id>/children?after=&limit=
+    GET    /stats?scope=
+    POST   /tasks                       {"title", ...}           -> 201 {"id"}
+    POST   /tasks/bulk                  {"tasks", "parent_id"}   -> 201 {"ids"}
+    PUT    /tasks/<id>/status           {"status"}               -> {"updated"}
+    POST   /tasks/status                {"ids", "status"}        -> {"updated"}
+    DELETE /tasks/<id>                                           -> {"deleted"}
+    POST   /tasks/delete                {"ids"}                  -> {"deleted"}
+    POST   /batch                       {"requests": [{"method", "path", "body"}]}
+                                                                 -> {"responses": [{"status", "body"}]}
+
+Errors are ``{"error": message}`` with a 4xx/5xx status. Run headless with
+``python -m api.server [--port N | --unix PATH] [--db PATH]`` from ``src``.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import stat
+import sqlite3
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+from itertools import groupby
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from db import database, shards, stats
+from logic.task_manager import PAGE_FILTERS, TaskManager
+from logic.write_queue import WriteQueue
+
+logger = logging.getLogger(__name__)
+
+HOST = '127.0.0.1'
+PORT = 8765
+
+# 每个连接最多预读的管道化请求数，超过后暂停读取（背压）
+PIPELINE_DEPTH = 128
+
+# 单个请求体和一次 /batch 的上限
+MAX_BODY = 16 * 2**20
+MAX_BATCH_REQUESTS = 1000
+MAX_HEADERS = 100
+
+# 分页接口未给 limit 时的默认值和上限
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 10000
+
+TASK_FIELDS = ('title', 'description', 'priority', 'status', 'due_date', 'depends_on', 'parent_id')
+
+Request = namedtuple('Request', ['method', 'path', 'query', 'body', 'keep_alive'])
+Route = namedtuple('Route', ['method', 'pattern', 'write', 'handler'])
+
+
+class ApiError(Exception):
+    """A request the server answers with ``status`` and ``{"error": message}``."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = HTTPStatus(status)
+
+
+class ApiServer:
+    """Serves ``task_manager`` over HTTP/JSON; see the module docstring for the endpoints."""
+
+    def __init__(self, task_manager=None, writes=None):
+        self.task_manager = task_manager or TaskManager()
+        self._own_writes = writes is None
+        self.writes = writes or WriteQueue(self.task_manager)
+        # 所有读操作共用这一个线程，也就共用它的一个持久连接
+        self._reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ApiReader")
+        self._server = None
+        self._connections = set()
+        self.requests = 0
+        self.routes = [
+            Route('GET', r'/tasks', False, self._list_tasks),
+            Route('GET', r'/tasks/roots', False, self._root_tasks),
+            Route('GET', r'/tasks/page', False, self._page_tasks),
+            Route('GET', r'/tasks/search', False, self._search),
+            Route('GET', r'/tasks/(?P<task_id>\d+)/children', False, self._children),
+            Route('GET', r'/stats', False, self._stats),
+            Route('POST', r'/tasks', True, self._add_task),
+            Route('POST', r'/tasks/bulk', True, self._add_tasks),
+            Route('PUT', r'/tasks/(?P<task_id>\d+)/status', True, self._update_status),
+            Route('POST', r'/tasks/status', True, self._update_statuses),
+            Route('DELETE', r'/tasks/(?P<task_id>\d+)', True, self._delete_task),
+            Route('POST', r'/tasks/delete', True, self._delete_tasks),
+            Route('POST', r'/batch', None, None),
+        ]
+        self._patterns = [(route, re.compile(route.pattern + '$')) for route in self.routes]
+
+    async def start(self, host=HOST, port=PORT, path=None):
+        """Starts listening on ``path`` (a Unix socket) or ``host``:``port``; port 0 picks a free one."""
+        if path is not None:
+            # 上次异常退出留下的套接字文件
+            if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+                os.unlink(path)
+            self._server = await asyncio.start_unix_server(self._serve_connection, path)
+            os.chmod(path, 0o600)
+        else:
+            self._server = await asyncio.start_server(self._serve_connection, host, port)
+        logger.info(f"API 服务已启动: {self.address}")
+        return self
+
+    @property
+    def address(self):
+        return self._server.sockets[0].getsockname() if self._server else None
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    async def close(self):
+        """Stops accepting, closes open connections, commits queued writes and closes the reader's connection."""
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._connections):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+        loop = asyncio.get_running_loop()
+        if self._own_writes:
+            await loop.run_in_executor(None, self.writes.close)
+        await loop.run_in_executor(self._reader, database.close_connection)
+        self._reader.shutdown()
+
+    async def execute(self, requests):
+        """Runs ``requests`` in order and returns one ``(status, payload)`` per request.
+
+        Consecutive reads run together, consecutive writes are queued
+        together (and so usually share a commit), and each run starts after
+        the previous one has finished.
+        """
+        resolved = [self._resolve(request) for request in requests]
+        results = []
+        for _, run in groupby(resolved, key=self._run_kind):
+            results.extend(await asyncio.gather(*(self._execute_one(*item) for item in run)))
+        return results
+
+    @staticmethod
+    def _run_kind(item):
+        request, route, _ = item
+        # /batch 单独成段；出错的请求没有副作用，与读操作同段
+        if route is not None and route.handler is None:
+            return id(request)
+        return bool(route and route.write)
+
+    def _resolve(self, request):
+        """Returns ``(request, route, match arguments)``, or ``(request, None, ApiError)`` for no route."""
+        allowed = set()
+        for route, pattern in self._patterns:
+            match = pattern.match(request.path)
+            if match:
+                if route.method == request.method:
+                    return request, route, {name: int(value) for name, value in match.groupdict().items()}
+                allowed.add(route.method)
+        if allowed:
+            return request, None, ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f"{request.method} not allowed on {request.path}")
+        return request, None, ApiError(HTTPStatus.NOT_FOUND, f"No such endpoint: {request.path}")
+
+    async def _execute_one(self, request, route, arguments):
+        self.requests += 1
+        try:
+            if route is None:
+                raise arguments
+            if route.handler is None:
+                return HTTPStatus.OK, await self._batch(request)
+            call, to_payload, status = route.handler(request.query, self._json(request.body), **arguments)
+            if route.write:
+                # submit 在第一个 await 之前调用，保持同一段写入的提交顺序
+                result = await asyncio.wrap_future(self.writes.submit(call))
+            else:
+                result = await asyncio.get_running_loop().run_in_executor(self._reader, call)
+            return status, to_payload(result)
+        except ApiError as e:
+            return e.status, {'error': str(e)}
+        except (ValueError, TypeError, sqlite3.IntegrityError) as e:
+            return HTTPStatus.BAD_REQUEST, {'error': str(e)}
+        except Exception as e:
+            logger.error(f"处理 {request.method} {request.path} 失败: {e}", exc_info=True)
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+
+    async def _batch(self, request):
+        body = self._json(request.body)
+        items = body.get('requests') if isinstance(body, dict) else None
+        if not isinstance(items, list):
+            raise ApiError(HTTPStatus.BAD_REQUEST, 'Expected {"requests": [...]}')
+        if len(items) > MAX_BATCH_REQUESTS:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"At most {MAX_BATCH_REQUESTS} requests per batch")
+        requests = []
+        for item in items:
+            if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+                raise ApiError(HTTPStatus.BAD_REQUEST, 'Each batch item needs "method" and "path"')
+            url = urlsplit(item['path'])
+            if url.path.rstrip('/') == '/batch':
+                raise ApiError(HTTPStatus.BAD_REQUEST, "Batches cannot be nested")
+            # 子请求的 body 已是解析好的 JSON，这里重新编码以复用同一套处理
+            body = item.get('body')
+            requests.append(Request(str(item.get('method', 'GET')).upper(), self._path(url.path),
+                                    dict(parse_qsl(url.query)), None if body is None else json.dumps(body), True))
+        results = await self.execute(requests)
+        return {'responses': [{'status': int(status), 'body': json.loads(payload) if isinstance(payload, bytes) else payload}
+                              for status, payload in results]}
+
+    # 各端点：校验参数，返回 (要执行的调用, 结果 -> JSON, 状态码)
+
+    def _list_tasks(self, query, body):
+        # 在读线程上持锁编码：共享的缓存树不会在编码途中被写线程修改，事件循环只收到字节
+        return self.task_manager.get_tasks_json, lambda encoded: encoded, HTTPStatus.OK
+
+    def _root_tasks(self, query, body):
+        call = partial(self.task_manager.get_root_tasks, self._int(query, 'after'), self._limit(query))
+        return call, self._page_of(query), HTTPStatus.OK
+
+    def _page_tasks(self, query, body):
+        filters = {}
+        for column in PAGE_FILTERS:
+            if column not in query:
+                continue
+            # parent_id= 或 parent_id=null 匹配 NULL，即只取根任务
+            if query[column] in ('', 'null'):
+                filters[column] = None
+            elif column == 'parent_id':
+                filters[column] = self._int(query, column)
+            else:
+                filters[column] = query[column]
+        call = partial(self.task_manager.get_tasks_page, self._int(query, 'after'), self._limit(query),
+                       filters, query.get('descendants') in ('1', 'true'))
+        return call, lambda page: page, HTTPStatus.OK
+
+    def _search(self, query, body):
+        if not query.get('q', '').strip():
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Missing query parameter q")
+        return partial(self.task_manager.search, query['q'], self._limit(query, 50)), lambda tasks: tasks, HTTPStatus.OK
+
+    def _children(self, query, body, task_id):
+        call = partial(self.task_manager.get_children, task_id, self._int(query, 'after'), self._limit(query))
+        return call, self._page_of(query), HTTPStatus.OK
+
+    def _stats(self, query, body):
+        scope = query.get('scope', 'roots')
+        if scope not in stats.SCOPES:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"scope must be one of {', '.join(stats.SCOPES)}")
+        return partial(self.task_manager.get_stats, scope), lambda result: result, HTTPStatus.OK
+
+    def _add_task(self, query, body):
+        fields = self._task_fields(body)
+        return partial(self.task_manager.add_task, **fields), lambda task_id: {'id': task_id}, HTTPStatus.CREATED
+
+    def _add_tasks(self, query, body):
+        body = self._object(body)
+        tasks = body.get('tasks')
+        if not isinstance(tasks, list) or not tasks:
+            raise ApiError(HTTPStatus.BAD_REQUEST, 'Expected a non-empty "tasks" list')
+
+        def check(nodes):
+            for node in nodes:
+                self._task_fields({key: value for key, value in self._object(node).items() if key != 'children'})
+                check(node.get('children') or [])
+        check(tasks)
+        call = partial(self.task_manager.add_tasks, tasks, body.get('parent_id'))
+        return call, lambda ids: {'ids': ids}, HTTPStatus.CREATED
+
+    def _update_status(self, query, body, task_id):
+        status = self._status(body)
+        return partial(self.task_manager.update_task_status, task_id, status), self._updated, HTTPStatus.OK
+
+    def _update_statuses(self, query, body):
+        status, ids = self._status(body), self._ids(body)
+        return partial(self.task_manager.update_tasks_status, ids, status), self._updated, HTTPStatus.OK
+
+    def _delete_task(self, query, body, task_id):
+        return partial(self.task_manager.delete_tasks, [task_id]), self._deleted, HTTPStatus.OK
+
+    def _delete_tasks(self, query, body):
+        return partial(self.task_manager.delete_tasks, self._ids(body)), self._deleted, HTTPStatus.OK
+
+    @staticmethod
+    def _updated(task_ids):
+        return {'updated': task_ids}
+
+    @staticmethod
+    def _deleted(_):
+        # 删除失败时 delete_tasks 抛出异常，写队列回滚该调用并报告错误
+        return {'deleted': True}
+
+    # 参数解析
+
+    @staticmethod
+    def _json(body):
+        if body is None or body in (b'', ''):
+            return None
+        try:
+            return json.loads(body)
+        except ValueError as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Invalid JSON body: {e}")
+
+    @staticmethod
+    def _object(body):
+        if not isinstance(body, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Expected a JSON object")
+        return body
+
+    def _task_fields(self, body):
+        fields = self._object(body)
+        unknown = set(fields) - set(TASK_FIELDS)
+        if unknown:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Unknown task fields: {', '.join(sorted(unknown))}")
+        if not isinstance(fields.get('title'), str) or not fields['title'].strip():
+            raise ApiError(HTTPStatus.BAD_REQUEST, 'A task needs a non-empty "title"')
+        if 'status' in fields:
+            self._status(fields)
+        return fields
+
+    def _status(self, body):
+        status = self._object(body).get('status')
+        if status not in stats.STATUSES:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"status must be one of {', '.join(stats.STATUSES)}")
+        return status
+
+    def _ids(self, body):
+        ids = self._object(body).get('ids')
+        if not isinstance(ids, list) or not all(isinstance(task_id, int) for task_id in ids):
+            raise ApiError(HTTPStatus.BAD_REQUEST, 'Expected an "ids" list of integers')
+        return ids
+
+    @staticmethod
+    def _int(query, name, default=None):
+        value = query.get(name)
+        if value in (None, ''):
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"{name} must be an integer")
+
+    def _limit(self, query, default=DEFAULT_LIMIT):
+        limit = self._int(query, 'limit', default)
+        if not 0 < limit <= MAX_LIMIT:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"limit must be between 1 and {MAX_LIMIT}")
+        return limit
+
+    def _page_of(self, query):
+        limit = self._limit(query)
+
+        def to_page(tasks):
+            # 与窗口的根任务分页相同：取满一页才给出下一页的游标
+            return {'tasks': tasks, 'next_key': tasks[-1]['id'] if len(tasks) == limit else None}
+        return to_page
+
+    @staticmethod
+    def _path(path):
+        return unquote(path).rstrip('/') or '/'
+
+    # HTTP/1.1 连接处理
+
+    async def _serve_connection(self, reader, writer):
+        self._connections.add(writer)
+        # 读取与处理分开：处理当前一段请求时，后续的管道化请求继续被读入
+        pending = asyncio.Queue(PIPELINE_DEPTH)
+        receiving = asyncio.create_task(self._receive(reader, pending))
+        try:
+            while True:
+                batch = [await pending.get()]
+                while not pending.empty() and len(batch) < PIPELINE_DEPTH:
+                    batch.append(pending.get_nowait())
+                requests = [item for item in batch if isinstance(item, Request)]
+                keep_alive = len(requests) == len(batch) and all(request.keep_alive for request in requests)
+                for request, (status, payload) in zip(requests, await self.execute(requests)):
+                    writer.write(self._response(status, payload, request.keep_alive))
+                stop = batch[len(requests):]
+                if stop and isinstance(stop[0], ApiError):
+                    writer.write(self._response(stop[0].status, {'error': str(stop[0])}, False))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            receiving.cancel()
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _receive(self, reader, pending):
+        """Parses requests off ``reader`` into ``pending``; ends with None (EOF) or an ApiError (bad framing)."""
+        while True:
+            try:
+                request = await self._read_request(reader)
+            except ApiError as e:
+                await pending.put(e)
+                return
+            except (ConnectionError, asyncio.IncompleteReadError):
+                request = None
+            await pending.put(request)
+            if request is None or not request.keep_alive:
+                return
+
+    async def _read_request(self, reader):
+        try:
+            line = await reader.readline()
+            if not line:
+                return None
+            parts = line.decode('latin-1').split()
+            if len(parts) != 3 or not parts[2].startswith('HTTP/1.'):
+                raise ApiError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+            method, target, version = parts
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                if len(headers) >= MAX_HEADERS:
+                    raise ApiError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Too many headers")
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+        except (ValueError, asyncio.LimitOverrunError):
+            # StreamReader 的单行长度上限
+            raise ApiError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Request line or header too long")
+        if 'transfer-encoding' in headers:
+            raise ApiError(HTTPStatus.LENGTH_REQUIRED, "Send the body with Content-Length")
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+        if not 0 <= length <= MAX_BODY:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Body larger than {MAX_BODY} bytes")
+        body = await reader.readexactly(length) if length else b''
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+        url = urlsplit(target)
+        return Request(method.upper(), self._path(url.path), dict(parse_qsl(url.query)), body, keep_alive)
+
+    @staticmethod
+    def _response(status, payload, keep_alive):
+        # bytes 是已编码好的 JSON
+        body = payload if isinstance(payload, bytes) else json.dumps(payload, default=str).encode()
+        status = HTTPStatus(status)
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        return head.encode('latin-1') + body
+
+
+async def serve(host=HOST, port=PORT, path=None, task_manager=None):
+    """Runs an ApiServer until cancelled (Ctrl+C when run from the command line)."""
+    server = await ApiServer(task_manager).start(host, port, path)
+    print(f"Serving on {path or '%s:%s' % server.address[:2]}", flush=True)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+        shards.close_all()
+        if path is not None and os.path.exists(path):
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the task database as a local JSON API.")
+    parser.add_argument('--host', default=HOST, help="address to bind (default: %(default)s)")
+    parser.add_argument('--port', type=int, default=PORT, help="TCP port (default: %(default)s)")
+    parser.add_argument('--unix', metavar='PATH', help="listen on a Unix socket instead of TCP")
+    parser.add_argument('--db', metavar='PATH', help="database file (default: the app's)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.db:
+        database.configure(path=args.db)
+    database.create_table()
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
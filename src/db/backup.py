@@ -0,0 +1,135 @@
+"""Online backups of the task database as rotating, gzip-compressed snapshots.
+
+Snapshots are taken with the SQLite online backup API on a connection of
+their own, a few pages per step with a short sleep in between, so the GUI
+and writer threads keep running while a large database is copied. The
+source connection holds a read transaction for the whole copy: in WAL mode
+writers are not blocked by it, and because the snapshot it sees never
+changes, the backup does not restart when other connections write.
+
+Projects stored in shard files (see ``db.shards``) are copied into the
+snapshot as well, so a snapshot is a single file holding every project;
+restoring it puts them all back in the main file.
+
+Snapshots go to ``backups`` next to the configured database file unless
+a directory is passed.
+
+Run ``python -m db.backup [--create | --restore NAME]`` from ``src``; the
+snapshots on disk are listed afterwards.
+"""
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from . import database, shards
+
+logger = logging.getLogger(__name__)
+
+# 保留的快照数量，更早的自动删除
+KEEP_SNAPSHOTS = 10
+
+# 每一步复制的页数和步间休眠（秒）；步越小，对其他线程的影响越小
+STEP_PAGES = 64
+STEP_SLEEP = 0.002
+
+# 文件名按时间排序即按字符串排序
+SNAPSHOT_FORMAT = "tasks-%Y%m%d-%H%M%S-%f.db.gz"
+
+
+def backup_dir():
+    """Returns the default snapshot directory of the configured database."""
+    return Path(database.DATABASE_PATH).parent / "backups"
+
+
+def list_snapshots(directory=None):
+    """Returns the snapshot files in ``directory``, newest first."""
+    directory = Path(directory or backup_dir())
+    return sorted(directory.glob("tasks-*.db.gz"), reverse=True)
+
+
+def rotate(directory=None, keep=KEEP_SNAPSHOTS):
+    """Deletes all but the newest ``keep`` snapshots and returns the removed paths."""
+    removed = list_snapshots(directory)[keep:]
+    for path in removed:
+        path.unlink()
+        logger.info(f"删除旧快照 {path.name}")
+    return removed
+
+
+def create_snapshot(directory=None, keep=KEEP_SNAPSHOTS, pages=STEP_PAGES, sleep=STEP_SLEEP, progress=None):
+    """Copies the live database into a new compressed snapshot and returns its path.
+
+    ``progress(status, remaining, total)`` is the sqlite3 backup callback,
+    called after every step with page counts.
+    """
+    directory = Path(directory or backup_dir())
+    directory.mkdir(parents=True, exist_ok=True)
+    target = directory / datetime.now().strftime(SNAPSHOT_FORMAT)
+    partial = target.with_name(target.name + ".partial")
+
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        copy = Path(tmp) / "tasks.db"
+        source = database.get_manager().connect()
+        dest = sqlite3.connect(copy, isolation_level=None)
+        try:
+            # 持有读事务：备份看到的是固定快照，其他连接写入时不会从头重来
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            source.backup(dest, pages=pages, progress=progress, sleep=sleep)
+            source.execute("COMMIT")
+            # 分片中的项目并入副本，快照不依赖分片文件
+            shards.merge_into(dest)
+        finally:
+            dest.close()
+            source.close()
+        with open(copy, "rb") as raw, open(partial, "wb") as file, \
+                gzip.GzipFile(target.stem, "wb", compresslevel=6, fileobj=file) as packed:
+            shutil.copyfileobj(raw, packed, 1 << 20)
+    # 压缩完成后再改名，半成品不会出现在快照列表里
+    os.replace(partial, target)
+    logger.info(f"创建快照 {target.name}")
+    rotate(directory, keep)
+    return target
+
+
+def restore(snapshot):
+    """Replaces the contents of the live database with ``snapshot``.
+
+    The snapshot is decompressed and checked first, then copied in a single
+    backup step (one write transaction), and finally migrated to the current
+    schema. Raises sqlite3.DatabaseError if the snapshot is damaged.
+    """
+    snapshot = Path(snapshot)
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = Path(tmp) / "restore.db"
+        with gzip.open(snapshot, "rb") as packed, open(copy, "wb") as raw:
+            shutil.copyfileobj(packed, raw, 1 << 20)
+        source = sqlite3.connect(copy)
+        try:
+            result = source.execute("PRAGMA integrity_check").fetchone()[0]
+            if result != "ok":
+                raise sqlite3.DatabaseError(f"Snapshot {snapshot.name} is damaged: {result}")
+            source.backup(database.get_connection())
+        finally:
+            source.close()
+    database.create_table()
+    logger.info(f"已从快照 {snapshot.name} 恢复")
+
+
+if __name__ == '__main__':
+    import sys
+
+    database.create_table()
+    if '--create' in sys.argv:
+        print(f"Created {create_snapshot()}")
+    elif '--restore' in sys.argv:
+        name = sys.argv[sys.argv.index('--restore') + 1]
+        restore(backup_dir() / name)
+        print(f"Restored {name}")
+    for path in list_snapshots():
+        print(f"{path.name}  {path.stat().st_size / 1024:.0f} KiB")
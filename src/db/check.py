@@ -0,0 +1,63 @@
+"""Rebuilds and verifies the trigger-maintained derived tables.
+
+Triggers created by the schema migrations keep every table below in step
+with ``tasks`` and ``task_dependencies``. The module of each table
+supplies its own ``rebuild(conn)`` (recompute from scratch; the caller
+owns the transaction) and ``check(conn)`` (compare with a fresh recount);
+this module runs them.
+
+Run ``python -m db.check [--rebuild] [TABLE ...]`` from ``src``; without
+TABLE every derived table is handled. The exit status is 1 if a check
+still finds differences.
+"""
+from . import closure, database, dependencies, rollups, stats
+
+# 派生表 -> 提供其 rebuild/check 的模块；按重建顺序排列（rollups 依赖闭包）
+TABLES = {
+    'task_closure': closure,
+    'task_rollups': rollups,
+    'task_stats': stats,
+    'task_blocked': dependencies,
+}
+
+
+def _modules(tables):
+    tables = list(TABLES) if tables is None else list(tables)
+    unknown = [table for table in tables if table not in TABLES]
+    if unknown:
+        raise ValueError(f"Unknown derived table(s): {', '.join(unknown)}; expected {', '.join(TABLES)}")
+    # 无论传入顺序如何都按依赖顺序处理
+    return {table: module for table, module in TABLES.items() if table in tables}
+
+
+def is_consistent(result):
+    """True if a ``check`` result reports no differences."""
+    if isinstance(result, dict):
+        return not any(result.values())
+    return not result
+
+
+def rebuild(tables=None):
+    """Rebuilds ``tables`` (default: all) in one transaction."""
+    with database.transaction() as conn:
+        for module in _modules(tables).values():
+            module.rebuild(conn)
+
+
+def check(tables=None):
+    """Returns ``{table: check result}`` for ``tables`` (default: all)."""
+    conn = database.get_connection()
+    return {table: module.check(conn) for table, module in _modules(tables).items()}
+
+
+if __name__ == '__main__':
+    import sys
+
+    arguments = [argument for argument in sys.argv[1:] if argument != '--rebuild']
+    database.create_table()
+    if '--rebuild' in sys.argv:
+        rebuild(arguments or None)
+    results = check(arguments or None)
+    for table, result in results.items():
+        print(f"{table}: {'ok' if is_consistent(result) else result}")
+    sys.exit(0 if all(is_consistent(result) for result in results.values()) else 1)
@@ -0,0 +1,59 @@
+"""Closure-table index of the task hierarchy.
+
+``task_closure`` holds one row per (ancestor, descendant) pair, including
+each task paired with itself at depth 0, so subtree and ancestor queries
+are single index lookups.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 以 tasks.parent_id 为准重新推导的完整闭包
+EXPECTED_CLOSURE = """
+    WITH RECURSIVE closure(ancestor, descendant, depth) AS (
+        SELECT id, id, 0 FROM tasks
+        UNION ALL
+        SELECT closure.ancestor, tasks.id, closure.depth + 1
+        FROM closure JOIN tasks ON tasks.parent_id = closure.descendant
+        WHERE closure.depth < 10000
+    )
+"""
+
+
+def rebuild(conn):
+    """Recomputes task_closure from tasks.parent_id; caller owns the transaction."""
+    conn.execute("DELETE FROM task_closure")
+    conn.execute(
+        "INSERT /* full scan */ INTO task_closure (ancestor, descendant, depth) " +
+        EXPECTED_CLOSURE + "SELECT ancestor, descendant, depth FROM closure"
+    )
+    count = conn.execute("SELECT /* full scan */ COUNT(*) FROM task_closure").fetchone()[0]
+    logger.info(f"Rebuilt task_closure with {count} rows")
+    return count
+
+
+def check(conn):
+    """Compares task_closure with the hierarchy in tasks.
+
+    Returns a dict with the number of ``missing`` and ``extra`` closure rows;
+    both are 0 when the index is consistent.
+    """
+    missing = conn.execute(
+        EXPECTED_CLOSURE + """
+        SELECT COUNT(*) FROM (
+            SELECT ancestor, descendant, depth FROM closure
+            EXCEPT
+            SELECT ancestor, descendant, depth FROM task_closure
+        )
+        """
+    ).fetchone()[0]
+    extra = conn.execute(
+        EXPECTED_CLOSURE + """
+        SELECT COUNT(*) FROM (
+            SELECT ancestor, descendant, depth FROM task_closure
+            EXCEPT
+            SELECT ancestor, descendant, depth FROM closure
+        )
+        """
+    ).fetchone()[0]
+    return {'missing': missing, 'extra': extra}
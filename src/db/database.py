@@ -1,8 +1,14 @@
 import sqlite3
 import os
 import logging
+import threading
+import weakref
+from contextlib import contextmanager
+from datetime import date, datetime
 from pathlib import Path
 
+from . import migrations, stats
+
 
 # Get user's data directory
 if os.name == 'nt':  # Windows
@@ -15,72 +21,257 @@ DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 DATABASE_PATH = DATA_DIR / "tasks.db"
 
+# 每个连接建立时执行的 PRAGMA，可通过 configure() 覆盖
+DEFAULT_PRAGMAS = {
+    # 只对新建的数据库文件生效，必须在 journal_mode 写入文件头之前设置；
+    # 旧文件需执行一次 python -m db.maintenance --vacuum 转换
+    'auto_vacuum': 'INCREMENTAL',
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,      # 负数表示以 KiB 为单位，约 64MB
+    'mmap_size': 268435456,    # 256MB
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,      # 毫秒
+    'foreign_keys': 'ON',
+}
+
 logger = logging.getLogger(__name__)
 
+# set_trace() 设置的回调，以及所有 ConnectionManager（用于给已打开的连接补上回调）
+_trace = None
+_managers = weakref.WeakSet()
+
+
+class ConnectionManager:
+    """Keeps one persistent, pre-configured SQLite connection per thread."""
+
+    def __init__(self, path=DATABASE_PATH, pragmas=None):
+        self.path = path
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        _managers.add(self)
+
+    def connect(self):
+        """Opens a new connection with the configured pragmas applied."""
+        # isolation_level=None: 事务由 transaction() 显式控制
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        if _trace is not None:
+            conn.set_trace_callback(_trace)
+        logger.debug(f"Opened SQLite connection to {self.path}")
+        return conn
+
+    def get_connection(self):
+        """Returns the calling thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self.connect()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Runs the enclosed statements in a single write transaction.
+
+        Nested use joins the outer transaction instead of committing early.
+        """
+        conn = self.get_connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    def close(self):
+        """Closes the calling thread's connection."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            with self._lock:
+                self._connections.remove(conn)
+            conn.close()
+
+    def close_all(self):
+        """Closes every connection opened by this manager."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+_manager = ConnectionManager()
+
+
+def configure(path=None, pragmas=None):
+    """Points the module at another database file and/or pragma set."""
+    global _manager, DATABASE_PATH
+    if path is not None:
+        DATABASE_PATH = Path(path)
+    _manager.close_all()
+    _manager = ConnectionManager(DATABASE_PATH, pragmas)
+    return _manager
+
+
+def get_manager():
+    return _manager
+
+
+def set_trace(callback):
+    """Calls ``callback(sql)`` for every statement run on any managed connection, open or opened later.
+
+    The SQL has its parameters filled in. Pass None to stop tracing. Used
+    by the query-plan audit (``db.query_audit.record``).
+    """
+    global _trace
+    _trace = callback
+    for manager in list(_managers):
+        with manager._lock:
+            connections = list(manager._connections)
+        for conn in connections:
+            conn.set_trace_callback(callback)
+
+
+def get_connection():
+    """Returns the persistent connection for the calling thread."""
+    return _manager.get_connection()
+
+
+def transaction():
+    """Context manager wrapping a single transaction on the thread's connection."""
+    return _manager.transaction()
+
+
+def close_connection():
+    _manager.close()
+
+
+def subtree_cte(root_count=1):
+    """Returns a WITH prefix selecting ``subtree(id)`` under ``root_count`` root ids.
+
+    Served by the task_closure index, so it is a single indexed lookup
+    rather than a recursive walk. Overlapping roots yield duplicate ids, so
+    use ``IN (SELECT id FROM subtree)`` rather than a join.
+    """
+    placeholders = ','.join('?' * root_count)
+    return f"""
+        WITH subtree(id) AS (
+            SELECT descendant FROM task_closure WHERE ancestor IN ({placeholders})
+        )
+    """
+
+
 def create_connection():
+    """Opens a new, independently owned connection (caller must close it)."""
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        print(f"Connected to SQLite database at {DATABASE_PATH}")
+        conn = _manager.connect()
     except sqlite3.Error as e:
-        print(e)
+        logger.error(f"Failed to connect to {DATABASE_PATH}: {e}")
 
     return conn
 
-def fetch_all(query, params=()):
-    """Executes a SQL query and returns all results."""
-    with sqlite3.connect(DATABASE_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        return cursor.fetchall()
+def fetch_all(query, params=(), manager=None):
+    """Executes a SQL query and returns all results.
+
+    ``manager`` selects another database file (a shard); the functions
+    below accept it too and default to the configured main file.
+    """
+    return (manager or _manager).get_connection().execute(query, params).fetchall()
 
 def create_table():
-    """Creates the tasks table if it doesn't exist."""
-    with sqlite3.connect(DATABASE_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                description TEXT,
-                priority TEXT,
-                status TEXT,
-                due_date TEXT,
-                depends_on INTEGER,
-                parent_id INTEGER,
-                FOREIGN KEY(parent_id) REFERENCES tasks(id)
-            )
-        """)
-        # 添加索引
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_parent_id ON tasks(parent_id)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status)")
-        conn.commit()
+    """Brings the schema up to date; a no-op beyond one version check when current."""
+    return migrations.migrate(get_connection())
 
-def execute(query, params=()):
-    """Executes a SQL query."""
-    with sqlite3.connect(DATABASE_PATH) as conn:
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        conn.commit()
+def execute(query, params=(), manager=None):
+    """Executes a SQL query in its own transaction and returns the cursor."""
+    with (manager or _manager).transaction() as conn:
+        return conn.execute(query, params)
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def to_epoch_day(value):
+    """Returns days since 1970-01-01 for a date, datetime or date string.
+
+    Matches the tasks.due_day column for ISO 8601 dates (``/`` separators
+    are accepted); values that cannot be parsed give None.
+    """
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.strip().replace('/', '-'))
+        except ValueError:
+            return None
+    if isinstance(value, datetime):
+        value = value.date()
+    if not isinstance(value, date):
+        return None
+    return value.toordinal() - _EPOCH_ORDINAL
+
+def from_epoch_day(day):
+    return date.fromordinal(day + _EPOCH_ORDINAL)
+
+def insert_task(title, description, priority, status, due_date, depends_on, parent_id=None, manager=None):
+    with (manager or _manager).transaction() as conn:
+        cursor = conn.execute("""
+            INSERT INTO tasks (title, description, priority, status, due_date, depends_on, parent_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (title, description, priority, status, due_date, depends_on, parent_id))
+    return cursor.lastrowid
+
+def insert_tasks(rows, manager=None):
+    """Inserts many task rows with executemany and returns their new ids in order.
+
+    Each row is (title, description, priority, status, due_date, depends_on, parent_id).
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    with (manager or _manager).transaction() as conn:
+        conn.executemany("""
+            INSERT INTO tasks (title, description, priority, status, due_date, depends_on, parent_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        # 写锁在事务内独占，AUTOINCREMENT 分配的 id 是连续的
+        last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+    return list(range(last_id - len(rows) + 1, last_id + 1))
+
+def reserve_ids(table, count):
+    """Advances the AUTOINCREMENT counter of ``table`` in the main file by ``count``.
+
+    Returns the first of the ``count`` ids skipped over. Shard files draw
+    their ids from such blocks, so task and reminder ids stay unique across
+    every file.
+    """
+    with transaction() as conn:
+        conn.execute("""
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT ?, 0 WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+        """, (table, table))
+        conn.execute(f"""
+            UPDATE sqlite_sequence SET seq = MAX(seq, COALESCE((SELECT MAX(id) FROM {table}), 0)) + ?
+            WHERE name = ?
+        """, (count, table))
+        last_id = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()[0]
+    return last_id - count + 1
 
-def insert_task(title, description, priority, status, due_date, depends_on, parent_id=None):
-    conn = create_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO tasks (title, description, priority, status, due_date, depends_on, parent_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (title, description, priority, status, due_date, depends_on, parent_id))
-    conn.commit()
-    task_id = cursor.lastrowid
-    conn.close()
-    return task_id
+def has_table(name, manager=None):
+    """Returns True if a table (or virtual table) named ``name`` exists."""
+    return bool(fetch_all("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,), manager))
 
 def get_tasks():
-    conn = create_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM tasks")
-    tasks = cursor.fetchall()
-    conn.close()
+    tasks = fetch_all("SELECT id, title, description, priority, status, due_date, depends_on, parent_id FROM tasks")
     task_dict = {}
     for task in tasks:
         task_id, title, description, priority, status, due_date, depends_on, parent_id = task
@@ -128,37 +319,108 @@ def get_tasks():
 
 def update_task_status(task_id, status):
     logger.debug(f"正在更新任务{task_id}状态为{status}")
-    conn = create_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE tasks SET status = ? WHERE id = ?", (status, task_id))
-    conn.commit()
+    cursor = execute("UPDATE tasks SET status = ? WHERE id = ?", (status, task_id))
     logger.debug(f"受影响行数: {cursor.rowcount}")
-    conn.close()
 
 def delete_task(task_id):
-    conn = create_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
-    conn.commit()
-    conn.close()
-
-def add_reminder(task_id, reminder_time):
-    conn = create_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
+    """Deletes a task together with its whole subtree."""
+    execute(subtree_cte() + "DELETE FROM tasks WHERE id IN (SELECT id FROM subtree)", (task_id,))
+
+# 由 tasks 派生的表：清空任务时一并截断（旧库中不存在的表跳过）
+DERIVED_TABLES = ('reminders', 'task_dependencies', 'task_blocked', 'task_closure', 'task_rollups')
+
+def clear_tasks(manager=None):
+    """Deletes every task together with its reminders, dependencies and derived rows.
+
+    A plain ``DELETE FROM tasks`` fires the closure, rollup, stats, FTS,
+    dependency and change-log triggers and the foreign-key checks once per
+    row. Instead the triggers are dropped, every table is emptied with
+    SQLite's truncate optimization (whole b-trees are freed at once) and the
+    triggers are recreated from their stored SQL, all in one transaction.
+    The freed pages are returned to the file system by db.maintenance.
+
+    Change-log subscribers see ``reset`` on their next ``get_changes_since``.
+    """
+    manager = manager or _manager
+    conn = manager.get_connection()
+    # 外键开启时不能截断被引用的表；该 PRAGMA 在事务内无效，
+    # 已处于外层事务中时保持开启（仍然正确，只是逐行检查）
+    foreign_keys = None
+    if not conn.in_transaction:
+        foreign_keys = conn.execute("PRAGMA foreign_keys").fetchone()[0]
+        conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        with manager.transaction() as conn:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            triggers = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").fetchall()
+            for name, _ in triggers:
+                conn.execute(f'DROP TRIGGER "{name}"')
+            for table in DERIVED_TABLES + ('tasks',):
+                if table in tables:
+                    conn.execute(f"DELETE /* full scan */ FROM {table}")
+            if 'tasks_fts' in tables:
+                conn.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('delete-all')")
+            if 'task_stats' in tables:
+                stats.rebuild(conn)
+            if 'task_changes' in tables:
+                # 追加一条标记再整体压缩：清空前的任何游标都早于水位线
+                seq = conn.execute("INSERT INTO task_changes (task_id, op) VALUES (NULL, 'clear')").lastrowid
+                conn.execute("DELETE /* full scan */ FROM task_changes")
+                conn.execute("UPDATE task_changes_state SET compacted_through = ?", (seq,))
+            for _, sql in triggers:
+                conn.execute(sql)
+    finally:
+        if foreign_keys is not None:
+            conn.execute(f"PRAGMA foreign_keys = {foreign_keys}")
+
+def delete_orphans(manager=None):
+    """Deletes tasks whose parent no longer exists, including their subtrees.
+
+    Returns the number of rows removed.
+    """
+    with (manager or _manager).transaction() as conn:
+        conn.execute("""
+            WITH RECURSIVE orphans(id) AS (
+                SELECT child.id FROM tasks AS child
+                WHERE child.parent_id IS NOT NULL
+                  AND NOT EXISTS (SELECT 1 FROM tasks AS parent WHERE parent.id = child.parent_id)
+                UNION
+                SELECT tasks.id FROM tasks JOIN orphans ON tasks.parent_id = orphans.id
+            )
+            DELETE FROM tasks WHERE id IN (SELECT id FROM orphans)
+        """)
+        # 以 WITH 开头的语句 cursor.rowcount 不可靠，改用 changes()
+        removed = conn.execute("SELECT changes()").fetchone()[0]
+    if removed:
+        logger.info(f"清理了 {removed} 个孤立任务")
+    return removed
+
+# reminders.reminder_time 的存储格式：按字符串排序即按时间排序
+REMINDER_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# get_reminders 每页的行数
+REMINDER_PAGE = 100
+
+def format_reminder_time(value):
+    """Normalizes a datetime or ISO 8601 string to the stored reminder_time text."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.strftime(REMINDER_TIME_FORMAT)
+
+def add_reminder(task_id, reminder_time, manager=None):
+    """Adds a reminder and returns its id."""
+    cursor = execute("""
         INSERT INTO reminders (task_id, reminder_time)
         VALUES (?, ?)
-    """, (task_id, reminder_time))
-    conn.commit()
-    conn.close()
-
-def get_reminders():
-    conn = create_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM reminders")
-    reminders = cursor.fetchall()
-    conn.close()
-    return reminders
+    """, (task_id, format_reminder_time(reminder_time)), manager)
+    return cursor.lastrowid
+
+def delete_reminder(reminder_id, manager=None):
+    execute("DELETE FROM reminders WHERE id = ?", (reminder_id,), manager)
+
+def get_reminders(after_id=0, limit=REMINDER_PAGE, manager=None):
+    """Returns up to ``limit`` reminder rows with ids above ``after_id``, in id order (a keyset page)."""
+    return fetch_all("SELECT * FROM reminders WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit), manager)
 
 if __name__ == '__main__':
     create_table()
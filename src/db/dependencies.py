@@ -0,0 +1,83 @@
+"""Task dependency edges and the trigger-maintained blocked set.
+
+``task_dependencies`` holds one row per (task_id, depends_on) edge.
+``task_blocked`` holds every task with at least one unfinished dependency,
+together with the number of such dependencies; it is updated
+incrementally, so completing a task only touches its direct dependents.
+This module also rejects edges that would create a cycle.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 由依赖边和任务状态直接推导的阻塞集合
+_EXPECTED_BLOCKED = """
+    SELECT task_dependencies.task_id, COUNT(*)
+    FROM task_dependencies JOIN tasks ON tasks.id = task_dependencies.depends_on
+    WHERE tasks.status IS NOT 'completed'
+    GROUP BY task_dependencies.task_id
+"""
+
+
+class DependencyCycleError(ValueError):
+    """Raised when a new edge would make the dependency graph cyclic."""
+
+
+def creates_cycle(conn, task_id, depends_on):
+    """True if making ``task_id`` depend on ``depends_on`` would close a cycle.
+
+    That is the case when ``depends_on`` already depends, directly or not, on
+    ``task_id``. Only the part of the graph reachable from ``depends_on`` is read.
+    """
+    if task_id == depends_on:
+        return True
+    return conn.execute("""
+        WITH RECURSIVE upstream(id) AS (
+            SELECT ?
+            UNION
+            SELECT task_dependencies.depends_on
+            FROM task_dependencies JOIN upstream ON task_dependencies.task_id = upstream.id
+        )
+        SELECT EXISTS (SELECT 1 FROM upstream WHERE id = ?)
+    """, (depends_on, task_id)).fetchone()[0] == 1
+
+
+def add_edge(conn, task_id, depends_on):
+    """Inserts one edge after checking for cycles; caller owns the transaction."""
+    if creates_cycle(conn, task_id, depends_on):
+        raise DependencyCycleError(f"Task {task_id} cannot depend on {depends_on}: that would create a cycle")
+    conn.execute(
+        "INSERT OR IGNORE INTO task_dependencies (task_id, depends_on) VALUES (?, ?)",
+        (task_id, depends_on)
+    )
+
+
+def import_depends_on_column(conn):
+    """Copies the legacy single-valued tasks.depends_on into edges, skipping cyclic ones."""
+    rows = conn.execute("""
+        SELECT /* full scan */ tasks.id, tasks.depends_on FROM tasks
+        JOIN tasks AS dependency ON dependency.id = tasks.depends_on
+        ORDER BY tasks.id
+    """).fetchall()
+    for task_id, depends_on in rows:
+        try:
+            add_edge(conn, task_id, depends_on)
+        except DependencyCycleError as e:
+            logger.warning(f"Skipping legacy dependency: {e}")
+
+
+def rebuild(conn):
+    """Recomputes task_blocked from the edges; caller owns the transaction."""
+    conn.execute("DELETE FROM task_blocked")
+    conn.execute("INSERT /* full scan */ INTO task_blocked (task_id, unmet) " + _EXPECTED_BLOCKED)
+    logger.info("Rebuilt task_blocked")
+
+
+def check(conn):
+    """Returns the ids of tasks whose blocked state or count differs from a fresh recount."""
+    rows = conn.execute(f"""
+        SELECT task_id FROM ({_EXPECTED_BLOCKED} EXCEPT SELECT task_id, unmet FROM task_blocked)
+        UNION
+        SELECT task_id FROM (SELECT task_id, unmet FROM task_blocked EXCEPT {_EXPECTED_BLOCKED})
+    """).fetchall()
+    return sorted(row[0] for row in rows)
@@ -0,0 +1,103 @@
+"""Storage maintenance: PRAGMA optimize, ANALYZE and incremental vacuum within a time budget.
+
+``run`` works through the steps in that order and does not start another
+step once the budget is spent. Every step is short on its own: ANALYZE
+samples at most ANALYSIS_LIMIT rows per index, and pages are returned to
+the file system VACUUM_STEP_PAGES at a time, each batch in its own short
+write transaction. The window calls it on a background thread once the app
+has been idle for a while (see ui/maintenance_scheduler.py).
+
+Incremental vacuum needs ``auto_vacuum = INCREMENTAL``, which new databases
+get from ``database.DEFAULT_PRAGMAS``. Files created before that are
+converted once with ``python -m db.maintenance --vacuum`` (a full VACUUM),
+run from ``src``.
+"""
+import logging
+import time
+
+from . import database
+
+logger = logging.getLogger(__name__)
+
+# 单次维护的时间预算（秒）
+BUDGET = 0.5
+
+# ANALYZE 每个索引最多扫描的行数（PRAGMA analysis_limit），0 表示不限
+ANALYSIS_LIMIT = 1000
+
+# 每个事务归还给文件系统的空闲页数
+VACUUM_STEP_PAGES = 256
+
+# PRAGMA auto_vacuum 的取值：0 NONE、1 FULL、2 INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+def free_pages(conn):
+    return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def is_incremental(conn):
+    return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == AUTO_VACUUM_INCREMENTAL
+
+
+def run(budget=BUDGET, analyze=True, conn=None):
+    """Runs the maintenance steps until they are done or ``budget`` seconds have passed.
+
+    Must be called outside a transaction. Returns ``{'optimized', 'analyzed',
+    'vacuumed_pages', 'reclaimable_pages', 'seconds'}``; pages still
+    reclaimable mean the budget ran out and another run is worthwhile.
+    """
+    conn = conn or database.get_connection()
+    start = time.monotonic()
+    deadline = start + budget
+    result = {'optimized': False, 'analyzed': False, 'vacuumed_pages': 0}
+
+    # optimize 也可能在内部执行 ANALYZE，同样受 analysis_limit 约束
+    conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+    try:
+        conn.execute("PRAGMA optimize")
+        result['optimized'] = True
+        if analyze and time.monotonic() < deadline:
+            conn.execute("ANALYZE")
+            result['analyzed'] = True
+    finally:
+        conn.execute("PRAGMA analysis_limit = 0")
+
+    incremental = is_incremental(conn)
+    while incremental and time.monotonic() < deadline:
+        before = free_pages(conn)
+        if not before:
+            break
+        # execute() 只单步执行一次，即只释放一页；executescript 会执行到底，自成一个事务
+        conn.executescript(f"PRAGMA incremental_vacuum({min(before, VACUUM_STEP_PAGES)})")
+        result['vacuumed_pages'] += before - free_pages(conn)
+
+    result['reclaimable_pages'] = free_pages(conn) if incremental else 0
+    result['seconds'] = time.monotonic() - start
+    if result['vacuumed_pages']:
+        logger.info(f"归还了 {result['vacuumed_pages']} 个空闲页，剩余 {result['reclaimable_pages']} 个")
+    return result
+
+
+def convert_to_incremental(conn=None):
+    """Switches an existing file to incremental auto-vacuum with a full VACUUM.
+
+    Rewrites the whole database and holds the write lock while it does, so
+    it is not part of ``run``.
+    """
+    conn = conn or database.get_connection()
+    if is_incremental(conn):
+        return False
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    logger.info("已转换为增量自动清理")
+    return True
+
+
+if __name__ == '__main__':
+    import sys
+
+    database.create_table()
+    if '--vacuum' in sys.argv:
+        print("Converted" if convert_to_incremental() else "Already incremental")
+    print(run(budget=float('inf')))
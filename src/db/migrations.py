@@ -0,0 +1,491 @@
+"""Versioned schema migrations keyed by PRAGMA user_version."""
+import sqlite3
+import logging
+
+from . import closure, dependencies, rollups, stats
+
+logger = logging.getLogger(__name__)
+
+
+def _delete_orphans(conn):
+    """One-time cleanup of tasks left behind by the old one-level delete."""
+    conn.execute("""
+        WITH RECURSIVE orphans(id) AS (
+            SELECT child.id FROM tasks AS child
+            WHERE child.parent_id IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM tasks AS parent WHERE parent.id = child.parent_id)
+            UNION
+            SELECT tasks.id FROM tasks JOIN orphans ON tasks.parent_id = orphans.id
+        )
+        DELETE FROM tasks WHERE id IN (SELECT id FROM orphans)
+    """)
+
+
+def _create_fts(conn):
+    """Creates the FTS5 index over title/description when SQLite supports it."""
+    try:
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+                title, description, content='tasks', content_rowid='id',
+                tokenize='unicode61'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        # 部分 SQLite 构建未启用 FTS5，搜索会退回到 LIKE
+        logger.warning(f"FTS5 unavailable, full-text search disabled: {e}")
+        return
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_fts_insert AFTER INSERT ON tasks
+        BEGIN
+            INSERT INTO tasks_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_fts_delete AFTER DELETE ON tasks
+        BEGIN
+            INSERT INTO tasks_fts (tasks_fts, rowid, title, description)
+            VALUES ('delete', OLD.id, OLD.title, OLD.description);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_fts_update AFTER UPDATE OF title, description ON tasks
+        BEGIN
+            INSERT INTO tasks_fts (tasks_fts, rowid, title, description)
+            VALUES ('delete', OLD.id, OLD.title, OLD.description);
+            INSERT INTO tasks_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+        END
+    """)
+    conn.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')")
+
+
+def _no_children(task_expr, except_expr="NULL"):
+    return f"NOT EXISTS (SELECT 1 FROM tasks AS child WHERE child.parent_id = {task_expr} AND child.id IS NOT {except_expr})"
+
+
+def _parent_status(parent_expr):
+    return f"(SELECT status FROM tasks WHERE id = {parent_expr})"
+
+
+def _parent_exists(parent_expr):
+    return f"EXISTS (SELECT 1 FROM tasks WHERE id = {parent_expr})"
+
+
+def _create_stats_triggers(conn):
+    """Keeps task_stats in step with inserts, deletes, status changes and moves."""
+    insert_body = (
+        stats.delta_sql('all', "NEW.status", 1) +
+        stats.delta_sql('roots', "NEW.status", 1, "NEW.parent_id IS NULL") +
+        stats.delta_sql('leaves', "NEW.status", 1) +
+        # 父任务有了第一个子任务，不再是叶子
+        stats.delta_sql('leaves', _parent_status("NEW.parent_id"), -1,
+                        f"{_parent_exists('NEW.parent_id')} AND {_no_children('NEW.parent_id', 'NEW.id')}")
+    )
+    delete_body = (
+        stats.delta_sql('all', "OLD.status", -1) +
+        stats.delta_sql('roots', "OLD.status", -1, "OLD.parent_id IS NULL") +
+        stats.delta_sql('leaves', "OLD.status", -1, _no_children("OLD.id")) +
+        # 父任务失去最后一个子任务，成为叶子
+        stats.delta_sql('leaves', _parent_status("OLD.parent_id"), 1,
+                        f"{_parent_exists('OLD.parent_id')} AND {_no_children('OLD.parent_id')}")
+    )
+    update_body = (
+        stats.delta_sql('all', "OLD.status", -1) +
+        stats.delta_sql('roots', "OLD.status", -1, "OLD.parent_id IS NULL") +
+        stats.delta_sql('leaves', "OLD.status", -1, _no_children("NEW.id")) +
+        stats.delta_sql('all', "NEW.status", 1) +
+        stats.delta_sql('roots', "NEW.status", 1, "NEW.parent_id IS NULL") +
+        stats.delta_sql('leaves', "NEW.status", 1, _no_children("NEW.id")) +
+        stats.delta_sql('leaves', _parent_status("OLD.parent_id"), 1,
+                        f"OLD.parent_id IS NOT NEW.parent_id AND {_parent_exists('OLD.parent_id')} "
+                        f"AND {_no_children('OLD.parent_id')}") +
+        stats.delta_sql('leaves', _parent_status("NEW.parent_id"), -1,
+                        f"OLD.parent_id IS NOT NEW.parent_id AND {_parent_exists('NEW.parent_id')} "
+                        f"AND {_no_children('NEW.parent_id', 'NEW.id')}")
+    )
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_tasks_stats_insert AFTER INSERT ON tasks BEGIN {insert_body} END")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_tasks_stats_delete AFTER DELETE ON tasks BEGIN {delete_body} END")
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_stats_update AFTER UPDATE OF status, parent_id ON tasks
+        WHEN OLD.status IS NOT NEW.status OR OLD.parent_id IS NOT NEW.parent_id
+        BEGIN {update_body} END
+    """)
+
+
+# (version, description, steps)：每一步是 SQL 字符串或接收连接的函数。
+# 只能在末尾追加新版本，已发布的版本不要修改。
+MIGRATIONS = [
+    (1, "create tasks table", [
+        """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            priority TEXT,
+            status TEXT,
+            due_date TEXT,
+            depends_on INTEGER,
+            parent_id INTEGER,
+            FOREIGN KEY(parent_id) REFERENCES tasks(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_tasks_parent_id ON tasks(parent_id)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status)",
+    ]),
+    (2, "create reminders table", [
+        """
+        CREATE TABLE IF NOT EXISTS reminders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+            reminder_time TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_reminders_task_id ON reminders(task_id)",
+    ]),
+    (3, "remove orphaned tasks", [
+        _delete_orphans,
+    ]),
+    (4, "add task change log", [
+        """
+        CREATE TABLE IF NOT EXISTS task_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id INTEGER,
+            op TEXT NOT NULL
+        )
+        """,
+        # 压缩水位线：seq 不大于它的记录已被删除
+        """
+        CREATE TABLE IF NOT EXISTS task_changes_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            compacted_through INTEGER NOT NULL
+        )
+        """,
+        "INSERT OR IGNORE INTO task_changes_state (id, compacted_through) VALUES (1, 0)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_log_insert AFTER INSERT ON tasks
+        BEGIN
+            INSERT INTO task_changes (task_id, op) VALUES (NEW.id, 'insert');
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_log_update AFTER UPDATE ON tasks
+        BEGIN
+            INSERT INTO task_changes (task_id, op) VALUES (NEW.id, 'update');
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_log_delete AFTER DELETE ON tasks
+        BEGIN
+            INSERT INTO task_changes (task_id, op) VALUES (OLD.id, 'delete');
+        END
+        """,
+    ]),
+    (5, "add full-text search index", [
+        _create_fts,
+    ]),
+    (6, "add task_closure hierarchy index", [
+        """
+        CREATE TABLE IF NOT EXISTS task_closure (
+            ancestor INTEGER NOT NULL,
+            descendant INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor, descendant)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_task_closure_descendant ON task_closure(descendant, depth)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_closure_insert AFTER INSERT ON tasks
+        BEGIN
+            INSERT INTO task_closure (ancestor, descendant, depth) VALUES (NEW.id, NEW.id, 0);
+            INSERT INTO task_closure (ancestor, descendant, depth)
+            SELECT ancestor, NEW.id, depth + 1 FROM task_closure WHERE descendant = NEW.parent_id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_closure_delete AFTER DELETE ON tasks
+        BEGIN
+            DELETE FROM task_closure WHERE descendant = OLD.id;
+        END
+        """,
+        # 禁止把任务移动到自己的子树下
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_closure_move_check BEFORE UPDATE OF parent_id ON tasks
+        WHEN NEW.parent_id IS NOT NULL
+        BEGIN
+            SELECT RAISE(ABORT, 'cannot move a task under its own subtree')
+            WHERE EXISTS (
+                SELECT 1 FROM task_closure WHERE ancestor = NEW.id AND descendant = NEW.parent_id
+            );
+        END
+        """,
+        # 移动子树：断开与旧祖先的连接，再与新祖先做笛卡尔积
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_closure_move AFTER UPDATE OF parent_id ON tasks
+        WHEN OLD.parent_id IS NOT NEW.parent_id
+        BEGIN
+            DELETE FROM task_closure
+            WHERE descendant IN (SELECT descendant FROM task_closure WHERE ancestor = NEW.id)
+              AND ancestor IN (SELECT ancestor FROM task_closure WHERE descendant = NEW.id AND ancestor != NEW.id);
+            INSERT INTO task_closure (ancestor, descendant, depth)
+            SELECT supertree.ancestor, subtree.descendant, supertree.depth + subtree.depth + 1
+            FROM task_closure AS supertree CROSS JOIN task_closure AS subtree
+            WHERE supertree.descendant = NEW.parent_id AND subtree.ancestor = NEW.id;
+        END
+        """,
+        closure.rebuild,
+    ]),
+    (7, "add task_stats progress counters", [
+        """
+        CREATE TABLE IF NOT EXISTS task_stats (
+            scope TEXT PRIMARY KEY,
+            total INTEGER NOT NULL DEFAULT 0,
+            not_started INTEGER NOT NULL DEFAULT 0,
+            in_progress INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """,
+        _create_stats_triggers,
+        stats.rebuild,
+    ]),
+    (8, "add task_rollups per-task progress counters", [
+        """
+        CREATE TABLE IF NOT EXISTS task_rollups (
+            task_id INTEGER PRIMARY KEY,
+            child_count INTEGER NOT NULL DEFAULT 0,
+            completed_count INTEGER NOT NULL DEFAULT 0,
+            descendant_count INTEGER NOT NULL DEFAULT 0,
+            completed_descendant_count INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        # 祖先一律从父任务的闭包行推导，不依赖闭包触发器的执行顺序
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_rollups_insert AFTER INSERT ON tasks
+        BEGIN
+            INSERT INTO task_rollups (task_id) VALUES (NEW.id);
+            UPDATE task_rollups SET child_count = child_count + 1,
+                completed_count = completed_count + (NEW.status IS 'completed')
+            WHERE task_id = NEW.parent_id;
+            UPDATE task_rollups SET descendant_count = descendant_count + 1,
+                completed_descendant_count = completed_descendant_count + (NEW.status IS 'completed')
+            WHERE task_id IN (SELECT ancestor FROM task_closure WHERE descendant = NEW.parent_id);
+        END
+        """,
+        # 删除子树时行的删除顺序不定：祖先先被删除时，它的计数已连同整棵子树一起扣掉，
+        # 所以只扣减到第一个已删除的祖先为止（闭包里经过它的行此时仍然存在）
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_rollups_delete AFTER DELETE ON tasks
+        BEGIN
+            UPDATE task_rollups SET child_count = child_count - 1,
+                completed_count = completed_count - (OLD.status IS 'completed')
+            WHERE task_id = OLD.parent_id;
+            UPDATE task_rollups SET
+                descendant_count = descendant_count - 1 - (
+                    SELECT descendant_count FROM task_rollups WHERE task_id = OLD.id),
+                completed_descendant_count = completed_descendant_count - (OLD.status IS 'completed') - (
+                    SELECT completed_descendant_count FROM task_rollups WHERE task_id = OLD.id)
+            WHERE task_id IN (
+                SELECT ancestor FROM task_closure
+                WHERE descendant = OLD.parent_id AND depth < COALESCE((
+                    SELECT MIN(depth) FROM task_closure AS gap
+                    WHERE gap.descendant = OLD.parent_id
+                      AND NOT EXISTS (SELECT 1 FROM tasks WHERE tasks.id = gap.ancestor)
+                ), depth + 1)
+            );
+            DELETE FROM task_rollups WHERE task_id = OLD.id;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_rollups_status AFTER UPDATE OF status ON tasks
+        WHEN (OLD.status IS 'completed') != (NEW.status IS 'completed') AND OLD.parent_id IS NEW.parent_id
+        BEGIN
+            UPDATE task_rollups
+            SET completed_count = completed_count + (NEW.status IS 'completed') - (OLD.status IS 'completed')
+            WHERE task_id = NEW.parent_id;
+            UPDATE task_rollups SET completed_descendant_count = completed_descendant_count
+                + (NEW.status IS 'completed') - (OLD.status IS 'completed')
+            WHERE task_id IN (SELECT ancestor FROM task_closure WHERE descendant = NEW.parent_id);
+        END
+        """,
+        # 移动时把整棵子树的计数从旧祖先挪到新祖先，同一语句里的状态变化也在这里处理
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_rollups_move AFTER UPDATE OF parent_id ON tasks
+        WHEN OLD.parent_id IS NOT NEW.parent_id
+        BEGIN
+            UPDATE task_rollups SET child_count = child_count - 1,
+                completed_count = completed_count - (OLD.status IS 'completed')
+            WHERE task_id = OLD.parent_id;
+            UPDATE task_rollups SET
+                descendant_count = descendant_count - 1 - (
+                    SELECT descendant_count FROM task_rollups WHERE task_id = NEW.id),
+                completed_descendant_count = completed_descendant_count - (OLD.status IS 'completed') - (
+                    SELECT completed_descendant_count FROM task_rollups WHERE task_id = NEW.id)
+            WHERE task_id IN (SELECT ancestor FROM task_closure WHERE descendant = OLD.parent_id);
+            UPDATE task_rollups SET child_count = child_count + 1,
+                completed_count = completed_count + (NEW.status IS 'completed')
+            WHERE task_id = NEW.parent_id;
+            UPDATE task_rollups SET
+                descendant_count = descendant_count + 1 + (
+                    SELECT descendant_count FROM task_rollups WHERE task_id = NEW.id),
+                completed_descendant_count = completed_descendant_count + (NEW.status IS 'completed') + (
+                    SELECT completed_descendant_count FROM task_rollups WHERE task_id = NEW.id)
+            WHERE task_id IN (SELECT ancestor FROM task_closure WHERE descendant = NEW.parent_id);
+        END
+        """,
+        rollups.rebuild,
+    ]),
+    (9, "index pending reminders by time", [
+        "ALTER TABLE reminders ADD COLUMN fired INTEGER NOT NULL DEFAULT 0",
+        # 统一为 'YYYY-MM-DD HH:MM:SS'，使按字符串比较等同于按时间比较
+        """
+        UPDATE /* full scan */ reminders SET reminder_time = strftime('%Y-%m-%d %H:%M:%S', reminder_time)
+        WHERE strftime('%Y-%m-%d %H:%M:%S', reminder_time) IS NOT NULL
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_reminders_pending ON reminders(reminder_time) WHERE fired = 0",
+    ]),
+    (10, "add normalized due_day column", [
+        # 距 1970-01-01 的天数；虚拟生成列，任何写入 due_date 的路径都自动同步，
+        # 无法解析的 due_date 得到 NULL（需要 SQLite 3.31+）
+        """
+        ALTER TABLE tasks ADD COLUMN due_day INTEGER GENERATED ALWAYS AS (
+            CAST(julianday(date(replace(trim(due_date), '/', '-'))) - 2440587.5 AS INTEGER)
+        ) VIRTUAL
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_tasks_due_day ON tasks(due_day)",
+    ]),
+    (11, "add task dependency graph and blocked set", [
+        """
+        CREATE TABLE IF NOT EXISTS task_dependencies (
+            task_id INTEGER NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+            depends_on INTEGER NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+            PRIMARY KEY (task_id, depends_on)
+        ) WITHOUT ROWID
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_task_dependencies_depends_on ON task_dependencies(depends_on, task_id)",
+        # 被阻塞的任务及其未完成依赖数；计数归零即移出集合
+        """
+        CREATE TABLE IF NOT EXISTS task_blocked (
+            task_id INTEGER PRIMARY KEY,
+            unmet INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_task_dependencies_insert AFTER INSERT ON task_dependencies
+        WHEN (SELECT status FROM tasks WHERE id = NEW.depends_on) IS NOT 'completed'
+        BEGIN
+            INSERT INTO task_blocked (task_id, unmet) VALUES (NEW.task_id, 1)
+            ON CONFLICT (task_id) DO UPDATE SET unmet = unmet + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_task_dependencies_delete AFTER DELETE ON task_dependencies
+        WHEN (SELECT status FROM tasks WHERE id = OLD.depends_on) IS NOT 'completed'
+        BEGIN
+            UPDATE task_blocked SET unmet = unmet - 1 WHERE task_id = OLD.task_id;
+            DELETE FROM task_blocked WHERE task_id = OLD.task_id AND unmet <= 0;
+        END
+        """,
+        # 级联删除发生在任务行删除之后，届时已读不到依赖的状态，所以先在这里删边
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_dependencies_delete BEFORE DELETE ON tasks
+        BEGIN
+            DELETE FROM task_dependencies WHERE depends_on = OLD.id;
+            DELETE FROM task_dependencies WHERE task_id = OLD.id;
+            DELETE FROM task_blocked WHERE task_id = OLD.id;
+        END
+        """,
+        # 完成/取消完成只影响直接依赖它的任务：O(出度)
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_dependencies_completed AFTER UPDATE OF status ON tasks
+        WHEN NEW.status IS 'completed' AND OLD.status IS NOT 'completed'
+        BEGIN
+            UPDATE task_blocked SET unmet = unmet - 1
+            WHERE task_id IN (SELECT task_id FROM task_dependencies WHERE depends_on = NEW.id);
+            DELETE FROM task_blocked
+            WHERE unmet <= 0 AND task_id IN (SELECT task_id FROM task_dependencies WHERE depends_on = NEW.id);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_dependencies_reopened AFTER UPDATE OF status ON tasks
+        WHEN OLD.status IS 'completed' AND NEW.status IS NOT 'completed'
+        BEGIN
+            INSERT INTO task_blocked (task_id, unmet)
+            SELECT task_id, 1 FROM task_dependencies WHERE depends_on = NEW.id
+            ON CONFLICT (task_id) DO UPDATE SET unmet = unmet + 1;
+        END
+        """,
+        # 旧的单值 depends_on 列：新任务带上它时同步为一条边
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_tasks_depends_on_insert AFTER INSERT ON tasks
+        WHEN NEW.depends_on IS NOT NULL AND NEW.depends_on IS NOT NEW.id
+        BEGIN
+            INSERT OR IGNORE INTO task_dependencies (task_id, depends_on)
+            SELECT NEW.id, id FROM tasks WHERE id = NEW.depends_on;
+        END
+        """,
+        dependencies.import_depends_on_column,
+        dependencies.rebuild,
+    ]),
+    (12, "add project shard registry", [
+        # 主库中：拆分到单独文件的顶层项目及其文件名（相对于分片目录）
+        """
+        CREATE TABLE IF NOT EXISTS task_shards (
+            root_id INTEGER PRIMARY KEY,
+            path TEXT NOT NULL
+        )
+        """,
+        # 分片文件中：从主库预留的 id 段的末尾，按表记录
+        """
+        CREATE TABLE IF NOT EXISTS shard_id_blocks (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """,
+    ]),
+    # 按 (ancestor, depth) 读出的子树已是父节点在前，拆分和合并项目时无需排序
+    (13, "index task_closure by ancestor and depth", [
+        "CREATE INDEX IF NOT EXISTS idx_task_closure_ancestor_depth ON task_closure(ancestor, depth)",
+    ]),
+    # 索引隐含 rowid（即 id），按优先级过滤的分页可走 (priority, id) 范围
+    (14, "index tasks by priority", [
+        "CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks(priority)",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target=LATEST_VERSION):
+    """Applies every pending migration up to ``target``, one transaction each.
+
+    Returns the schema version after running.
+    """
+    version = get_version(conn)
+    if version >= target:
+        return version
+
+    for number, description, steps in MIGRATIONS:
+        if number <= version or number > target:
+            continue
+        logger.info(f"Applying migration {number}: {description}")
+        conn.execute("BEGIN IMMEDIATE")
+        # 另一个进程可能已在我们等待写锁期间完成了这一步
+        if get_version(conn) >= number:
+            conn.rollback()
+            version = number
+            continue
+        try:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f"PRAGMA user_version = {int(number)}")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        version = number
+    return version
@@ -0,0 +1,194 @@
+"""Query-plan audit and index advisor for the statements the app issues.
+
+The statements are not listed by hand: ``record`` traces what the app
+actually runs, and tests/test_query_plans.py fails when any of it scans a
+table without declaring FULL_SCAN or sorts in a temporary B-tree. The
+workload it records, and the command that prints a report for the
+configured database, live in tests/query_workload.py.
+"""
+import re
+import logging
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+from . import database
+
+logger = logging.getLogger(__name__)
+
+Statement = namedtuple('Statement', ['sql', 'allow_scan'])
+Finding = namedtuple('Finding', ['name', 'kind', 'detail'])
+
+# 有意读取整张表的语句（如全量加载、导出、拆分复制）在 SQL 中带上这个注释，审计时其扫描不算作问题（临时 B 树排序仍会报告）
+FULL_SCAN = "/* full scan */"
+
+# 只有几行的表：扫描它们不是问题（FTS5 的配置表由扩展自己读取）
+SMALL_TABLES = {'sqlite_master', 'sqlite_schema', 'sqlite_sequence', 'task_shards', 'task_stats',
+                'task_changes_state', 'shard_id_blocks', 'tasks_fts_config'}
+
+_DML = re.compile(r'^\s*(?:/\*.*?\*/\s*)*(SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b', re.IGNORECASE | re.DOTALL)
+_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\?(?:\s*,\s*\?)+')
+# 分片文件与主库结构相同：ATTACH 的模式名换成 main 即可在主库上解释
+_SHARD_SCHEMA = re.compile(r'\bshard(?:_\d+)?\.')
+
+
+def normalize(sql):
+    """Returns ``sql`` with literals replaced by ``?`` and whitespace collapsed, as a key for distinct statements."""
+    key = _NUMBER.sub('?', _LITERAL.sub('?', sql))
+    return " ".join(_PLACEHOLDER_LIST.sub('?, ...', key).split())
+
+
+@contextmanager
+def record():
+    """Collects the distinct data statements the app runs inside the block, on every managed connection.
+
+    Yields a dict filled in as statements run: ``{normalized sql:
+    Statement}``, keeping the first concrete statement seen for each.
+    Statements carrying FULL_SCAN are marked ``allow_scan``.
+    """
+    statements = {}
+    lock = threading.Lock()
+
+    def trace(sql):
+        if not _DML.match(sql):
+            return
+        key = normalize(sql)
+        with lock:
+            if key not in statements:
+                statements[key] = Statement(sql, FULL_SCAN in sql)
+    database.set_trace(trace)
+    try:
+        yield statements
+    finally:
+        database.set_trace(None)
+
+
+_SCAN = re.compile(r'^SCAN (?:\w+\.)?(\w+)(?: USING (?:COVERING )?INDEX (\w+))?')
+_INDEX_USED = re.compile(r'USING (?:COVERING )?INDEX (\w+)')
+_CTE_NAMES = re.compile(r'(?:WITH(?: RECURSIVE)?|,)\s*(\w+)\s*(?:\([^)]*\))?\s+AS\s*\(', re.IGNORECASE)
+
+
+def explain(conn, sql):
+    """Returns the EXPLAIN QUERY PLAN detail lines for ``sql`` (placeholders bound to NULL)."""
+    sql = _SHARD_SCHEMA.sub('main.', sql)
+    params = (None,) * _LITERAL.sub('', sql).count('?')
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def audit_statement(conn, name, statement):
+    """Returns the findings for one statement; ``allow_scan`` waives only the full-scan ones."""
+    findings = []
+    ctes = {match.lower() for match in _CTE_NAMES.findall(statement.sql)}
+    for detail in explain(conn, statement.sql):
+        scan = _SCAN.match(detail)
+        # 虚拟表（FTS5）的 SCAN 由其自身索引完成，不算全表扫描
+        if scan and not statement.allow_scan and 'VIRTUAL TABLE' not in detail:
+            target = scan.group(1)
+            if target.lower() not in ctes and target != 'CONSTANT' and target not in SMALL_TABLES:
+                findings.append(Finding(name, 'full_scan', detail))
+        if detail.startswith('USE TEMP B-TREE'):
+            findings.append(Finding(name, 'temp_btree', detail))
+    return findings
+
+
+def audit(conn, statements):
+    """Audits ``{name: Statement}`` (e.g. from ``record``) and returns a list of findings."""
+    findings = []
+    for name, statement in statements.items():
+        findings.extend(audit_statement(conn, name, statement))
+    return findings
+
+
+def unused_indexes(conn, statements):
+    """Returns the user-created indexes that no statement's plan uses."""
+    used = set()
+    for statement in statements.values():
+        for detail in explain(conn, statement.sql):
+            used.update(_INDEX_USED.findall(detail))
+    indexes = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+    )}
+    return sorted(indexes - used)
+
+
+def _index_columns(conn, table):
+    """Returns the leading-column tuples of every index on ``table``."""
+    columns = []
+    for index in conn.execute(f"PRAGMA index_list({table})").fetchall():
+        columns.append(tuple(row[2] for row in conn.execute(f"PRAGMA index_info({index[1]})")))
+    return columns
+
+
+def suggest_index(conn, sql):
+    """Suggests a composite index for a single-table query, or None.
+
+    Equality columns from WHERE come first, followed by a range column or
+    the ORDER BY columns, so one index serves both the filter and the sort.
+    """
+    table_match = re.search(r'\bFROM\s+(\w+)', sql, re.IGNORECASE)
+    if not table_match:
+        return None
+    table = table_match.group(1)
+
+    where_match = re.search(r'\bWHERE\b(.*?)(?:\bORDER\s+BY\b|\bGROUP\s+BY\b|\bLIMIT\b|$)',
+                            sql, re.IGNORECASE | re.DOTALL)
+    equality, ranges = [], []
+    if where_match:
+        for column, operator in re.findall(r'(\w+)\s*(=|\bIN\b|<=|>=|<|>|\bBETWEEN\b)',
+                                           where_match.group(1), re.IGNORECASE):
+            target = equality if operator.upper() in ('=', 'IN') else ranges
+            if column not in equality and column not in ranges:
+                target.append(column)
+
+    order_match = re.search(r'\bORDER\s+BY\b(.*?)(?:\bLIMIT\b|$)', sql, re.IGNORECASE | re.DOTALL)
+    order = []
+    if order_match:
+        for term in order_match.group(1).split(','):
+            column = term.strip().split()[0] if term.strip() else ''
+            if column and column not in equality:
+                order.append(column)
+
+    columns = equality + (order if order else ranges[:1])
+    if not columns or columns == ['id']:
+        return None
+    if any(existing[:len(columns)] == tuple(columns) for existing in _index_columns(conn, table)):
+        return None
+    name = f"idx_{table}_{'_'.join(columns)}"
+    return f"CREATE INDEX IF NOT EXISTS {name} ON {table}({', '.join(columns)})"
+
+
+def advise(conn, statements, findings=None):
+    """Returns CREATE INDEX statements for the statements with findings."""
+    findings = audit(conn, statements) if findings is None else findings
+    suggestions = []
+    for name in dict.fromkeys(finding.name for finding in findings):
+        statement = statements.get(name)
+        suggestion = suggest_index(conn, statement.sql) if statement else None
+        if suggestion and suggestion not in suggestions:
+            suggestions.append(suggestion)
+    return suggestions
+
+
+def apply_suggestions(suggestions):
+    """Creates the suggested indexes in one transaction and refreshes statistics."""
+    with database.transaction() as conn:
+        for sql in suggestions:
+            logger.info(f"Creating index: {sql}")
+            conn.execute(sql)
+    conn.execute("ANALYZE")
+
+
+def report(conn, statements):
+    """Formats a human-readable audit report."""
+    findings = audit(conn, statements)
+    lines = [f"Audited {len(statements)} statements, {len(findings)} finding(s)"]
+    for finding in findings:
+        lines.append(f"  [{finding.kind}] {finding.name}: {finding.detail}")
+    for suggestion in advise(conn, statements, findings):
+        lines.append(f"  suggest: {suggestion}")
+    for index in unused_indexes(conn, statements):
+        lines.append(f"  unused index: {index}")
+    return "\n".join(lines)
+
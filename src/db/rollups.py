@@ -0,0 +1,86 @@
+"""Per-task rollup counters for parent progress ("7/12 subtasks done").
+
+``task_rollups`` has one row per task with its direct ``child_count`` and
+``completed_count`` plus the ``descendant_count`` and
+``completed_descendant_count`` of its whole subtree.
+"""
+import logging
+
+from .closure import EXPECTED_CLOSURE
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ('child_count', 'completed_count', 'descendant_count', 'completed_descendant_count')
+
+# 直接从 tasks 重新计算的汇总值
+_EXPECTED_ROLLUPS = EXPECTED_CLOSURE.rstrip() + """,
+    children(id, total, done) AS (
+        SELECT parent_id, COUNT(*), SUM(status IS 'completed')
+        FROM tasks WHERE parent_id IS NOT NULL GROUP BY parent_id
+    ),
+    descendants(id, total, done) AS (
+        SELECT closure.ancestor, COUNT(*), SUM(tasks.status IS 'completed')
+        FROM closure JOIN tasks ON tasks.id = closure.descendant
+        WHERE closure.depth > 0 GROUP BY closure.ancestor
+    ),
+    expected(task_id, child_count, completed_count, descendant_count, completed_descendant_count) AS (
+        SELECT tasks.id,
+               COALESCE(children.total, 0), COALESCE(children.done, 0),
+               COALESCE(descendants.total, 0), COALESCE(descendants.done, 0)
+        FROM tasks
+        LEFT JOIN children ON children.id = tasks.id
+        LEFT JOIN descendants ON descendants.id = tasks.id
+    )
+"""
+
+
+def percent_complete(status, rollup):
+    """Weighted completion: share of completed descendants, or the task's own status for leaves."""
+    if rollup.get('descendant_count'):
+        return rollup['completed_descendant_count'] / rollup['descendant_count'] * 100
+    return 100 if status == 'completed' else 0
+
+
+def rebuild(conn):
+    """Recomputes every rollup row from ``tasks`` and ``task_closure``; caller owns the transaction.
+
+    Reads the maintained closure, so rebuild that first if it may be stale.
+    """
+    conn.execute("DELETE FROM task_rollups")
+    # 每个任务按索引计数其子节点和子树，避免 GROUP BY 产生的临时 B 树
+    conn.execute(f"""
+        INSERT /* full scan */ INTO task_rollups (task_id, {', '.join(COLUMNS)})
+        SELECT tasks.id,
+               (SELECT COUNT(*) FROM tasks AS child WHERE child.parent_id = tasks.id),
+               (SELECT COUNT(*) FROM tasks AS child
+                WHERE child.parent_id = tasks.id AND child.status IS 'completed'),
+               (SELECT COUNT(*) FROM task_closure WHERE ancestor = tasks.id AND depth > 0),
+               (SELECT COUNT(*) FROM task_closure
+                JOIN tasks AS member ON member.id = task_closure.descendant
+                WHERE task_closure.ancestor = tasks.id AND task_closure.depth > 0
+                  AND member.status IS 'completed')
+        FROM tasks
+    """)
+    logger.info("Rebuilt task_rollups")
+
+
+def check(conn):
+    """Returns the ids of tasks whose rollups differ from a fresh recount."""
+    rows = conn.execute(
+        _EXPECTED_ROLLUPS + """
+        SELECT task_id FROM (
+            SELECT * FROM expected
+            EXCEPT
+            SELECT task_id, child_count, completed_count, descendant_count, completed_descendant_count
+            FROM task_rollups
+        )
+        UNION
+        SELECT task_id FROM (
+            SELECT task_id, child_count, completed_count, descendant_count, completed_descendant_count
+            FROM task_rollups
+            EXCEPT
+            SELECT * FROM expected
+        )
+        """
+    ).fetchall()
+    return sorted(row[0] for row in rows)
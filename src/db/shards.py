@@ -0,0 +1,449 @@
+"""Top-level projects stored in database files of their own.
+
+A shard holds one project: a root task with its whole subtree, reminders
+and dependency edges, in a file with the same schema as the main one
+(``<main stem>-shards/project-<root id>.db`` next to the main file). The
+main file lists the shards in ``task_shards``. An archived project moved
+to a shard no longer adds to the main file's cache and indexes, and writes
+to one file do not take the write lock of the others.
+
+Ids stay unique across files: a shard draws its task and reminder ids
+from blocks of ID_BLOCK reserved in the main file's AUTOINCREMENT counters,
+so a project moves back without renumbering. Dependency edges cannot cross
+files, and ``split`` refuses a project that has any.
+
+Every shard has its own ConnectionManager (``open_shard``). Views over all
+projects run on separate read connections to the main file that keep the
+shards ATTACHed between calls and only catch up when the registry changes
+(``union_all``); the connections that write never have a shard attached,
+so a write transaction on one file does not lock the others.
+
+``split`` and ``merge`` copy first and delete second, each step a
+transaction that writes to one file only. A crash in between leaves a
+duplicate rather than a lost project; the stale copy is an unregistered
+shard file, replaced by the next ``split`` of that project.
+"""
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from . import database, migrations
+
+logger = logging.getLogger(__name__)
+
+# 分片每次从主库预留的 id 数
+ID_BLOCK = 1000
+
+# 未能读到连接上限时使用 SQLite 的默认值
+DEFAULT_MAX_ATTACHED = 10
+
+_TASK_COLUMNS = ['id', 'title', 'description', 'priority', 'status', 'due_date', 'depends_on', 'parent_id']
+# 分片中只有一个项目，复制其根的整棵子树
+_SHARD_LEVELS = "(SELECT descendant, depth FROM shard.task_closure WHERE ancestor = ?)"
+
+_lock = threading.Lock()
+_open = {}  # 分片文件路径 -> ShardDatabase
+
+# 跨项目查询用的只读连接：(主库的 ConnectionManager, 查询用的 ConnectionManager)
+_views = None
+_view_state = threading.local()  # 本线程查询连接上已 ATTACH 的 {路径: 模式名}
+# 每删除一个分片文件加一：同一路径可能重新拆分出新文件，旧的 ATTACH 需要重做
+_generation = 0
+
+
+class ShardDatabase:
+    """The part of the ``db.database`` interface that TaskManager uses, bound to one shard file."""
+
+    subtree_cte = staticmethod(database.subtree_cte)
+    to_epoch_day = staticmethod(database.to_epoch_day)
+    from_epoch_day = staticmethod(database.from_epoch_day)
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.manager = database.ConnectionManager(self.path, database.get_manager().pragmas)
+
+    def get_connection(self):
+        return self.manager.get_connection()
+
+    def transaction(self):
+        return self.manager.transaction()
+
+    def fetch_all(self, query, params=()):
+        return database.fetch_all(query, params, self.manager)
+
+    def execute(self, query, params=()):
+        return database.execute(query, params, self.manager)
+
+    def has_table(self, name):
+        return database.has_table(name, self.manager)
+
+    def create_table(self):
+        return migrations.migrate(self.get_connection())
+
+    def insert_task(self, title, description, priority, status, due_date, depends_on, parent_id=None):
+        with self.transaction() as conn:
+            self._reserve(conn, 'tasks', 1)
+            return database.insert_task(title, description, priority, status, due_date, depends_on, parent_id,
+                                        manager=self.manager)
+
+    def insert_tasks(self, rows):
+        rows = list(rows)
+        with self.transaction() as conn:
+            self._reserve(conn, 'tasks', len(rows))
+            return database.insert_tasks(rows, self.manager)
+
+    def add_reminder(self, task_id, reminder_time):
+        with self.transaction() as conn:
+            self._reserve(conn, 'reminders', 1)
+            return database.add_reminder(task_id, reminder_time, self.manager)
+
+    def delete_reminder(self, reminder_id):
+        database.delete_reminder(reminder_id, self.manager)
+
+    def get_reminders(self, after_id=0, limit=database.REMINDER_PAGE):
+        return database.get_reminders(after_id, limit, self.manager)
+
+    def delete_orphans(self):
+        return database.delete_orphans(self.manager)
+
+    def clear_tasks(self):
+        database.clear_tasks(self.manager)
+
+    def close(self):
+        self.manager.close_all()
+
+    def _reserve(self, conn, table, count):
+        """Makes sure the next ``count`` AUTOINCREMENT ids of ``table`` lie in a block reserved in the main file.
+
+        Only touches the main file when the current block is used up.
+        """
+        seq, last_id = conn.execute("""
+            SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = ?), 0),
+                   (SELECT last_id FROM shard_id_blocks WHERE name = ?)
+        """, (table, table)).fetchone()
+        if last_id is not None and seq + count <= last_id:
+            return
+        size = max(count, ID_BLOCK)
+        first = database.reserve_ids(table, size)
+        # AUTOINCREMENT 从 seq + 1 开始分配：拨到新 id 段的起点
+        conn.execute("""
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT ?, 0 WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+        """, (table, table))
+        conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (first - 1, table))
+        conn.execute("""
+            INSERT INTO shard_id_blocks (name, last_id) VALUES (?, ?)
+            ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id
+        """, (table, first + size - 1))
+
+
+def shard_dir():
+    """Returns the directory holding the shards of the configured main file."""
+    main = Path(database.DATABASE_PATH)
+    return main.with_name(f"{main.stem}-shards")
+
+
+def list_shards():
+    """Returns {root_id: path} for the projects stored in shard files."""
+    if not database.has_table('task_shards'):
+        return {}
+    rows = database.fetch_all("SELECT root_id, path FROM task_shards ORDER BY root_id")
+    return {root_id: shard_dir() / name for root_id, name in rows}
+
+
+def open_shard(path):
+    """Returns the ShardDatabase for ``path``, creating the file and its schema on first use."""
+    key = str(path)
+    with _lock:
+        shard = _open.get(key)
+        if shard is None:
+            shard = _open[key] = ShardDatabase(path)
+            shard.create_table()
+    return shard
+
+
+def close_shard(path):
+    with _lock:
+        shard = _open.pop(str(path), None)
+    if shard is not None:
+        shard.close()
+
+
+def close_all():
+    """Closes the connections of every opened shard, e.g. before switching to another main file."""
+    global _views
+    with _lock:
+        opened = list(_open.values())
+        _open.clear()
+        views, _views = _views, None
+    for shard in opened:
+        shard.close()
+    if views is not None:
+        views[1].close_all()
+
+
+def _remove_file(path):
+    global _generation
+    close_shard(path)
+    _generation += 1
+    # 本线程的查询连接立即 DETACH；其他线程在下次查询时发现 _generation 变化
+    _detach_views()
+    for suffix in ('', '-wal', '-shm'):
+        try:
+            Path(f"{path}{suffix}").unlink(missing_ok=True)
+        except OSError as e:
+            # Windows 上其他线程的查询连接仍打开着该文件：留下未登记的文件，下次拆分时覆盖
+            logger.warning(f"无法删除分片文件 {Path(path).name}{suffix}: {e}")
+
+
+@contextmanager
+def _attached(conn, paths):
+    """ATTACHes ``{schema name: path}`` to ``conn`` for the enclosed block (outside any transaction)."""
+    attached = []
+    try:
+        for name, path in paths.items():
+            open_shard(path)
+            conn.execute(f"ATTACH DATABASE ? AS {name}", (str(path),))
+            attached.append(name)
+        yield conn
+    finally:
+        for name in attached:
+            conn.execute(f"DETACH DATABASE {name}")
+
+
+def _copy_sql(source, target, levels):
+    """INSERT ... SELECT copying tasks (parents first), reminders and edges between two schemas.
+
+    ``levels`` selects (descendant, depth) of the project from the closure
+    by ``ancestor = ?``; the index on (ancestor, depth) yields it parents
+    first. The copies read the whole project, so they carry the query
+    audit's full-scan marker.
+    """
+    columns = ", ".join(_TASK_COLUMNS)
+    selected = ", ".join(f"tasks.{column}" for column in _TASK_COLUMNS)
+    return [
+        f"""
+        INSERT /* full scan */ INTO {target}.tasks ({columns})
+        SELECT {selected} FROM {source}.tasks AS tasks
+        JOIN {levels} AS levels ON levels.descendant = tasks.id
+        ORDER BY levels.depth
+        """,
+        f"""
+        INSERT /* full scan */ INTO {target}.reminders (id, task_id, reminder_time, fired)
+        SELECT id, task_id, reminder_time, fired FROM {source}.reminders
+        WHERE task_id IN (SELECT descendant FROM {levels})
+        """,
+        # 旧 depends_on 列已由插入触发器转成了边，这里忽略重复
+        f"""
+        INSERT /* full scan */ OR IGNORE INTO {target}.task_dependencies (task_id, depends_on)
+        SELECT task_id, depends_on FROM {source}.task_dependencies
+        WHERE task_id IN (SELECT descendant FROM {levels})
+        """,
+    ]
+
+
+def split(root_id):
+    """Moves the project rooted at ``root_id`` out of the main file into a new shard; returns its path.
+
+    Raises ValueError if ``root_id`` is not a top-level task or the project
+    has dependency edges to or from other projects.
+    """
+    rows = database.fetch_all("SELECT parent_id FROM tasks WHERE id = ?", (root_id,))
+    if not rows:
+        raise ValueError(f"Task {root_id} does not exist")
+    if rows[0][0] is not None:
+        raise ValueError(f"Task {root_id} is not a top-level project")
+    subtree = "SELECT descendant FROM main.task_closure WHERE ancestor = ?"
+    # 两个方向分别走 task_id 主键和 depends_on 索引，不扫描全部依赖边
+    crossing = database.fetch_all(f"""
+        SELECT (SELECT COUNT(*) FROM task_dependencies
+                WHERE task_id IN ({subtree}) AND depends_on NOT IN ({subtree}))
+             + (SELECT COUNT(*) FROM task_dependencies
+                WHERE depends_on IN ({subtree}) AND task_id NOT IN ({subtree}))
+    """, (root_id,) * 4)[0][0]
+    if crossing:
+        raise ValueError(f"Project {root_id} has {crossing} dependencies on other projects")
+
+    path = shard_dir() / f"project-{root_id}.db"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # 上次拆分中断留下的未登记文件
+    _remove_file(path)
+
+    conn = database.get_connection()
+    levels = "(SELECT descendant, depth FROM main.task_closure WHERE ancestor = ?)"
+    with _attached(conn, {'shard': path}):
+        with database.transaction():
+            for sql in _copy_sql('main', 'shard', levels):
+                conn.execute(sql, (root_id,))
+        with database.transaction():
+            conn.execute(f"DELETE FROM main.tasks WHERE id IN ({subtree})", (root_id,))
+            conn.execute("INSERT INTO main.task_shards (root_id, path) VALUES (?, ?)", (root_id, path.name))
+    logger.info(f"项目 {root_id} 已移至 {path.name}")
+    return path
+
+
+def merge(root_id):
+    """Moves the project rooted at ``root_id`` from its shard back into the main file and deletes the shard."""
+    path = list_shards().get(root_id)
+    if path is None:
+        raise ValueError(f"Project {root_id} is not stored in a shard")
+    conn = database.get_connection()
+    with _attached(conn, {'shard': path}):
+        with database.transaction():
+            for sql in _copy_sql('shard', 'main', _SHARD_LEVELS):
+                conn.execute(sql, (root_id,))
+            conn.execute("DELETE FROM main.task_shards WHERE root_id = ?", (root_id,))
+    _remove_file(path)
+    logger.info(f"项目 {root_id} 已移回主库")
+
+
+def remove(root_id):
+    """Deletes the project rooted at ``root_id`` together with its shard file; False if it has none."""
+    path = list_shards().get(root_id)
+    if path is None:
+        return False
+    database.execute("DELETE FROM task_shards WHERE root_id = ?", (root_id,))
+    _remove_file(path)
+    logger.info(f"项目 {root_id} 及其分片文件已删除")
+    return True
+
+
+def remove_all():
+    """Deletes every shard file and empties the registry (used when all tasks are cleared)."""
+    for root_id in list_shards():
+        remove(root_id)
+
+
+def merge_into(conn):
+    """Copies every shard into the database of ``conn`` and empties its registry.
+
+    Used on the copy a backup is taken from, so a snapshot holds all
+    projects in one file. ``conn`` must be in autocommit mode and outside a
+    transaction.
+    """
+    paths = list_shards()
+    for root_id, path in paths.items():
+        if not path.exists():
+            continue
+        with _attached(conn, {'shard': path}):
+            conn.execute("BEGIN")
+            try:
+                for sql in _copy_sql('shard', 'main', _SHARD_LEVELS):
+                    conn.execute(sql, (root_id,))
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+    conn.execute("DELETE FROM task_shards")
+    return len(paths)
+
+
+def reconcile(previous=()):
+    """Checks the registry against the shard files after the main file was replaced (e.g. restored).
+
+    Deletes the files in ``previous`` (the shard paths registered before)
+    that the new registry no longer lists, since snapshots hold those
+    projects merged in (``merge_into``); drops registry rows whose file is
+    gone; and moves the main file's AUTOINCREMENT counters past every id a
+    shard has used or reserved.
+    """
+    registered = list_shards()
+    for path in set(map(Path, previous)) - set(registered.values()):
+        _remove_file(path)
+    for root_id, path in registered.items():
+        if not path.exists():
+            logger.warning(f"分片文件 {path.name} 不存在，已从登记表移除")
+            database.execute("DELETE FROM task_shards WHERE root_id = ?", (root_id,))
+            continue
+        shard = open_shard(path)
+        for table in ('tasks', 'reminders'):
+            used = shard.fetch_all(f"""
+                SELECT MAX(COALESCE((SELECT last_id FROM shard_id_blocks WHERE name = ?), 0),
+                           COALESCE((SELECT MAX(id) FROM {table}), 0))
+            """, (table,))[0][0]
+            next_id = database.reserve_ids(table, 0)
+            if used >= next_id:
+                database.reserve_ids(table, used - next_id + 1)
+
+
+def union_all(template, params=()):
+    """Runs a SELECT against the main file and every shard and returns all rows.
+
+    ``template`` names each table as ``{schema}.name``; it is run once per
+    file, with ``params`` each time, as one UNION ALL statement on this
+    thread's read connection, where the shards stay ATTACHed between calls.
+    Shards beyond SQLite's attach limit, and every shard when the calling
+    thread is inside a transaction (whose uncommitted writes only its own
+    connection sees), are queried on their own connections instead. The
+    order of rows across files is undefined.
+    """
+    paths = list(list_shards().values())
+    if not paths:
+        return database.fetch_all(template.format(schema='main'), params)
+    if database.get_connection().in_transaction:
+        rows, separate = database.fetch_all(template.format(schema='main'), params), paths
+    else:
+        conn, schemas, separate = _sync_views(paths)
+        sql = " UNION ALL ".join(f"SELECT * FROM ({template.format(schema=schema)})" for schema in ['main'] + schemas)
+        rows = conn.execute(sql, tuple(params) * (len(schemas) + 1)).fetchall()
+    for path in separate:
+        rows.extend(open_shard(path).fetch_all(template.format(schema='main'), params))
+    return rows
+
+
+def _view_manager():
+    global _views
+    main = database.get_manager()
+    with _lock:
+        if _views is None or _views[0] is not main:
+            if _views is not None:
+                _views[1].close_all()
+            _views = (main, database.ConnectionManager(main.path, main.pragmas))
+        return _views[1]
+
+
+def _sync_views(paths):
+    """Brings the ATTACHed shards of this thread's read connection in line with ``paths``.
+
+    Returns ``(connection, schema names of the attached paths, paths left
+    over beyond the attach limit)``. Only registry changes cost an ATTACH
+    or DETACH; the connection never opens a write transaction.
+    """
+    conn = _view_manager().get_connection()
+    state = _view_state
+    if getattr(state, 'conn', None) is not conn or state.generation != _generation:
+        if getattr(state, 'conn', None) is conn:
+            _detach_views()
+        state.conn, state.schemas, state.generation = conn, {}, _generation
+    wanted = {str(path) for path in paths}
+    for key in [key for key in state.schemas if key not in wanted]:
+        conn.execute(f"DETACH DATABASE {state.schemas.pop(key)}")
+
+    getlimit = getattr(conn, 'getlimit', None)
+    max_attached = getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) if getlimit else DEFAULT_MAX_ATTACHED
+    for path in paths:
+        if str(path) in state.schemas or len(state.schemas) >= max_attached:
+            continue
+        used = set(state.schemas.values())
+        name = next(f"shard_{n}" for n in range(max_attached + 1) if f"shard_{n}" not in used)
+        # 确保文件存在且结构最新，再 ATTACH
+        open_shard(path)
+        conn.execute(f"ATTACH DATABASE ? AS {name}", (str(path),))
+        state.schemas[str(path)] = name
+    schemas = [state.schemas[str(path)] for path in paths if str(path) in state.schemas]
+    return conn, schemas, [path for path in paths if str(path) not in state.schemas]
+
+
+def _detach_views():
+    """DETACHes every shard from this thread's read connection."""
+    conn = getattr(_view_state, 'conn', None)
+    schemas = getattr(_view_state, 'schemas', {})
+    if conn is not None:
+        for name in schemas.values():
+            try:
+                conn.execute(f"DETACH DATABASE {name}")
+            except sqlite3.Error:
+                break  # 连接已被 close_all 关闭
+        schemas.clear()
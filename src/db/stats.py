@@ -0,0 +1,66 @@
+"""Trigger-maintained task counters backing the progress display.
+
+``task_stats`` has one row per scope: ``all`` counts every task, ``roots``
+only top-level tasks and ``leaves`` only tasks without children. Each row
+holds the total plus a column per status, so the progress display reads
+one row instead of counting tasks.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ('all', 'roots', 'leaves')
+STATUSES = ('not_started', 'in_progress', 'completed')
+
+_SCOPE_FILTERS = {
+    'all': "1",
+    'roots': "parent_id IS NULL",
+    'leaves': "NOT EXISTS (SELECT 1 FROM tasks AS child WHERE child.parent_id = tasks.id)",
+}
+
+
+def delta_sql(scope, status_expr, delta, condition="1"):
+    """Returns an UPDATE adding ``delta`` to ``scope`` for a task whose status is ``status_expr``."""
+    status_columns = ",\n".join(
+        f"{status} = {status} + ({delta}) * (({status_expr}) IS '{status}')" for status in STATUSES
+    )
+    return f"""
+        UPDATE task_stats SET total = total + ({delta}),
+            {status_columns}
+        WHERE scope = '{scope}' AND ({condition});
+    """
+
+
+def compute(conn):
+    """Counts tasks per scope and status straight from the tasks table."""
+    counts = {}
+    status_sums = ", ".join(f"SUM(status IS '{status}')" for status in STATUSES)
+    for scope in SCOPES:
+        row = conn.execute(
+            f"SELECT /* full scan */ COUNT(*), {status_sums} FROM tasks WHERE {_SCOPE_FILTERS[scope]}"
+        ).fetchone()
+        counts[scope] = tuple(value or 0 for value in row)
+    return counts
+
+
+def read(conn):
+    """Returns the maintained counters as {scope: (total, *per-status counts)}."""
+    columns = ", ".join(('total',) + STATUSES)
+    return {row[0]: tuple(row[1:]) for row in conn.execute(f"SELECT scope, {columns} FROM task_stats")}
+
+
+def rebuild(conn):
+    """Recomputes every counter row; caller owns the transaction."""
+    conn.execute("DELETE FROM task_stats")
+    columns = ", ".join(('scope', 'total') + STATUSES)
+    placeholders = ", ".join('?' * (len(STATUSES) + 2))
+    for scope, values in compute(conn).items():
+        conn.execute(f"INSERT INTO task_stats ({columns}) VALUES ({placeholders})", (scope,) + values)
+    logger.info("Rebuilt task_stats")
+
+
+def check(conn):
+    """Returns the scopes whose maintained counters differ from a fresh count."""
+    expected, actual = compute(conn), read(conn)
+    return {scope: {'expected': expected[scope], 'actual': actual.get(scope)}
+            for scope in SCOPES if expected[scope] != actual.get(scope)}
@@ -0,0 +1,208 @@
+"""In-memory algorithms over the task dependency graph.
+
+Edges are (task_id, depends_on) pairs as stored in ``task_dependencies``;
+a task must come after every task it depends on.
+"""
+import heapq
+from collections import defaultdict, deque
+
+
+def topological_order(task_ids, edges):
+    """Orders ``task_ids`` so every task follows its dependencies (Kahn's algorithm, O(V + E)).
+
+    Independent tasks keep the order of ``task_ids``. Raises ValueError if the edges
+    contain a cycle.
+    """
+    task_ids = list(task_ids)
+    dependents = defaultdict(list)
+    unmet = dict.fromkeys(task_ids, 0)
+    for task_id, depends_on in edges:
+        dependents[depends_on].append(task_id)
+        unmet[task_id] += 1
+
+    ready = deque(task_id for task_id in task_ids if unmet[task_id] == 0)
+    order = []
+    while ready:
+        task_id = ready.popleft()
+        order.append(task_id)
+        for dependent in dependents[task_id]:
+            unmet[dependent] -= 1
+            if unmet[dependent] == 0:
+                ready.append(dependent)
+    if len(order) != len(unmet):
+        raise ValueError("Dependency graph contains a cycle")
+    return order
+
+
+class Schedule:
+    """Critical-path schedule over the dependency DAG, kept current incrementally.
+
+    Days are epoch days and inclusive: a task runs from ``start`` through
+    ``finish``. Every unfinished task takes ``duration`` days and completed
+    tasks none, so a completed task "finishes" the day before it would
+    start. A task starts the day after its last dependency finishes, and
+    never before ``today``. Its latest finish is the earliest of its own due
+    day, the latest start of each dependent minus one, or the project end
+    when it has neither. Slack is latest minus earliest finish and is
+    negative when a deadline cannot be met.
+
+    Building costs O(V + E). After an edit, only the tasks whose dates
+    actually change are recomputed, visited in topological order. A full
+    backward pass runs only when the project end moves.
+    """
+
+    def __init__(self, tasks, edges, today, duration=1):
+        """``tasks`` yields (task_id, status, due_day); ``edges`` yields (task_id, depends_on)."""
+        self.today = today
+        self.duration = duration
+        self.length = {}
+        self.due = {}
+        self.dependencies = defaultdict(set)
+        self.dependents = defaultdict(set)
+        for task_id, status, due_day in tasks:
+            self.length[task_id] = 0 if status == 'completed' else duration
+            self.due[task_id] = due_day
+        for task_id, depends_on in edges:
+            self.dependencies[task_id].add(depends_on)
+            self.dependents[depends_on].add(task_id)
+        self.start, self.finish, self.latest = {}, {}, {}
+        self._path = None
+        self._reorder()
+        for task_id in self.order:
+            self._compute_earliest(task_id)
+        self.end = max(self.finish.values(), default=today - 1)
+        self._backward_all()
+
+    def slack(self, task_id):
+        return self.latest[task_id] - self.finish[task_id]
+
+    def is_critical(self, task_id):
+        """True for an unfinished task that cannot slip without delaying the project or a deadline."""
+        return self.length[task_id] > 0 and self.slack(task_id) <= 0
+
+    def critical_path(self):
+        """Returns the chain of tasks that determines the project end, first task first."""
+        if self._path is None:
+            self._path = self._trace_critical_path()
+        return list(self._path)
+
+    def _trace_critical_path(self):
+        if self.end < self.today:
+            return []  # 没有未完成的任务
+        # 并列时取 id 最小者，结果与增量更新的顺序无关
+        task_id = min(task_id for task_id, finish in self.finish.items() if finish == self.end)
+        path = [task_id]
+        while True:
+            # 沿着决定开始时间的依赖回溯
+            driver = min((dependency for dependency in self.dependencies[task_id]
+                          if self.finish[dependency] + 1 == self.start[task_id]), default=None)
+            if driver is None or self.start[task_id] == self.today:
+                break
+            path.append(driver)
+            task_id = driver
+        path.reverse()
+        return path
+
+    # -- edits ---------------------------------------------------------------
+
+    def add_tasks(self, tasks):
+        """Adds new tasks without dependencies; ``tasks`` yields (task_id, status, due_day)."""
+        added = []
+        for task_id, status, due_day in tasks:
+            self.length[task_id] = 0 if status == 'completed' else self.duration
+            self.due[task_id] = due_day
+            self.index[task_id] = len(self.order)
+            self.order.append(task_id)
+            added.append(task_id)
+        self._update(added, added)
+
+    def set_status(self, task_ids, status):
+        length = 0 if status == 'completed' else self.duration
+        changed = [task_id for task_id in task_ids if task_id in self.length and self.length[task_id] != length]
+        for task_id in changed:
+            self.length[task_id] = length
+        # 工期变化影响自身最早完成时间，以及依赖项的最晚完成时间（经由本任务的最晚开始时间）
+        self._update(changed, [dependency for task_id in changed for dependency in self.dependencies[task_id]])
+
+    def add_edge(self, task_id, depends_on):
+        self.dependencies[task_id].add(depends_on)
+        self.dependents[depends_on].add(task_id)
+        if self.index[depends_on] > self.index[task_id]:
+            self._reorder()
+        self._update([task_id], [depends_on])
+
+    def remove_edge(self, task_id, depends_on):
+        self.dependencies[task_id].discard(depends_on)
+        self.dependents[depends_on].discard(task_id)
+        self._update([task_id], [depends_on])
+
+    # -- passes --------------------------------------------------------------
+
+    def _reorder(self):
+        self.order = topological_order(self.length, (
+            (task_id, depends_on) for task_id, dependencies in self.dependencies.items() for depends_on in dependencies
+        ))
+        self.index = {task_id: position for position, task_id in enumerate(self.order)}
+
+    def _compute_earliest(self, task_id):
+        start = max((self.finish[dependency] + 1 for dependency in self.dependencies[task_id]), default=self.today)
+        self.start[task_id] = max(start, self.today)
+        self.finish[task_id] = self.start[task_id] + self.length[task_id] - 1
+
+    def _compute_latest(self, task_id):
+        candidates = [self.latest[dependent] - self.length[dependent] for dependent in self.dependents[task_id]]
+        if self.due[task_id] is not None:
+            candidates.append(self.due[task_id])
+        self.latest[task_id] = min(candidates) if candidates else self.end
+
+    def _backward_all(self):
+        for task_id in reversed(self.order):
+            self._compute_latest(task_id)
+
+    def _update(self, forward_seeds, backward_seeds):
+        self._path = None
+        # 前向：按拓扑序处理，完成时间未变的任务不再向后传播
+        heap = [(self.index[task_id], task_id) for task_id in set(forward_seeds)]
+        heapq.heapify(heap)
+        queued = set(forward_seeds)
+        end = self.end
+        lowered = False
+        while heap:
+            _, task_id = heapq.heappop(heap)
+            queued.discard(task_id)
+            old_finish = self.finish.get(task_id)
+            self._compute_earliest(task_id)
+            finish = self.finish[task_id]
+            if finish == old_finish:
+                continue
+            end = max(end, finish)
+            lowered = lowered or old_finish == self.end
+            for dependent in self.dependents[task_id]:
+                if dependent not in queued:
+                    queued.add(dependent)
+                    heapq.heappush(heap, (self.index[dependent], dependent))
+
+        if lowered and end == self.end:
+            # 原先决定项目结束时间的任务提前了，只能重新取最大值
+            end = max(self.finish.values(), default=self.today - 1)
+        if end != self.end:
+            self.end = end
+            self._backward_all()
+            return
+
+        # 反向：按逆拓扑序处理，最晚完成时间未变的任务不再向前传播
+        seeds = set(backward_seeds) | set(forward_seeds)
+        heap = [(-self.index[task_id], task_id) for task_id in seeds]
+        heapq.heapify(heap)
+        queued = set(seeds)
+        while heap:
+            _, task_id = heapq.heappop(heap)
+            queued.discard(task_id)
+            old_latest = self.latest.get(task_id)
+            self._compute_latest(task_id)
+            if self.latest[task_id] == old_latest:
+                continue
+            for dependency in self.dependencies[task_id]:
+                if dependency not in queued:
+                    queued.add(dependency)
+                    heapq.heappush(heap, (-self.index[dependency], dependency))
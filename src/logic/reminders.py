@@ -0,0 +1,96 @@
+"""In-memory queue of the next-due reminders.
+
+Only the earliest pending reminders are kept in a heap. The rest stay in the
+database and are fetched page by page (keyset on ``(reminder_time, id)``)
+once the heap runs dry, so arming the timer never reads the whole table.
+"""
+import heapq
+
+# 每次从数据库载入的提醒数量；内存中最多保留两倍
+REMINDER_WINDOW = 256
+
+
+class ReminderQueue:
+    """Heap of pending reminders ordered by (reminder_time, id).
+
+    ``horizon`` is the largest key that was loaded from the database: every
+    pending reminder at or before it is in the heap, later ones are only in
+    the database. It is None once everything pending fits in memory.
+    """
+
+    def __init__(self, window=REMINDER_WINDOW):
+        self.window = window
+        self.loaded = False
+        self.horizon = None
+        self._heap = []
+        self._ids = set()
+        self._cancelled = set()
+
+    def __len__(self):
+        return len(self._ids) - len(self._cancelled)
+
+    def load(self, rows):
+        """Adds a page from ``TaskManager.get_pending_reminders(after=self.horizon, limit=self.window)``."""
+        for reminder_id, task_id, reminder_time in rows:
+            if reminder_id not in self._ids:
+                self._push(reminder_id, task_id, reminder_time)
+        self.horizon = (rows[-1][2], rows[-1][0]) if len(rows) >= self.window else None
+        self.loaded = True
+
+    def add(self, reminder_id, task_id, reminder_time):
+        """Tracks a newly created reminder if it falls inside the loaded range."""
+        if not self.loaded or reminder_id in self._ids:
+            return
+        if self.horizon is not None and (reminder_time, reminder_id) > self.horizon:
+            return  # 下一次补充时会从数据库读到
+        self._push(reminder_id, task_id, reminder_time)
+        if len(self._heap) > 2 * self.window:
+            self._trim()
+
+    def discard(self, reminder_id):
+        """Forgets a deleted reminder; it is skipped when it reaches the top."""
+        if reminder_id in self._ids:
+            self._cancelled.add(reminder_id)
+
+    def next_time(self):
+        """Returns the reminder_time of the earliest pending reminder, or None."""
+        self._drop_cancelled()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """Removes and returns the reminders due at ``now`` as (id, task_id, reminder_time)."""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            reminder_time, reminder_id, task_id = heapq.heappop(self._heap)
+            self._ids.discard(reminder_id)
+            if reminder_id in self._cancelled:
+                self._cancelled.discard(reminder_id)
+                continue
+            due.append((reminder_id, task_id, reminder_time))
+        return due
+
+    @property
+    def needs_refill(self):
+        """True when the heap is empty but the database may hold later reminders."""
+        return self.loaded and self.horizon is not None and self.next_time() is None
+
+    def _push(self, reminder_id, task_id, reminder_time):
+        heapq.heappush(self._heap, (reminder_time, reminder_id, task_id))
+        self._ids.add(reminder_id)
+
+    def _drop_cancelled(self):
+        while self._heap and self._heap[0][1] in self._cancelled:
+            _, reminder_id, _ = heapq.heappop(self._heap)
+            self._ids.discard(reminder_id)
+            self._cancelled.discard(reminder_id)
+
+    def _trim(self):
+        # 只保留最早的 window 条，其余留在数据库里等待下次补充
+        kept = heapq.nsmallest(self.window, (
+            entry for entry in self._heap if entry[1] not in self._cancelled
+        ))
+        self._heap = kept
+        heapq.heapify(self._heap)
+        self._ids = {entry[1] for entry in kept}
+        self._cancelled = set()
+        self.horizon = (kept[-1][0], kept[-1][1]) if kept else None
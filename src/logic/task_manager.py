@@ -1,24 +1,573 @@
-from db import database
+from db import database, backup, closure, dependencies, maintenance, rollups, shards, stats
+from logic.dependency_graph import Schedule, topological_order
+from logic.reminders import REMINDER_WINDOW
+from logic import transfer
+import re
+import json
+import heapq
 import logging
+import threading
+from contextlib import ExitStack, contextmanager
+from datetime import date
 
 # Create a logger
 logger = logging.getLogger(__name__)
 
+TASK_COLUMNS = ['id', 'title', 'description', 'priority', 'status', 'due_date', 'depends_on', 'parent_id', 'due_day']
+
+# 显式列出任务列，表结构增加列时查询结果的布局保持不变
+TASK_SELECT = ", ".join(f"tasks.{column}" for column in TASK_COLUMNS)
+
+# get_tasks_page 支持的过滤列（各有单列索引，隐含的 id 使每一页都是索引范围查询）
+PAGE_FILTERS = ('status', 'priority', 'parent_id')
+
+# 每个任务附带的状态列：task_rollups 的汇总计数和 task_blocked 的阻塞标记，均由触发器维护
+STATE_SELECT = ", ".join(
+    [f"COALESCE(task_rollups.{column}, 0)" for column in rollups.COLUMNS] + ["task_blocked.task_id IS NOT NULL"]
+)
+STATE_JOIN = (
+    "LEFT JOIN task_rollups ON task_rollups.task_id = tasks.id "
+    "LEFT JOIN task_blocked ON task_blocked.task_id = tasks.id"
+)
+
+# 跨分片查询中的 FROM 子句：各表以原名作别名，列的写法与单库查询相同
+SHARD_STATE_FROM = (
+    "{schema}.tasks AS tasks "
+    "LEFT JOIN {schema}.task_rollups AS task_rollups ON task_rollups.task_id = tasks.id "
+    "LEFT JOIN {schema}.task_blocked AS task_blocked ON task_blocked.task_id = tasks.id"
+)
+
+# 超过这个数量的受影响任务时整体重读缓存中的状态列
+CACHE_REFRESH_LIMIT = 500
+
+# 变更日志保留的最少条数，超过两倍时自动压缩
+CHANGE_LOG_KEEP = 10000
+
+
 class TaskManager:
-    def __init__(self):
-        self.db = database
+    def __init__(self, db=None):
+        # db：默认是主库模块；分片的 TaskManager 使用 shards.ShardDatabase
+        self.db = db or database
+        # 任务树缓存：写操作就地更新，get_tasks 直接返回。
+        # 返回的树是共享对象，调用方只能读取。
+        self._cache_lock = threading.RLock()
+        self._roots = None
+        self._nodes = {}
+        # 关键路径调度缓存：首次查询时整体计算，之后随写操作增量更新
+        self._schedule = None
+        # 分片：根任务 id -> 该分片的 TaskManager，None 表示尚未读取登记表
+        self._shards = None
+        self._owners = {}  # 已查到位于分片中的任务 id -> 分片的 TaskManager
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def invalidate_cache(self):
+        """Drops the cached tree (and those of the shards); call after writing to the tasks table outside TaskManager."""
+        with self._cache_lock:
+            self._roots = None
+            self._nodes = {}
+            self._schedule = None
+            managers = list((self._shards or {}).values())
+        for manager in managers:
+            manager.invalidate_cache()
+
+    def cache_stats(self):
+        """Returns cache hit/miss counters and the number of cached tasks."""
+        with self._cache_lock:
+            return {
+                'hits': self.cache_hits,
+                'misses': self.cache_misses,
+                'loaded': self._roots is not None,
+                'size': len(self._nodes),
+            }
+
+    def _shard_managers(self):
+        """Returns {root_id: TaskManager} for the projects in shard files (always empty inside a shard)."""
+        if self.db is not database:
+            return {}
+        with self._cache_lock:
+            if self._shards is None:
+                self._shards = {root_id: TaskManager(shards.open_shard(path))
+                                for root_id, path in shards.list_shards().items()}
+            return self._shards
+
+    def _reload_shards(self):
+        with self._cache_lock:
+            self._shards = None
+            self._owners = {}
+
+    def _owner(self, task_id):
+        """Returns the TaskManager holding ``task_id``: this one, or the one of its shard file."""
+        managers = self._shard_managers()
+        if not managers or task_id is None:
+            return self
+        owner = self._owners.get(task_id)
+        if owner is not None:
+            return owner
+        if self.db.fetch_all("SELECT 1 FROM tasks WHERE id = ?", (task_id,)):
+            return self
+        for manager in managers.values():
+            if manager.db.fetch_all("SELECT 1 FROM tasks WHERE id = ?", (task_id,)):
+                self._owners[task_id] = manager
+                return manager
+        return self
+
+    def _route(self, task_ids):
+        """Splits ``task_ids`` into the ones held here and {shard TaskManager: ids} for the rest."""
+        own, others = [], {}
+        for task_id in task_ids:
+            owner = self._owner(task_id)
+            if owner is self:
+                own.append(task_id)
+            else:
+                others.setdefault(owner, []).append(task_id)
+        return own, others
+
+    def _across_shards(self, template, params=()):
+        """Runs a SELECT over this file and, from the main file, every shard; see ``shards.union_all``."""
+        if not self._shard_managers():
+            return self.db.fetch_all(template.format(schema='main'), params)
+        return shards.union_all(template, params)
+
+    def _cache_insert(self, tasks):
+        """Adds newly inserted task dicts (parents before children) to the cache."""
+        with self._cache_lock:
+            if self._roots is None:
+                return
+            for task in tasks:
+                task.setdefault('blocked', False)
+                task['ready'] = not task['blocked'] and task['status'] != 'completed'
+                self._nodes[task['id']] = task
+                if task['parent_id'] is None:
+                    self._roots.append(task)
+                else:
+                    parent = self._nodes.get(task['parent_id'])
+                    if parent:
+                        parent.setdefault('children', []).append(task)
+
+    @staticmethod
+    def _with_state(row):
+        """Turns a TASK_SELECT row followed by the STATE_SELECT columns into a task dict."""
+        task = dict(zip(TASK_COLUMNS, row))
+        task.update(zip(rollups.COLUMNS, row[len(TASK_COLUMNS):]))
+        task['percent_complete'] = rollups.percent_complete(task['status'], task)
+        task['blocked'] = bool(row[-1])
+        task['ready'] = not task['blocked'] and task['status'] != 'completed'
+        return task
+
+    def _cache_refresh_rollups(self, task_ids):
+        """Re-reads the rollup columns of ``task_ids`` and all their ancestors into the cache."""
+        with self._cache_lock:
+            if self._roots is None:
+                return
+            task_ids = [task_id for task_id in task_ids if task_id is not None]
+            if not task_ids:
+                return
+            columns = ", ".join(rollups.COLUMNS)
+            if len(task_ids) > CACHE_REFRESH_LIMIT:
+                rows = self.db.fetch_all(f"SELECT task_id, {columns} FROM task_rollups")
+            else:
+                placeholders = ", ".join("?" * len(task_ids))
+                rows = self.db.fetch_all(f"""
+                    SELECT task_id, {columns} FROM task_rollups
+                    WHERE task_id IN (SELECT ancestor FROM task_closure WHERE descendant IN ({placeholders}))
+                """, task_ids)
+            for row in rows:
+                node = self._nodes.get(row[0])
+                if node:
+                    node.update(zip(rollups.COLUMNS, row[1:]))
+                    node['percent_complete'] = rollups.percent_complete(node['status'], node)
+
+    def _cache_set_blocked(self, blocked_by_id):
+        for task_id, blocked in blocked_by_id.items():
+            node = self._nodes.get(task_id)
+            if node:
+                node['blocked'] = bool(blocked)
+                node['ready'] = not node['blocked'] and node['status'] != 'completed'
+
+    def _cache_refresh_blocked(self, task_ids=None):
+        """Re-reads the blocked flag of ``task_ids`` (every cached task when None) into the cache."""
+        with self._cache_lock:
+            if self._roots is None:
+                return
+            if task_ids is None or len(task_ids) > CACHE_REFRESH_LIMIT:
+                task_ids = list(self._nodes)
+                rows = self.db.fetch_all("SELECT /* full scan */ task_id FROM task_blocked")
+            else:
+                task_ids = list(task_ids)
+                if not task_ids:
+                    return
+                placeholders = ", ".join("?" * len(task_ids))
+                rows = self.db.fetch_all(
+                    f"SELECT task_id FROM task_blocked WHERE task_id IN ({placeholders})", task_ids
+                )
+            blocked = {row[0] for row in rows}
+            self._cache_set_blocked({task_id: task_id in blocked for task_id in task_ids})
+
+    def _cache_refresh_dependents(self, task_ids):
+        """Re-reads the blocked flag of the direct dependents of ``task_ids`` (O(out-degree))."""
+        with self._cache_lock:
+            if self._roots is None or not task_ids:
+                return
+            if len(task_ids) > CACHE_REFRESH_LIMIT:
+                return self._cache_refresh_blocked()
+            placeholders = ", ".join("?" * len(task_ids))
+            rows = self.db.fetch_all(f"""
+                SELECT task_dependencies.task_id, task_blocked.task_id IS NOT NULL
+                FROM task_dependencies
+                LEFT JOIN task_blocked ON task_blocked.task_id = task_dependencies.task_id
+                WHERE task_dependencies.depends_on IN ({placeholders})
+            """, list(task_ids))
+            self._cache_set_blocked(dict(rows))
+
+    def _cache_set_status(self, task_ids, status):
+        with self._cache_lock:
+            for task_id in task_ids:
+                node = self._nodes.get(task_id)
+                if node:
+                    node['status'] = status
+                    node['ready'] = not node.get('blocked') and status != 'completed'
+
+    def _cache_remove(self, task_ids):
+        """Removes the given tasks and their cached subtrees."""
+        with self._cache_lock:
+            if self._roots is None:
+                return
+            removed = set()
+            stack = [self._nodes[task_id] for task_id in task_ids if task_id in self._nodes]
+            touched_parents = set()
+            while stack:
+                node = stack.pop()
+                if node['id'] in removed:
+                    continue
+                removed.add(node['id'])
+                touched_parents.add(node['parent_id'])
+                stack.extend(node.get('children', []))
+            for task_id in removed:
+                del self._nodes[task_id]
+            # 每个受影响的兄弟列表只过滤一次
+            for parent_id in touched_parents:
+                if parent_id is None:
+                    self._roots[:] = [task for task in self._roots if task['id'] not in removed]
+                elif parent_id in self._nodes:
+                    parent = self._nodes[parent_id]
+                    parent['children'] = [task for task in parent.get('children', []) if task['id'] not in removed]
 
     def add_task(self, title, description="", priority="medium", status="not_started", due_date=None, depends_on=None, parent_id=None):
         """Adds a new task to the database."""
-        return self.db.insert_task(title, description, priority, status, due_date, depends_on, parent_id)
+        owner = self._owner(parent_id)
+        if owner is not self:
+            return owner.add_task(title, description, priority, status, due_date, depends_on, parent_id)
+        task_id = self.db.insert_task(title, description, priority, status, due_date, depends_on, parent_id)
+        task = dict(zip(TASK_COLUMNS, (task_id, title, description, priority, status, due_date, depends_on, parent_id, None)))
+        self._fill_due_days([task])
+        self._cache_insert([task])
+        self._cache_refresh_rollups([task_id])
+        if depends_on is not None:
+            self._cache_refresh_blocked([task_id])
+        self._schedule_add([task])
+        return task_id
+
+    def add_tasks(self, tasks, parent_id=None):
+        """Adds a whole tree of tasks in a single transaction.
+
+        ``tasks`` is a list of dicts with the same keys as ``add_task`` plus an
+        optional ``children`` list. Returns the new ids in depth-first order.
+        """
+        owner = self._owner(parent_id)
+        if owner is not self:
+            return owner.add_tasks(tasks, parent_id)
+        ids = {}
+        inserted = []
+        with self.db.transaction():
+            # 逐层插入：每层一次 executemany，父任务 id 在同一事务内解析
+            level = [(task, parent_id) for task in tasks]
+            while level:
+                rows = [(
+                    task['title'],
+                    task.get('description', ''),
+                    task.get('priority', 'medium'),
+                    task.get('status', 'not_started'),
+                    task.get('due_date'),
+                    task.get('depends_on'),
+                    parent,
+                ) for task, parent in level]
+                new_ids = self.db.insert_tasks(rows)
+                next_level = []
+                for (task, _), task_id, row in zip(level, new_ids, rows):
+                    ids[id(task)] = task_id
+                    inserted.append(dict(zip(TASK_COLUMNS, (task_id,) + row + (None,))))
+                    next_level.extend((child, task_id) for child in task.get('children', []))
+                level = next_level
+        self._fill_due_days(inserted)
+        self._cache_insert(inserted)
+        self._cache_refresh_rollups([task['id'] for task in inserted])
+        self._cache_refresh_blocked([task['id'] for task in inserted if task['depends_on'] is not None])
+        self._schedule_add(inserted)
+
+        ordered = []
+        def collect(nodes):
+            for task in nodes:
+                ordered.append(ids[id(task)])
+                collect(task.get('children', []))
+        collect(tasks)
+        return ordered
+
+    def _fill_due_days(self, tasks):
+        """Copies the database-computed due_day onto freshly inserted task dicts."""
+        dated = [task for task in tasks if task['due_date']]
+        if not dated:
+            return
+        # 同一事务插入的 id 连续，按主键范围读取即可
+        rows = self.db.fetch_all(
+            "SELECT id, due_day FROM tasks WHERE id BETWEEN ? AND ?",
+            (min(task['id'] for task in dated), max(task['id'] for task in dated))
+        )
+        due_days = dict(rows)
+        for task in dated:
+            task['due_day'] = due_days.get(task['id'])
 
     def get_tasks(self):
-        """Retrieves all tasks with hierarchy information."""
-        tasks = self.db.fetch_all("SELECT * FROM tasks ORDER BY parent_id, id")
-        # 将元组转换为字典
-        columns = ['id', 'title', 'description', 'priority', 'status', 'due_date', 'depends_on', 'parent_id']
-        tasks = [dict(zip(columns, task)) for task in tasks]
-        return self._build_task_hierarchy(tasks)
+        """Retrieves all tasks with hierarchy information (served from the cache when loaded).
+
+        Every task carries the rollup counters ``child_count``,
+        ``completed_count``, ``descendant_count`` and
+        ``completed_descendant_count`` plus ``percent_complete`` over its
+        subtree (its own status for leaves). ``blocked`` is True while any
+        of its dependencies is unfinished; ``ready`` means unfinished and
+        not blocked. Projects stored in shard files are included, each
+        served from its own cache.
+        """
+        roots = self._load_tasks()
+        managers = self._shard_managers()
+        if not managers:
+            return roots
+        return sorted(roots + [root for manager in managers.values() for root in manager.get_tasks()],
+                      key=lambda task: task['id'])
+
+    def get_tasks_json(self):
+        """Returns ``get_tasks()`` encoded as JSON bytes.
+
+        Writes change the cached tree in place, so it is encoded under
+        ``cache_locked``: the result never shows half of a write.
+        """
+        with self.cache_locked():
+            return json.dumps(self.get_tasks(), default=str).encode()
+
+    @contextmanager
+    def cache_locked(self):
+        """Holds the cache locks of this manager and of its shards.
+
+        WriteQueue holds them for a whole batch, so other threads never see
+        cached writes before they are committed.
+        """
+        with ExitStack() as stack:
+            for manager in [self, *self._shard_managers().values()]:
+                stack.enter_context(manager._cache_lock)
+            yield
+
+    def _load_tasks(self):
+        with self._cache_lock:
+            if self._roots is not None:
+                self.cache_hits += 1
+                return self._roots
+            self.cache_misses += 1
+            tasks = self.db.fetch_all(
+                f"SELECT /* full scan */ {TASK_SELECT}, {STATE_SELECT} FROM tasks {STATE_JOIN} ORDER BY parent_id, id"
+            )
+            # 将元组转换为字典
+            tasks = [self._with_state(task) for task in tasks]
+            self._nodes = {task['id']: task for task in tasks}
+            self._roots = self._build_task_hierarchy(tasks)
+            return self._roots
+
+    def get_tasks_page(self, after_key=None, limit=100, filters=None, include_descendants=False):
+        """Returns one keyset-paginated page of tasks ordered by id.
+
+        ``filters`` maps columns in PAGE_FILTERS to values (None matches NULL,
+        so ``{'parent_id': None}`` pages root tasks). Pass the returned
+        ``next_key`` as ``after_key`` to fetch the following page; it is None
+        on the last page. With ``include_descendants`` each page task carries
+        its full subtree under ``children``.
+        """
+        clauses, params = ["id > ?"], [after_key or 0]
+        for column, value in (filters or {}).items():
+            if column not in PAGE_FILTERS:
+                raise ValueError(f"Unsupported filter: {column}")
+            if value is None:
+                clauses.append(f"{column} IS NULL")
+            else:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        rows = self._across_shards(
+            f"SELECT {TASK_SELECT} FROM {{schema}}.tasks AS tasks WHERE {' AND '.join(clauses)} ORDER BY id LIMIT ?",
+            params + [limit + 1]
+        )
+        # 各文件各取 limit + 1 行，合并后按 id 重新截取
+        rows.sort(key=lambda row: row[0])
+        tasks = [dict(zip(TASK_COLUMNS, row)) for row in rows[:limit]]
+        next_key = tasks[-1]['id'] if len(rows) > limit else None
+
+        if include_descendants and tasks:
+            own, others = self._route([task['id'] for task in tasks])
+            descendants = self._subtree_rows(own) + [
+                row for owner, ids in others.items() for row in owner._subtree_rows(ids)
+            ]
+            page = {task['id'] for task in tasks}
+            extra = sorted(
+                (dict(zip(TASK_COLUMNS, row)) for row in descendants if row[0] not in page),
+                key=lambda task: task['id']
+            )
+            task_map = {task['id']: task for task in tasks + extra}
+            for task in extra:
+                task_map[task['parent_id']].setdefault('children', []).append(task)
+        return {'tasks': tasks, 'next_key': next_key}
+
+    def _subtree_rows(self, task_ids):
+        if not task_ids:
+            return []
+        return self.db.fetch_all(
+            self.db.subtree_cte(len(task_ids)) +
+            f"SELECT {TASK_SELECT} FROM tasks WHERE id IN (SELECT id FROM subtree)",
+            task_ids
+        )
+
+    def get_children(self, parent_id, after_key=None, limit=None):
+        """Returns the direct children of ``parent_id`` (None for root tasks), ordered by id.
+
+        Each task carries the same rollup counters and blocked state as
+        ``get_tasks`` so the caller can show an expander and progress without
+        loading the subtree.
+        """
+        if parent_id is not None:
+            owner = self._owner(parent_id)
+            if owner is not self:
+                return owner.get_children(parent_id, after_key, limit)
+            rows = self.db.fetch_all(f"""
+                SELECT {TASK_SELECT}, {STATE_SELECT}
+                FROM tasks {STATE_JOIN}
+                WHERE parent_id = ? AND id > ?
+                ORDER BY id
+                LIMIT ?
+            """, (parent_id, after_key or 0, -1 if limit is None else limit))
+            return [self._with_state(row) for row in rows]
+        # 根任务包括拆分到分片文件中的项目
+        limit = -1 if limit is None else limit
+        rows = self._across_shards(f"""
+            SELECT {TASK_SELECT}, {STATE_SELECT}
+            FROM {SHARD_STATE_FROM}
+            WHERE parent_id IS NULL AND id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (after_key or 0, limit))
+        rows.sort(key=lambda row: row[0])
+        return [self._with_state(row) for row in (rows if limit < 0 else rows[:limit])]
+
+    def get_root_tasks(self, after_key=None, limit=None):
+        """Returns root tasks with their rollup counters, ordered by id."""
+        return self.get_children(None, after_key, limit)
+
+    def _epoch_day(self, value):
+        day = self.db.to_epoch_day(value)
+        if day is None:
+            raise ValueError(f"Not a date: {value!r}")
+        return day
+
+    def get_due_between(self, start, end, limit=None):
+        """Returns tasks due from ``start`` to ``end`` inclusive, earliest first.
+
+        ``start`` and ``end`` are dates, datetimes or ISO date strings.
+        """
+        limit = -1 if limit is None else limit
+        rows = self._across_shards(f"""
+            SELECT {TASK_SELECT} FROM {{schema}}.tasks AS tasks
+            WHERE due_day BETWEEN ? AND ?
+            ORDER BY due_day, id
+            LIMIT ?
+        """, (self._epoch_day(start), self._epoch_day(end), limit))
+        return self._by_due_day(rows, limit)
+
+    def get_overdue(self, now=None, limit=None):
+        """Returns unfinished tasks whose due date is before ``now`` (default today), oldest first."""
+        limit = -1 if limit is None else limit
+        rows = self._across_shards(f"""
+            SELECT {TASK_SELECT} FROM {{schema}}.tasks AS tasks
+            WHERE due_day < ? AND status IS NOT 'completed'
+            ORDER BY due_day, id
+            LIMIT ?
+        """, (self._epoch_day(now or date.today()), limit))
+        return self._by_due_day(rows, limit)
+
+    @staticmethod
+    def _by_due_day(rows, limit):
+        # 每个文件各自排序、截断，合并后再整体排序一次
+        tasks = sorted((dict(zip(TASK_COLUMNS, row)) for row in rows), key=lambda task: (task['due_day'], task['id']))
+        return tasks if limit < 0 else tasks[:limit]
+
+    def get_descendant_ids(self, task_id, max_depth=None):
+        """Returns the ids below ``task_id`` (optionally limited to ``max_depth`` levels)."""
+        owner = self._owner(task_id)
+        if owner is not self:
+            return owner.get_descendant_ids(task_id, max_depth)
+        if max_depth is None:
+            rows = self.db.fetch_all(
+                "SELECT descendant FROM task_closure WHERE ancestor = ? AND depth > 0", (task_id,)
+            )
+        else:
+            rows = self.db.fetch_all(
+                "SELECT descendant FROM task_closure WHERE ancestor = ? AND depth BETWEEN 1 AND ?",
+                (task_id, max_depth)
+            )
+        return [row[0] for row in rows]
+
+    def get_ancestors(self, task_id):
+        """Returns the ancestors of ``task_id`` from the root down to its parent.
+
+        Each carries the rollup counters and blocked state like ``get_children``.
+        """
+        owner = self._owner(task_id)
+        if owner is not self:
+            return owner.get_ancestors(task_id)
+        rows = self.db.fetch_all(f"""
+            SELECT {TASK_SELECT}, {STATE_SELECT}
+            FROM task_closure JOIN tasks ON tasks.id = task_closure.ancestor {STATE_JOIN}
+            WHERE task_closure.descendant = ? AND task_closure.depth > 0
+            ORDER BY task_closure.depth DESC
+        """, (task_id,))
+        return [self._with_state(row) for row in rows]
+
+    def get_depth(self, task_id):
+        """Returns how many levels ``task_id`` sits below its root (roots are 0)."""
+        owner = self._owner(task_id)
+        if owner is not self:
+            return owner.get_depth(task_id)
+        rows = self.db.fetch_all(
+            "SELECT MAX(depth) FROM task_closure WHERE descendant = ?", (task_id,)
+        )
+        return rows[0][0]
+
+    def move_task(self, task_id, new_parent_id):
+        """Moves a task and its subtree under ``new_parent_id`` (None makes it a root).
+
+        Raises ValueError when that would move it between the main file and a shard.
+        """
+        owner = self._owner(task_id)
+        if self._owner(new_parent_id) is not owner:
+            raise ValueError("Tasks cannot be moved between project shards")
+        if owner is not self:
+            return owner.move_task(task_id, new_parent_id)
+        self.db.execute("UPDATE tasks SET parent_id = ? WHERE id = ?", (new_parent_id, task_id))
+        # 子树位置变化，直接让缓存失效
+        self.invalidate_cache()
+
+    def rebuild_hierarchy_index(self):
+        """Recomputes the task_closure table from parent_id links."""
+        with self.db.transaction() as conn:
+            return closure.rebuild(conn)
+
+    def check_hierarchy_index(self):
+        """Returns {'missing': n, 'extra': n}; both 0 when task_closure is consistent."""
+        return closure.check(self.db.get_connection())
 
     def _build_task_hierarchy(self, tasks):
         """Builds a hierarchical structure of tasks."""
@@ -36,62 +585,505 @@ class TaskManager:
         return root_tasks
 
     def update_task_status(self, task_id, new_status):
-        """Updates the status of a task and its children."""
-        # 更新当前任务状态
-        self.db.execute("UPDATE tasks SET status = ? WHERE id = ?", (new_status, task_id))
-        # 递归更新子任务状态
-        self._update_child_task_status(task_id, new_status)
-
-    def _update_child_task_status(self, parent_id, new_status):
-        """Recursively updates the status of child tasks."""
-        children = self.db.fetch_all("SELECT id FROM tasks WHERE parent_id = ?", (parent_id,))
-        for child in children:
-            self.db.execute("UPDATE tasks SET status = ? WHERE id = ?", (new_status, child[0]))
-            self._update_child_task_status(child[0], new_status)
+        """Updates the status of a task and its whole subtree.
+
+        Returns the ids of every task whose status was written.
+        """
+        affected = self.update_tasks_status([task_id], new_status)
+        logger.debug(f"任务{task_id}及其子任务状态更新为{new_status}，共{len(affected)}个")
+        return affected
+
+    def update_tasks_status(self, task_ids, new_status):
+        """Updates several tasks and their subtrees in one transaction (one per shard file)."""
+        task_ids, others = self._route(task_ids)
+        routed = [task_id for owner, ids in others.items() for task_id in owner.update_tasks_status(ids, new_status)]
+        if not task_ids:
+            return routed
+        subtree = self.db.subtree_cte(len(task_ids))
+        with self.db.transaction() as conn:
+            affected = list(dict.fromkeys(row[0] for row in conn.execute(subtree + "SELECT id FROM subtree", task_ids)))
+            conn.execute(
+                subtree + "UPDATE tasks SET status = ? WHERE id IN (SELECT id FROM subtree)",
+                task_ids + [new_status]
+            )
+        self._cache_set_status(affected, new_status)
+        self._cache_refresh_rollups(affected)
+        self._cache_refresh_dependents(affected)
+        self._schedule_apply('set_status', affected, new_status)
+        return affected + routed
 
     def delete_task(self, task_id):
-        """Deletes a task and its subtasks."""
-        query = "DELETE FROM tasks WHERE id = ? OR parent_id = ?"
-        self.db.execute(query, (task_id, task_id))
+        """Deletes a task and its whole subtree."""
+        if self._remove_shards([task_id]):
+            return
+        owner = self._owner(task_id)
+        if owner is not self:
+            return owner.delete_task(task_id)
+        self._delete_subtrees([task_id])
 
     def delete_tasks(self, task_ids):
-        """Delete multiple tasks by their IDs."""
-        try:
-            # First, delete any child tasks
-            placeholders = ','.join(['?' for _ in task_ids])
-            query = f"""
-                DELETE FROM tasks 
-                WHERE parent_id IN ({placeholders})
-            """
-            self.db.execute(query, task_ids)
-            
-            # Then delete the selected tasks
-            query = f"""
-                DELETE FROM tasks 
-                WHERE id IN ({placeholders})
-            """
-            self.db.execute(query, task_ids)
-            return True
-        except Exception as e:
-            print(f"Error deleting tasks: {e}")
-            return False
+        """Delete multiple tasks and all of their descendants in one statement.
+
+        Returns True; errors propagate, so a WriteQueue rolls the call back.
+        """
+        removed = self._remove_shards(task_ids)
+        task_ids, others = self._route(task_id for task_id in task_ids if task_id not in removed)
+        for owner, ids in others.items():
+            owner.delete_tasks(ids)
+        if task_ids:
+            self._delete_subtrees(task_ids)
+        return True
+
+    def _delete_subtrees(self, task_ids):
+        """Deletes ``task_ids`` (stored in this file) with their subtrees and updates the cache."""
+        subtree = self.db.subtree_cte(len(task_ids))
+        with self.db.transaction() as conn:
+            # 依赖被删任务的其余任务：只有它们的阻塞状态会变
+            dependents = list(dict.fromkeys(row[0] for row in conn.execute(subtree + """
+                SELECT task_id FROM task_dependencies
+                WHERE depends_on IN (SELECT id FROM subtree) AND task_id NOT IN (SELECT id FROM subtree)
+            """, task_ids)))
+            conn.execute(subtree + "DELETE FROM tasks WHERE id IN (SELECT id FROM subtree)", task_ids)
+        parents = self._cached_parents(task_ids)
+        self._cache_remove(task_ids)
+        self._cache_refresh_rollups(parents)
+        self._cache_refresh_blocked(dependents)
+        self._schedule = None
+
+    def _remove_shards(self, task_ids):
+        """Deletes the shard files whose project root is in ``task_ids``; returns those root ids."""
+        roots = set(task_ids) & set(self._shard_managers())
+        if roots:
+            # 删除整个项目即删除它的分片文件，不留下空文件和登记行
+            for root_id in roots:
+                shards.remove(root_id)
+            # 依赖不跨分片，主库中任务的阻塞状态不受影响
+            self._reload_shards()
+        return roots
+
+    def _cached_parents(self, task_ids):
+        with self._cache_lock:
+            return [self._nodes[task_id]['parent_id'] for task_id in task_ids if task_id in self._nodes]
+
+    def cleanup_orphans(self):
+        """Removes tasks left behind by the old one-level delete."""
+        removed = self.db.delete_orphans()
+        if removed:
+            self.invalidate_cache()
+        return removed
+
+    def get_change_cursor(self):
+        """Returns the sequence number of the latest logged change."""
+        rows = self.db.fetch_all("SELECT seq FROM sqlite_sequence WHERE name = 'task_changes'")
+        return rows[0][0] if rows else 0
+
+    def get_changes_since(self, seq):
+        """Returns the tasks changed after cursor ``seq``.
+
+        The result is a dict with ``cursor`` (pass it to the next call),
+        ``reset`` (True when the log was compacted past ``seq`` and the caller
+        must reload everything) and ``changes``: one entry per task with its
+        latest ``op`` and current row (``task`` is None once deleted).
+        """
+        compacted_through = self.db.fetch_all("SELECT compacted_through FROM task_changes_state")[0][0]
+        if seq < compacted_through:
+            return {'cursor': self.get_change_cursor(), 'reset': True, 'changes': []}
+
+        rows = self.db.fetch_all(f"""
+            SELECT task_changes.seq, task_changes.task_id, task_changes.op, {TASK_SELECT}
+            FROM task_changes LEFT JOIN tasks ON tasks.id = task_changes.task_id
+            WHERE task_changes.seq > ?
+            ORDER BY task_changes.seq
+        """, (seq,))
+        latest = {}
+        for row in rows:
+            change_seq, task_id, op, task = row[0], row[1], row[2], row[3:]
+            # 同一任务只保留最后一次变更
+            latest.pop(task_id, None)
+            latest[task_id] = {
+                'seq': change_seq,
+                'id': task_id,
+                'op': op,
+                'task': dict(zip(TASK_COLUMNS, task)) if task[0] is not None else None,
+            }
+        cursor = rows[-1][0] if rows else seq
+
+        if cursor - compacted_through > 2 * CHANGE_LOG_KEEP:
+            self.compact_changes()
+        return {'cursor': cursor, 'reset': False, 'changes': list(latest.values())}
+
+    def compact_changes(self, keep=CHANGE_LOG_KEEP):
+        """Deletes all but the newest ``keep`` change-log entries.
+
+        Returns the number of entries removed.
+        """
+        with self.db.transaction() as conn:
+            threshold = self.get_change_cursor() - keep
+            if threshold <= 0:
+                return 0
+            removed = conn.execute("DELETE FROM task_changes WHERE seq <= ?", (threshold,)).rowcount
+            conn.execute(
+                "UPDATE task_changes_state SET compacted_through = MAX(compacted_through, ?)",
+                (threshold,)
+            )
+        return removed
+
+    @staticmethod
+    def _fts_query(query):
+        """Turns free text into an FTS5 query: every word must match as a prefix."""
+        words = re.findall(r'\w+', query)
+        return ' '.join(f'"{word}"*' for word in words)
+
+    def search(self, query, limit=50):
+        """Full-text search over titles and descriptions, best matches first."""
+        fts_query = self._fts_query(query)
+        if not fts_query:
+            return []
+        if self.db.has_table('tasks_fts'):
+            rows = self._across_shards(f"""
+                SELECT {TASK_SELECT}, rank
+                FROM {{schema}}.tasks_fts AS tasks_fts JOIN {{schema}}.tasks AS tasks ON tasks.id = tasks_fts.rowid
+                WHERE tasks_fts MATCH ?
+                ORDER BY rank
+                LIMIT ?
+            """, (fts_query, limit))
+            # 多个文件的结果按各自的 bm25 分数合并
+            rows = [row[:-1] for row in sorted(rows, key=lambda row: row[-1])[:limit]]
+        else:
+            logger.warning("FTS5 index missing, falling back to LIKE search")
+            pattern = f"%{query.strip()}%"
+            rows = self._across_shards(
+                f"SELECT {TASK_SELECT} FROM {{schema}}.tasks AS tasks WHERE title LIKE ? OR description LIKE ? LIMIT ?",
+                (pattern, pattern, limit)
+            )[:limit]
+        return [dict(zip(TASK_COLUMNS, row)) for row in rows]
 
     def add_reminder(self, task_id, reminder_time):
-        """Adds a reminder for a task."""
-        self.db.add_reminder(task_id, reminder_time)
+        """Adds a reminder for a task and returns its id.
+
+        ``reminder_time`` is a datetime or an ISO 8601 string in local time.
+        """
+        owner = self._owner(task_id)
+        if owner is not self:
+            return owner.add_reminder(task_id, reminder_time)
+        return self.db.add_reminder(task_id, reminder_time)
+
+    def delete_reminder(self, reminder_id):
+        # 提醒 id 在所有文件中唯一，不存在的文件里删除为空操作
+        self.db.delete_reminder(reminder_id)
+        for manager in self._shard_managers().values():
+            manager.delete_reminder(reminder_id)
+
+    def get_pending_reminders(self, after=None, limit=REMINDER_WINDOW):
+        """Returns up to ``limit`` unfired reminders as (id, task_id, reminder_time), earliest first.
+
+        ``after`` is a (reminder_time, id) key such as ``ReminderQueue.horizon``;
+        only reminders ordered after it are returned.
+        """
+        # 空字符串排在所有时间之前，首页也走索引范围查询
+        reminder_time, reminder_id = after or ('', 0)
+        rows = self._across_shards("""
+            SELECT id, task_id, reminder_time FROM {schema}.reminders
+            WHERE fired = 0 AND reminder_time >= ? AND NOT (reminder_time = ? AND id <= ?)
+            ORDER BY reminder_time, id LIMIT ?
+        """, (reminder_time, reminder_time, reminder_id, limit))
+        return sorted(rows, key=lambda row: (row[2], row[0]))[:limit]
+
+    def fire_reminders(self, reminder_ids):
+        """Marks reminders as fired and returns those still pending, with their task title.
+
+        Reminders whose task was deleted in the meantime are dropped silently.
+        """
+        reminder_ids = list(reminder_ids)
+        if not reminder_ids:
+            return []
+        if self._shard_managers():
+            # 提醒可能在任一文件中：各自标记，合并结果
+            fired = self._fire_local(reminder_ids)
+            for manager in self._shard_managers().values():
+                fired.extend(manager.fire_reminders(reminder_ids))
+            return sorted(fired, key=lambda reminder: (reminder['reminder_time'], reminder['id']))
+        return self._fire_local(reminder_ids)
+
+    def _fire_local(self, reminder_ids):
+        placeholders = ", ".join("?" * len(reminder_ids))
+        with self.db.transaction() as conn:
+            rows = conn.execute(f"""
+                SELECT reminders.id, reminders.task_id, reminders.reminder_time, tasks.title
+                FROM reminders JOIN tasks ON tasks.id = reminders.task_id
+                WHERE reminders.id IN ({placeholders}) AND reminders.fired = 0
+            """, reminder_ids).fetchall()
+            conn.execute(f"UPDATE reminders SET fired = 1 WHERE id IN ({placeholders})", reminder_ids)
+        rows.sort(key=lambda row: (row[2], row[0]))
+        return [dict(zip(('id', 'task_id', 'reminder_time', 'title'), row)) for row in rows]
+
+    def get_reminders(self, after_id=0, limit=database.REMINDER_PAGE):
+        """Returns a page of reminders (fired or not) with ids above ``after_id``, in id order.
+
+        Pass the last id of a page as ``after_id`` to get the next one. The
+        reminder scheduler does not use this; it reads the pending ones with
+        ``get_pending_reminders``.
+        """
+        rows = self._across_shards(
+            "SELECT * FROM {schema}.reminders WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit)
+        )
+        return sorted(rows)[:limit]
+
+    def get_stats(self, scope='roots'):
+        """Returns maintained task counts for ``scope`` ('roots', 'leaves' or 'all').
+
+        The result has ``total``, one count per status and ``percent`` completed.
+        """
+        if scope not in stats.SCOPES:
+            raise ValueError(f"Unknown stats scope: {scope}")
+        columns = ", ".join(('total',) + stats.STATUSES)
+        rows = self._across_shards(f"SELECT {columns} FROM {{schema}}.task_stats WHERE scope = ?", (scope,))
+        values = [sum(column) for column in zip(*rows)] if rows else (0,) * (len(stats.STATUSES) + 1)
+        result = dict(zip(('total',) + stats.STATUSES, values))
+        result['percent'] = (result['completed'] / result['total'] * 100) if result['total'] else 0
+        return result
+
+    def check_stats(self):
+        """Returns the scopes whose counters disagree with a full recount (empty when consistent)."""
+        return stats.check(self.db.get_connection())
+
+    def rebuild_stats(self):
+        """Recomputes the task_stats counters from scratch."""
+        with self.db.transaction() as conn:
+            stats.rebuild(conn)
+
+    def check_rollups(self):
+        """Returns the ids of tasks whose rollup counters disagree with a full recount."""
+        return rollups.check(self.db.get_connection())
+
+    def add_dependency(self, task_id, depends_on):
+        """Makes ``task_id`` depend on ``depends_on``.
+
+        Raises DependencyCycleError (a ValueError) if ``depends_on`` already
+        depends on ``task_id`` directly or transitively. Both tasks must be
+        stored in the same file (see ``split_project``), else ValueError.
+        """
+        owner = self._owner(task_id)
+        if self._owner(depends_on) is not owner:
+            raise ValueError("Dependencies cannot cross project shards")
+        if owner is not self:
+            return owner.add_dependency(task_id, depends_on)
+        with self.db.transaction() as conn:
+            dependencies.add_edge(conn, task_id, depends_on)
+        self._cache_refresh_blocked([task_id])
+        self._schedule_apply('add_edge', task_id, depends_on)
+
+    def remove_dependency(self, task_id, depends_on):
+        owner = self._owner(task_id)
+        if owner is not self:
+            return owner.remove_dependency(task_id, depends_on)
+        self.db.execute(
+            "DELETE FROM task_dependencies WHERE task_id = ? AND depends_on = ?", (task_id, depends_on)
+        )
+        self._cache_refresh_blocked([task_id])
+        self._schedule_apply('remove_edge', task_id, depends_on)
+
+    def get_dependencies(self, task_id):
+        """Returns the ids ``task_id`` depends on."""
+        owner = self._owner(task_id)
+        if owner is not self:
+            return owner.get_dependencies(task_id)
+        rows = self.db.fetch_all("SELECT depends_on FROM task_dependencies WHERE task_id = ?", (task_id,))
+        return [row[0] for row in rows]
 
-    def get_reminders(self):
-        """Retrieves all reminders from the database."""
-        return self.db.get_reminders()
+    def get_dependents(self, task_id):
+        """Returns the ids of tasks that depend on ``task_id``."""
+        owner = self._owner(task_id)
+        if owner is not self:
+            return owner.get_dependents(task_id)
+        rows = self.db.fetch_all("SELECT task_id FROM task_dependencies WHERE depends_on = ?", (task_id,))
+        return [row[0] for row in rows]
+
+    def get_blocked_ids(self):
+        """Returns the set of task ids with at least one unfinished dependency."""
+        return {row[0] for row in self._across_shards("SELECT /* full scan */ task_id FROM {schema}.task_blocked")}
+
+    def get_topological_order(self):
+        """Returns every task id ordered so each task comes after its dependencies."""
+        task_ids = [row[0] for row in self.db.fetch_all("SELECT /* full scan */ id FROM tasks ORDER BY id")]
+        edges = self.db.fetch_all("SELECT /* full scan */ task_id, depends_on FROM task_dependencies")
+        return topological_order(task_ids, edges)
+
+    def check_dependencies(self):
+        """Returns the ids of tasks whose blocked state disagrees with a full recount."""
+        return dependencies.check(self.db.get_connection())
+
+    def rebuild_dependencies(self):
+        """Recomputes the blocked set from the dependency edges."""
+        with self.db.transaction() as conn:
+            # 只有与重算结果不一致的任务需要刷新缓存
+            changed = dependencies.check(conn)
+            dependencies.rebuild(conn)
+        self._cache_refresh_blocked(changed)
+        self._schedule = None
+
+    def _schedule_for(self, today=None):
+        """Returns the cached Schedule, computing it when missing or built for another day."""
+        today = self._epoch_day(today or date.today())
+        with self._cache_lock:
+            if self._schedule is None or self._schedule.today != today:
+                tasks = self.db.fetch_all("SELECT /* full scan */ id, status, due_day FROM tasks")
+                edges = self.db.fetch_all("SELECT /* full scan */ task_id, depends_on FROM task_dependencies")
+                self._schedule = Schedule(tasks, edges, today)
+            return self._schedule
+
+    def _schedule_apply(self, edit, *args):
+        # 调度尚未计算时无需维护，下次查询时整体计算
+        with self._cache_lock:
+            if self._schedule is not None:
+                getattr(self._schedule, edit)(*args)
+
+    def _schedule_add(self, tasks):
+        with self._cache_lock:
+            if self._schedule is None:
+                return
+            if any(task['depends_on'] is not None for task in tasks):
+                # 旧的 depends_on 列由触发器转成依赖边，整体重算
+                self._schedule = None
+                return
+            self._schedule.add_tasks((task['id'], task['status'], task['due_day']) for task in tasks)
+
+    def get_schedule(self, task_ids=None, today=None):
+        """Returns the critical-path schedule of ``task_ids`` (every task when None).
+
+        Maps each id to a dict with ``earliest_start``, ``earliest_finish`` and
+        ``latest_finish`` dates, ``slack`` in days and a ``critical`` flag.
+        Every unfinished task counts as one day of work; see
+        ``logic.dependency_graph.Schedule`` for the exact rules.
+        """
+        with self._cache_lock:
+            schedule = self._schedule_for(today)
+            if task_ids is None:
+                task_ids = schedule.order
+            return {task_id: {
+                'earliest_start': self.db.from_epoch_day(schedule.start[task_id]),
+                'earliest_finish': self.db.from_epoch_day(schedule.finish[task_id]),
+                'latest_finish': self.db.from_epoch_day(schedule.latest[task_id]),
+                'slack': schedule.slack(task_id),
+                'critical': schedule.is_critical(task_id),
+            } for task_id in task_ids if task_id in schedule.finish}
+
+    def get_critical_path(self, today=None):
+        """Returns the ids of the dependency chain that determines the overall finish date."""
+        with self._cache_lock:
+            return self._schedule_for(today).critical_path()
+
+    def get_earliest_finish(self, task_id, today=None):
+        """Returns the earliest date by which ``task_id`` and its whole subtree can be finished."""
+        owner = self._owner(task_id)
+        if owner is not self:
+            return owner.get_earliest_finish(task_id, today)
+        task_ids = [task_id] + self.get_descendant_ids(task_id)
+        with self._cache_lock:
+            schedule = self._schedule_for(today)
+            finish = max(schedule.finish[member] for member in task_ids if member in schedule.finish)
+        return self.db.from_epoch_day(finish)
+
+    def rebuild_rollups(self):
+        """Recomputes every task_rollups row from scratch."""
+        with self.db.transaction() as conn:
+            rollups.rebuild(conn)
+        self.invalidate_cache()
+
+    def export_tasks(self, path, format=None, on_progress=None):
+        """Streams every task to ``path`` as JSON Lines or CSV and returns how many were written.
+
+        ``format`` is 'jsonl' or 'csv' (default: from the file suffix).
+        ``on_progress(count)`` is called every few thousand tasks.
+        """
+        format = transfer.detect_format(path, format)
+        # 分片中的项目一并导出，按 id 合并成一个有序的流
+        sources = [self.db] + [manager.db for manager in self._shard_managers().values()]
+        tasks = heapq.merge(*(transfer.iter_tasks(db.get_connection()) for db in sources), key=lambda task: task['id'])
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            return transfer.write_tasks(transfer.with_progress(tasks, on_progress), file, format)
+
+    def import_tasks(self, path, format=None, chunk_size=transfer.IMPORT_CHUNK_SIZE, on_progress=None):
+        """Streams tasks from a file written by ``export_tasks`` into the database.
+
+        Ids are shifted by a constant offset so parent and dependency links
+        survive; returns ``{'tasks': n, 'dependencies': n, 'id_offset': offset}``.
+        Each chunk of ``chunk_size`` tasks is its own transaction.
+        """
+        format = transfer.detect_format(path, format)
+        try:
+            with open(path, encoding='utf-8', newline='') as file:
+                return transfer.import_tasks(self.db, transfer.read_tasks(file, format), chunk_size, on_progress)
+        finally:
+            # 出错时已提交的块同样需要反映到缓存
+            self.invalidate_cache()
+
+    def backup(self, directory=None, progress=None):
+        """Takes a compressed snapshot of the database without blocking other threads.
+
+        Returns the snapshot path; older snapshots beyond ``backup.KEEP_SNAPSHOTS``
+        are deleted. See ``db.backup.create_snapshot`` for ``progress``.
+        """
+        return backup.create_snapshot(directory, progress=progress)
+
+    def list_backups(self, directory=None):
+        """Returns the available snapshot paths, newest first."""
+        return backup.list_snapshots(directory)
+
+    def restore_backup(self, snapshot):
+        """Replaces every task, reminder and dependency with the contents of ``snapshot``.
+
+        Snapshots hold every project in one file, so projects that were in
+        shard files come back in the main file and the shard files are deleted.
+        """
+        previous = list(shards.list_shards().values())
+        try:
+            backup.restore(snapshot)
+            shards.reconcile(previous)
+        finally:
+            self._reload_shards()
+            self.invalidate_cache()
+
+    def split_project(self, root_id):
+        """Moves the top-level task ``root_id`` and its subtree into a database file of its own.
+
+        Calls on those tasks are routed to that file from then on; every
+        listing, search, stats, reminders, export and backups still include
+        them, while schedules and the change log cover the main file only.
+        Deleting the root or clearing all tasks deletes the file. Must be
+        called outside a transaction (it ATTACHes the new file). Returns the shard path; raises
+        ValueError if the task is not a root or has dependencies on other
+        projects.
+        """
+        try:
+            return shards.split(root_id)
+        finally:
+            self._reload_shards()
+            self.invalidate_cache()
+
+    def merge_project(self, root_id):
+        """Moves a project stored by ``split_project`` back into the main file."""
+        try:
+            shards.merge(root_id)
+        finally:
+            self._reload_shards()
+            self.invalidate_cache()
+
+    def get_shards(self):
+        """Returns {root_id: path} for the projects stored in shard files."""
+        return shards.list_shards()
+
+    def run_maintenance(self, budget=maintenance.BUDGET, analyze=True):
+        """Refreshes planner statistics and shrinks the file, stopping after about ``budget`` seconds.
+
+        Call it from a background thread while the app is idle; see
+        ``db.maintenance.run`` for the result.
+        """
+        return maintenance.run(budget, analyze)
 
-    def calculate_progress(self):
+    def calculate_progress(self, scope='roots'):
         """Calculates the overall progress of all tasks."""
-        tasks = self.get_tasks()
-        total_tasks = len(tasks)
-        completed_tasks = sum(1 for task in tasks if task['status'] == "completed")  
-        if total_tasks == 0:
-            return 0
-        return (completed_tasks / total_tasks) * 100
+        return self.get_stats(scope)['percent']
 
     def parse_batch_tasks(self, text):
         """Parses a batch of tasks from the input text."""
@@ -100,63 +1092,22 @@ class TaskManager:
         if not lines:
             return tasks
 
-        # First line is the parent task
-        parent_task = {
-            "title": lines[0].strip(),
-            "description": "",
-            "priority": "medium",
-            "status": "not_started",
-            "due_date": None,
-            "depends_on": None,
-            "parent_id": None
-        }
-        
-        # Add parent task
-        query = """
-        INSERT INTO tasks (title, description, priority, status, due_date, depends_on, parent_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """
-        self.db.execute(query, (
-            parent_task["title"],
-            parent_task["description"],
-            parent_task["priority"],
-            parent_task["status"],
-            parent_task["due_date"],
-            parent_task["depends_on"],
-            parent_task["parent_id"]
-        ))
-        
-        # Get the parent task ID
-        parent_id = self.db.fetch_all("SELECT last_insert_rowid()")[0][0]
-        
-        # Add subtasks
-        for line in lines[1:]:
-            if line.strip():
-                subtask = {
-                    "title": line.strip(),
-                    "description": "",
-                    "priority": "medium",
-                    "status": "not_started",
-                    "due_date": None,
-                    "depends_on": None,
-                    "parent_id": parent_id
-                }
-                self.db.execute(query, (
-                    subtask["title"],
-                    subtask["description"],
-                    subtask["priority"],
-                    subtask["status"],
-                    subtask["due_date"],
-                    subtask["depends_on"],
-                    subtask["parent_id"]
-                ))
-        
+        # First line is the parent task, the rest are its subtasks
+        subtasks = [{"title": line.strip()} for line in lines[1:] if line.strip()]
+        self.add_tasks([{"title": lines[0].strip(), "children": subtasks}])
         return True
 
     def clear_tasks(self):
-        """Clear all tasks from the database."""
+        """Clear all tasks from the database, deleting the shard files of split projects."""
         try:
-            self.db.execute("DELETE FROM tasks")
+            self.db.clear_tasks()
+            if self._shard_managers():
+                shards.remove_all()
+                self._reload_shards()
+            with self._cache_lock:
+                self._roots = []
+                self._nodes = {}
+                self._schedule = None
             return True
         except Exception as e:
             logger.error(f"Error clearing tasks: {e}")
@@ -0,0 +1,264 @@
+"""Streaming export and import of tasks as JSON Lines or CSV.
+
+Both directions work row by row: export iterates the database cursor,
+import iterates the file and writes in chunked transactions, so memory
+use does not grow with the number of tasks.
+
+Imported ids are shifted by a constant offset (new id = old id + offset,
+with the offset chosen so every new id is free), which keeps parent_id,
+depends_on and dependency links intact without an in-memory id map.
+Files must therefore list tasks in ascending id order, as export writes
+them. A reference to an id that is not in the file (a task deleted before
+the export, or one outside a partial file) is dropped rather than shifted
+onto some unrelated task: parents become roots, and depends_on values and
+dependency edges pointing outside the file are left out. A task whose
+parent comes later in the file (possible after ``move_task``) is held back
+in a temporary file until its parent exists; dependency edges are spooled
+the same way and added once every task is in. Edges that would close a
+dependency cycle (only a hand-edited file has them) are dropped with a
+warning, like the legacy ones in ``dependencies.import_depends_on_column``.
+"""
+import csv
+import json
+import logging
+import os
+import tempfile
+from itertools import islice
+
+from db import dependencies
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('jsonl', 'csv')
+
+# 导出的列；dependencies 是该任务依赖的任务 id 列表
+EXPORT_COLUMNS = ['id', 'title', 'description', 'priority', 'status', 'due_date', 'depends_on', 'parent_id',
+                  'dependencies']
+
+# 每个事务写入的行数
+IMPORT_CHUNK_SIZE = 5000
+
+_INTEGER_COLUMNS = ('id', 'depends_on', 'parent_id')
+_NULLABLE_COLUMNS = ('due_date', 'depends_on', 'parent_id')
+
+_INSERT_TASK = """
+    INSERT INTO tasks (id, title, description, priority, status, due_date, depends_on, parent_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, (SELECT id FROM tasks WHERE id = ?))
+"""
+
+_INSERT_DEPENDENCY = """
+    INSERT OR IGNORE INTO task_dependencies (task_id, depends_on)
+    SELECT ?, id FROM tasks WHERE id = ?
+"""
+
+
+def detect_format(path, format=None):
+    """Returns ``format`` or the one implied by the file suffix; raises ValueError if unknown."""
+    format = format or os.path.splitext(str(path))[1].lstrip('.').lower()
+    if format not in FORMATS:
+        raise ValueError(f"Unsupported format {format!r}; expected one of {', '.join(FORMATS)}")
+    return format
+
+
+def chunked(rows, size):
+    """Yields lists of up to ``size`` items from any iterable."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def with_progress(rows, on_progress, every=IMPORT_CHUNK_SIZE):
+    """Passes ``rows`` through, calling ``on_progress(count)`` every ``every`` rows and at the end."""
+    count = 0
+    for row in rows:
+        yield row
+        count += 1
+        if on_progress and count % every == 0:
+            on_progress(count)
+    if on_progress and count % every:
+        on_progress(count)
+
+
+def iter_tasks(conn):
+    """Yields every task as a dict of EXPORT_COLUMNS, in id order, straight off the cursor."""
+    cursor = conn.execute("""
+        SELECT /* full scan */ id, title, description, priority, status, due_date,
+               -- 被依赖的任务删除后旧 depends_on 列仍保留原值，不导出这种失效的 id
+               (SELECT target.id FROM tasks AS target WHERE target.id = tasks.depends_on),
+               parent_id,
+               (SELECT group_concat(depends_on, ' ') FROM task_dependencies WHERE task_id = tasks.id)
+        FROM tasks
+        ORDER BY id
+    """)
+    for row in cursor:
+        task = dict(zip(EXPORT_COLUMNS, row))
+        task['dependencies'] = [int(value) for value in (task['dependencies'] or '').split()]
+        yield task
+
+
+def write_tasks(tasks, file, format):
+    """Writes task dicts to an open text file and returns how many were written."""
+    count = 0
+    if format == 'csv':
+        writer = csv.DictWriter(file, EXPORT_COLUMNS)
+        writer.writeheader()
+        for task in tasks:
+            writer.writerow(dict(task, dependencies=' '.join(map(str, task['dependencies']))))
+            count += 1
+    else:
+        for task in tasks:
+            file.write(json.dumps(task, ensure_ascii=False))
+            file.write('\n')
+            count += 1
+    return count
+
+
+def read_tasks(file, format):
+    """Yields task dicts from an open text file written by ``write_tasks``."""
+    if format == 'csv':
+        for row in csv.DictReader(file):
+            task = {column: row.get(column) for column in EXPORT_COLUMNS}
+            # CSV 无法区分空串和 NULL：可空的列按 NULL 读回
+            for column in _NULLABLE_COLUMNS:
+                task[column] = task[column] or None
+            for column in _INTEGER_COLUMNS:
+                if task[column] is not None:
+                    task[column] = int(task[column])
+            task['dependencies'] = [int(value) for value in (task['dependencies'] or '').split()]
+            yield task
+    else:
+        for line in file:
+            if line.strip():
+                task = json.loads(line)
+                task.setdefault('dependencies', [])
+                yield task
+
+
+def import_tasks(db, tasks, chunk_size=IMPORT_CHUNK_SIZE, on_progress=None):
+    """Inserts task dicts (ascending old ids) into the database; see the module docstring.
+
+    ``db`` is the ``db.database`` module. Each chunk commits on its own, so a
+    failure leaves the chunks before it imported. ``on_progress`` is called
+    with the number of tasks written so far after every chunk. Returns
+    ``{'tasks': n, 'dependencies': n, 'id_offset': offset}``.
+    """
+    base = db.fetch_all("""
+        SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'tasks'), 0),
+                   COALESCE((SELECT MAX(id) FROM tasks), 0)) + 1
+    """)[0][0]
+    state = {'offset': None, 'first_id': None, 'last_id': None, 'done': 0}
+    deferred_ids = set()
+
+    with tempfile.TemporaryFile('w+', encoding='utf-8') as deferred_file, \
+            tempfile.TemporaryFile('w+', encoding='utf-8') as edge_file:
+
+        def rows():
+            for task in tasks:
+                old_id = task['id']
+                if state['offset'] is None:
+                    state['offset'], state['first_id'] = base - old_id, old_id
+                elif old_id <= state['last_id']:
+                    raise ValueError(f"Tasks must be in ascending id order (got {old_id} after {state['last_id']})")
+                state['last_id'] = old_id
+                for depends_on in task.get('dependencies') or ():
+                    edge_file.write(f"{old_id} {depends_on}\n")
+                parent_id = task.get('parent_id')
+                if parent_id is not None and (parent_id >= old_id or parent_id in deferred_ids):
+                    # 父任务还没写入：先放到临时文件，主循环结束后再处理。
+                    # 它写入时触发器会把 depends_on 列转成边，可能指向更大的 id，也要经过环检查
+                    deferred_ids.add(old_id)
+                    if task.get('depends_on') is not None:
+                        edge_file.write(f"{old_id} {task['depends_on']}\n")
+                    deferred_file.write(json.dumps(task, ensure_ascii=False) + '\n')
+                    continue
+                yield _task_params(task, state['offset'], state['first_id'])
+
+        def write_chunks(params):
+            for chunk in chunked(params, chunk_size):
+                with db.transaction() as conn:
+                    conn.executemany(_INSERT_TASK, chunk)
+                state['done'] += len(chunk)
+                if on_progress:
+                    on_progress(state['done'])
+
+        write_chunks(rows())
+        if state['offset'] is None:
+            return {'tasks': 0, 'dependencies': 0, 'id_offset': 0}
+        offset, first_id = state['offset'], state['first_id']
+
+        if deferred_ids:
+            logger.info(f"{len(deferred_ids)} 个任务的父任务排在其后，稍后写入")
+            deferred_file.seek(0)
+            write_chunks(_task_params(task, offset, first_id)
+                         for task in _parents_first(map(json.loads, deferred_file)))
+
+        # 依赖的任务不在文件中时跳过这条边：早于文件首个 id 的会平移到无关任务上，
+        # 范围内缺失的 id 由 SELECT 查不到。
+        # 指向更小 id 的边彼此不会成环，先批量写入；任何环都至少含一条指向不更小 id 的边，
+        # 这些边随后逐条检查，检查时环上的其余边都已写入
+        edge_file.seek(0)
+        for chunk in chunked(edge_file, chunk_size):
+            with db.transaction() as conn:
+                conn.executemany(_INSERT_DEPENDENCY, [
+                    (task_id + offset, depends_on + offset)
+                    for task_id, depends_on in _edges(chunk) if first_id <= depends_on < task_id
+                ])
+        edge_file.seek(0)
+        for chunk in chunked(edge_file, chunk_size):
+            with db.transaction() as conn:
+                for task_id, depends_on in _edges(chunk):
+                    if depends_on >= task_id:
+                        _add_checked_edge(conn, task_id + offset, depends_on + offset)
+        with db.transaction() as conn:
+            # depends_on 指向文件中不存在的任务（被跳过的 id）时置空
+            conn.execute("""
+                UPDATE tasks SET depends_on = NULL
+                WHERE id >= ? AND depends_on IS NOT NULL
+                  AND NOT EXISTS (SELECT 1 FROM tasks AS target WHERE target.id = tasks.depends_on)
+            """, (base,))
+
+    # 新 id 都不小于 base；旧 depends_on 列在插入时已由触发器转成边，一并计入
+    edges = db.fetch_all("SELECT COUNT(*) FROM task_dependencies WHERE task_id >= ?", (base,))[0][0]
+    return {'tasks': state['done'], 'dependencies': edges, 'id_offset': offset}
+
+
+def _edges(lines):
+    return (tuple(map(int, line.split())) for line in lines)
+
+
+def _add_checked_edge(conn, task_id, depends_on):
+    """Adds an imported edge unless its target is missing or it would close a cycle."""
+    if conn.execute("SELECT 1 FROM tasks WHERE id = ?", (depends_on,)).fetchone() is None:
+        return
+    try:
+        dependencies.add_edge(conn, task_id, depends_on)
+    except dependencies.DependencyCycleError as e:
+        # 触发器可能已由 depends_on 列写入了这条边
+        conn.execute("DELETE FROM task_dependencies WHERE task_id = ? AND depends_on = ?", (task_id, depends_on))
+        logger.warning(f"Skipping imported dependency: {e}")
+
+
+def _task_params(task, offset, first_id):
+    def shift(value):
+        # 早于文件首个 id 的引用不在文件中：不平移，置空
+        return None if value is None or value < first_id else value + offset
+    return (task['id'] + offset, task['title'], task.get('description'), task.get('priority'), task.get('status'),
+            task.get('due_date'), shift(task.get('depends_on')), shift(task.get('parent_id')))
+
+
+def _parents_first(tasks):
+    """Orders held-back tasks so each comes after its parent (only these few are in memory)."""
+    pending = {task['id']: task for task in tasks}
+    while pending:
+        ready = [task for task in pending.values() if task['parent_id'] not in pending]
+        if not ready:
+            # 父链成环（文件已损坏）：剩下的作为根任务写入
+            ready = list(pending.values())
+            for task in ready:
+                task['parent_id'] = None
+        for task in ready:
+            del pending[task['id']]
+        yield from ready
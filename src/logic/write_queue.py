@@ -0,0 +1,182 @@
+"""Group commit: one writer thread that batches queued mutations into shared transactions.
+
+Callers submit TaskManager mutations (any callable) and get a
+``concurrent.futures.Future`` back. The writer takes the first queued call,
+keeps collecting whatever arrives within ``window`` seconds (up to
+``max_batch`` calls), and runs them all inside one write transaction, so a
+burst of small edits costs one commit and one fsync instead of one each.
+The futures are resolved only after that commit.
+
+Each call runs under its own savepoint: a call that raises is rolled back
+on its own and its future gets the exception, while the rest of the batch
+still commits. Calls that cannot run inside a transaction (moving a
+project between files needs ATTACH) are queued with ``submit_alone`` and
+run by themselves between batches.
+
+TaskManager calls update its cache as they run, before the commit. The
+writer therefore holds the manager's cache locks (``cache_locked``) for
+the whole batch, and drops the cache before releasing them if anything
+was rolled back. Other threads never see a cached write that is not
+committed.
+"""
+import contextlib
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from db import database
+
+logger = logging.getLogger(__name__)
+
+# 收集同一批写入的时间窗口（秒）和每批的最大调用数
+WRITE_WINDOW = 0.005
+MAX_BATCH = 1000
+
+_STOP = object()
+
+
+class WriteQueue:
+    """Runs submitted writes on a dedicated thread, committing each batch once."""
+
+    def __init__(self, task_manager=None, window=WRITE_WINDOW, max_batch=MAX_BATCH):
+        # task_manager：批次执行期间锁住它的缓存，回滚时让缓存失效
+        self.task_manager = task_manager
+        self.window = window
+        self.max_batch = max_batch
+        self.commits = 0
+        self.writes = 0
+        self._queue = queue.Queue()
+        self._held = None  # 收集批次时遇到的 submit_alone 调用，下一轮单独执行
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="WriteQueue", daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args, **kwargs):
+        """Queues ``func(*args, **kwargs)`` and returns a Future resolved after its batch commits."""
+        return self._put(func, args, kwargs, False)
+
+    def submit_alone(self, func, *args, **kwargs):
+        """Queues ``func(*args, **kwargs)`` to run on its own, outside any transaction.
+
+        It runs after every write queued before it has committed and before
+        any queued after it, so it acts as a barrier. Returns a Future.
+        """
+        return self._put(func, args, kwargs, True)
+
+    def _put(self, func, args, kwargs, alone):
+        if self._closed:
+            raise RuntimeError("WriteQueue is closed")
+        future = Future()
+        self._queue.put((future, func, args, kwargs, alone))
+        return future
+
+    def flush(self, timeout=None):
+        """Waits until everything submitted so far has been committed."""
+        self.submit(lambda: None).result(timeout)
+
+    def close(self):
+        """Commits the queued writes and stops the writer thread."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def stats(self):
+        return {'commits': self.commits, 'writes': self.writes}
+
+    def _run(self):
+        try:
+            while True:
+                batch = self._collect()
+                if batch is None:
+                    return
+                if batch[0][4]:
+                    self._run_alone(*batch[0][:4])
+                else:
+                    self._commit(batch)
+        finally:
+            database.close_connection()
+
+    def _collect(self):
+        """Blocks for the first call, then gathers more until the window closes.
+
+        Returns None once the stop marker has been read (after the calls before
+        it). A ``submit_alone`` call is returned as a batch of its own.
+        """
+        item, self._held = self._held or self._queue.get(), None
+        if item is _STOP:
+            return None
+        batch = [item]
+        if item[4]:
+            return batch
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)  # 本批提交后再退出
+                break
+            if item[4]:
+                self._held = item  # 本批提交后再单独执行
+                break
+            batch.append(item)
+        return batch
+
+    def _commit(self, batch):
+        results = []
+        with self._cache_locked():
+            try:
+                with database.transaction() as conn:
+                    for future, func, args, kwargs, _ in batch:
+                        if not future.set_running_or_notify_cancel():
+                            continue
+                        conn.execute("SAVEPOINT queued_write")
+                        try:
+                            result = (True, func(*args, **kwargs))
+                            conn.execute("RELEASE queued_write")
+                        except Exception as e:
+                            conn.execute("ROLLBACK TO queued_write")
+                            conn.execute("RELEASE queued_write")
+                            self._invalidate()
+                            result = (False, e)
+                        results.append((future, result))
+            except Exception as e:
+                # 提交失败：整批回滚，缓存中可能已有这些写入
+                logger.error(f"批量写入提交失败: {e}", exc_info=True)
+                self._invalidate()
+                for future, *_ in batch:
+                    if future.running():
+                        future.set_exception(e)
+                return
+        self.commits += 1
+        self.writes += len(results)
+        for future, (ok, value) in results:
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    @staticmethod
+    def _run_alone(future, func, args, kwargs):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    def _cache_locked(self):
+        if self.task_manager is None:
+            return contextlib.nullcontext()
+        return self.task_manager.cache_locked()
+
+    def _invalidate(self):
+        if self.task_manager is not None:
+            self.task_manager.invalidate_cache()
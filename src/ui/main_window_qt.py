@@ -3,12 +3,17 @@ from PyQt6.QtWidgets import (
     QToolBar, QApplication, QProgressBar, QStyledItemDelegate,
     QListWidgetItem, QListWidget, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QLineEdit, QTextEdit, QTableWidget, QGroupBox, QHeaderView,
-    QFormLayout
+    QFormLayout, QComboBox, QSystemTrayIcon, QFileDialog, QInputDialog
 )
-from PyQt6.QtCore import Qt, QTimer, QRect, QModelIndex
+from PyQt6.QtCore import Qt, QTimer, QRect, QModelIndex, pyqtSignal
 from PyQt6.QtGui import QAction, QFont, QPainter, QPen, QColor, QIcon
 from logic import task_manager
-from db import database
+from db import database, rollups
+from ui.task_worker import TaskRunner
+from logic.write_queue import WriteQueue
+from ui.reminder_scheduler import ReminderScheduler
+from ui.maintenance_scheduler import MaintenanceScheduler
+from datetime import date, datetime, timedelta
 import logging
 
 # 配置日志记录
@@ -21,6 +26,20 @@ logging.basicConfig(level=logging.DEBUG,
 
 logger = logging.getLogger(__name__)
 
+# 每次滚动加载的根任务数量
+PAGE_SIZE = 200
+
+# 自动备份间隔（毫秒）；期间没有改动时跳过
+AUTO_BACKUP_MS = 60 * 60 * 1000
+
+# 截止日期筛选：(显示名称, 键)
+DUE_FILTERS = [
+    ("All Tasks", None),
+    ("Overdue", 'overdue'),
+    ("Due Today", 'today'),
+    ("Due This Week", 'week'),
+]
+
 # Define theme stylesheets
 LIGHT_THEME = """
     QMainWindow {
@@ -173,6 +192,9 @@ class TaskItemDelegate(QStyledItemDelegate):
             painter.restore()
 
 class TaskManagerApp(QMainWindow):
+    # 导入/导出进度：由后台线程发出，Qt 自动排队到界面线程
+    transfer_progress = pyqtSignal(str)
+    backup_progress = pyqtSignal(str)
     def __init__(self, task_manager):
         super().__init__()
         self.task_manager = task_manager
@@ -186,6 +208,16 @@ class TaskManagerApp(QMainWindow):
         # Initialize tasks list
         self.tasks = []
         self.flat_tasks = []
+        self.schedule = {}  # 任务 id -> TaskManager.get_schedule 的结果
+        self.next_page_key = None
+        self.page_generation = 0
+        self.loading_page = False
+        
+        # 数据库操作在后台线程执行，避免阻塞界面
+        self.runner = TaskRunner(self)
+        self.runner.busy_changed.connect(self.set_busy)
+        # 增删改走批量提交队列：短时间内的多次写入合并为一个事务
+        self.writes = WriteQueue(self.task_manager)
         
         # 定义状态样式
         self.status_styles = {
@@ -232,6 +264,30 @@ class TaskManagerApp(QMainWindow):
         
         # 初始化UI组件
         self._init_ui()
+
+        # 提醒：只为最早到期的一条设置定时器
+        self.tray_icon = QSystemTrayIcon(self.windowIcon(), self) if QSystemTrayIcon.isSystemTrayAvailable() else None
+        self.reminders = ReminderScheduler(self.task_manager, self.runner, self)
+        self.reminders.reminder_due.connect(self.show_reminder)
+        self.reminders.start()
+
+        # 备份在单独的线程上分步复制，数据库工作线程照常处理读写
+        self.backup_runner = TaskRunner(self)
+        self.backup_progress.connect(lambda message: self.statusBar().showMessage(message, 3000))
+        self.last_backup_cursor = None
+        self.backup_timer = QTimer(self)
+        self.backup_timer.timeout.connect(self.auto_backup)
+        self.backup_timer.start(AUTO_BACKUP_MS)
+
+        # 空闲时整理存储（optimize、ANALYZE、增量清理），同样在备份线程上执行
+        self.maintenance = MaintenanceScheduler(self.task_manager, self.backup_runner,
+                                                watched=(self.runner,), parent=self)
+        self.maintenance.start()
+
+        # 存放在独立文件中的项目（根任务 id），供右键菜单选择“移出”或“移回”
+        self.shard_roots = set()
+        self.runner.submit(self.task_manager.get_shards,
+                           on_done=lambda shards: setattr(self, 'shard_roots', set(shards)))
         
     def _init_ui(self):
         # Create central widget and layout
@@ -304,6 +360,26 @@ class TaskManagerApp(QMainWindow):
         self.theme_action.setChecked(False)
         self.theme_action.triggered.connect(self.toggle_theme)
         toolbar.addAction(self.theme_action)
+
+        # 导出 / 导入（JSON Lines 或 CSV）
+        export_action = QAction("⤓", self)
+        export_action.setToolTip("Export tasks")
+        export_action.triggered.connect(self.export_tasks)
+        toolbar.addAction(export_action)
+        import_action = QAction("⤒", self)
+        import_action.setToolTip("Import tasks")
+        import_action.triggered.connect(self.import_tasks)
+        toolbar.addAction(import_action)
+
+        # 备份 / 从快照恢复
+        backup_action = QAction("💾", self)
+        backup_action.setToolTip("Back up now")
+        backup_action.triggered.connect(lambda: self.backup_now())
+        toolbar.addAction(backup_action)
+        restore_action = QAction("⟲", self)
+        restore_action.setToolTip("Restore from backup")
+        restore_action.triggered.connect(self.restore_backup)
+        toolbar.addAction(restore_action)
         
         # Add version info
         version_label = QLabel(get_version_info())
@@ -317,10 +393,31 @@ class TaskManagerApp(QMainWindow):
         task_view_layout.setSpacing(10)
         task_view_layout.setContentsMargins(15, 15, 15, 15)
         
+        # Search box (FTS5-backed, debounced)
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("🔍 Search tasks...")
+        self.search_input.setClearButtonEnabled(True)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(250)
+        self.search_timer.timeout.connect(self.load_tasks)
+        self.search_input.textChanged.connect(lambda _text: self.search_timer.start())
+
+        # Due date filter (indexed due_day range queries)
+        self.due_filter_combo = QComboBox()
+        for label, key in DUE_FILTERS:
+            self.due_filter_combo.addItem(label, key)
+        self.due_filter_combo.currentIndexChanged.connect(lambda _index: self.load_tasks())
+
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(self.search_input, stretch=1)
+        filter_layout.addWidget(self.due_filter_combo)
+        task_view_layout.addLayout(filter_layout)
+        
         # Task table
         self.task_table = QTableWidget()
-        self.task_table.setColumnCount(4)
-        self.task_table.setHorizontalHeaderLabels(["Title", "Description", "Status", "Due Date"])
+        self.task_table.setColumnCount(5)
+        self.task_table.setHorizontalHeaderLabels(["Title", "Description", "Status", "Due Date", "Finish"])
         self.task_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
         self.task_table.setAlternatingRowColors(True)
         self.task_table.setShowGrid(False)
@@ -329,6 +426,8 @@ class TaskManagerApp(QMainWindow):
         self.task_table.verticalHeader().setVisible(False)
         self.task_table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)  # Enable custom context menu
         self.task_table.customContextMenuRequested.connect(self.show_task_context_menu)
+        self.task_table.verticalScrollBar().valueChanged.connect(self._on_table_scrolled)
+        self.task_table.cellDoubleClicked.connect(self._on_cell_double_clicked)  # 双击展开/折叠子任务
         task_view_layout.addWidget(self.task_table)
         
         # Status buttons
@@ -397,8 +496,11 @@ class TaskManagerApp(QMainWindow):
         self.task_title_input = QLineEdit()
         self.task_description_input = QTextEdit()
         self.task_description_input.setMaximumHeight(100)  # Limit height
+        self.task_due_input = QLineEdit()
+        self.task_due_input.setPlaceholderText("YYYY-MM-DD (optional)")
         input_layout.addRow("Title:", self.task_title_input)
         input_layout.addRow("Description:", self.task_description_input)
+        input_layout.addRow("Due Date:", self.task_due_input)
         
         # Add task button
         self.add_button = QPushButton("Add Task")
@@ -473,12 +575,27 @@ class TaskManagerApp(QMainWindow):
         self.not_started_label.setStyleSheet("color: #c62828; font-weight: bold;")
         counts_layout.addWidget(self.not_started_label)
         
+        # Which tasks the progress bar counts
+        self.progress_scope_combo = QComboBox()
+        self.progress_scope_combo.addItem("Top-level", "roots")
+        self.progress_scope_combo.addItem("Leaf tasks", "leaves")
+        self.progress_scope_combo.addItem("All tasks", "all")
+        self.progress_scope_combo.currentIndexChanged.connect(lambda _index: self.update_progress_display())
+        counts_layout.addWidget(self.progress_scope_combo)
+        
         progress_layout.addLayout(counts_layout)
         
         # Add to footer
         self.footer_layout.addWidget(progress_widget)
         self.footer_layout.addStretch()
         
+        # Busy indicator for background database work
+        self.busy_label = QLabel("⏳ Working...")
+        self.busy_label.setStyleSheet("color: #666;")
+        self.busy_label.hide()
+        self.footer_layout.addWidget(self.busy_label)
+        self.transfer_progress.connect(self.busy_label.setText)
+        
         # Clear button
         self.clear_button = QPushButton("Clear All Tasks")
         self.clear_button.setMinimumHeight(32)
@@ -486,22 +603,23 @@ class TaskManagerApp(QMainWindow):
         self.footer_layout.addWidget(self.clear_button)
 
     def update_progress_display(self):
+        """Refreshes the progress bar from the trigger-maintained task counters."""
+        scope = self.progress_scope_combo.currentData()
+        self.runner.submit(self.task_manager.get_stats, scope, on_done=self._show_progress, on_error=self.show_error)
+
+    def _show_progress(self, stats):
         """Updates the progress bar and label based on completed tasks."""
-        if not self.tasks:
-            total = 0
-            completed = 0
-        else:
-            total = len(self.tasks)
-            completed = sum(1 for task in self.tasks if task['status'] == 'completed')
-        
-        # Calculate percentage
-        percentage = (completed / total * 100) if total > 0 else 0
+        total = stats['total']
+        completed = stats['completed']
+        percentage = stats['percent']
         
         # Update progress bar
         self.progress_bar.setValue(int(percentage))
         
         # Update status label with modern styling
         self.total_label.setText(f"Total: {total} | Completed: {completed}")
+        self.in_progress_label.setText(f"In Progress: {stats['in_progress']}")
+        self.not_started_label.setText(f"Not Started: {stats['not_started']}")
         
         # Set color based on progress
         if percentage >= 80:
@@ -544,13 +662,162 @@ class TaskManagerApp(QMainWindow):
                 }
             """)
 
-    def load_tasks(self):
-        """Load tasks and display them in the table."""
-        # Get tasks from database
-        self.tasks = self.task_manager.get_tasks()
+    def set_busy(self, busy):
+        """Shows or hides the busy state while background work is pending."""
+        self.busy_label.setVisible(busy)
+        if not busy:
+            self.busy_label.setText("⏳ Working...")
+        if busy:
+            QApplication.setOverrideCursor(Qt.CursorShape.BusyCursor)
+        else:
+            QApplication.restoreOverrideCursor()
+
+    def show_error(self, message):
+        QMessageBox.warning(self, "Error", message)
+
+    def closeEvent(self, event):
+        self.reminders.stop()
+        self.backup_timer.stop()
+        self.maintenance.stop()
+        self.backup_runner.shutdown()
+        self.writes.close()
+        self.runner.shutdown()
+        super().closeEvent(event)
+
+    def load_tasks(self, then=None):
+        """Load the first page of tasks (or the current search results) in the background."""
+        self.page_generation += 1
+        generation = self.page_generation
+        self.next_page_key = None
+        self.loading_page = False
+        query = self.search_input.text().strip()
+        due_filter = self.due_filter_combo.currentData()
+        
+        if query or due_filter:
+            def on_results(results):
+                if generation != self.page_generation:
+                    return
+                self.display_search_results(results)
+                if then:
+                    then()
+            self.runner.submit(self._fetch_filtered, query, due_filter, on_done=on_results, on_error=self.show_error)
+            return
         
-        # 展开任务层级为平面列表
+        def on_page(page):
+            if generation != self.page_generation:
+                return
+            self.next_page_key = page['next_key']
+            self.display_tasks(page['tasks'])
+            if then:
+                then()
+            self._on_table_scrolled(self.task_table.verticalScrollBar().value())
+        self._fetch_root_page(None, on_page)
+
+    def load_more_tasks(self):
+        """Appends the next page of root tasks, if any."""
+        if self.next_page_key is None or self.loading_page:
+            return
+        self.loading_page = True
+        generation = self.page_generation
+        
+        def on_page(page):
+            if generation != self.page_generation:
+                return
+            self.loading_page = False
+            self.next_page_key = page['next_key']
+            self.append_tasks(page['tasks'])
+            self._on_table_scrolled(self.task_table.verticalScrollBar().value())
+        self._fetch_root_page(self.next_page_key, on_page)
+
+    def _fetch_filtered(self, query, due_filter):
+        """Runs on the worker thread: search results and/or a due-date filter as a flat list."""
+        if not due_filter:
+            return self.task_manager.search(query, PAGE_SIZE)
+        today = date.today()
+        limit = None if query else PAGE_SIZE
+        if due_filter == 'overdue':
+            tasks = self.task_manager.get_overdue(today, limit)
+        else:
+            end = today if due_filter == 'today' else today + timedelta(days=6)
+            tasks = self.task_manager.get_due_between(today, end, limit)
+        if query:
+            # 与搜索结果取交集，保持搜索的排名顺序
+            due_ids = {task['id'] for task in tasks}
+            tasks = [task for task in self.task_manager.search(query, PAGE_SIZE) if task['id'] in due_ids]
+        return tasks
+
+    def _fetch_root_page(self, after_key, on_page):
+        # 按 id 做 keyset 分页，只取根任务；子任务在展开时再加载
+        def to_page(roots):
+            next_key = roots[-1]['id'] if len(roots) == PAGE_SIZE else None
+            return {'tasks': roots, 'next_key': next_key}
+        self.runner.submit(
+            lambda: to_page(self.task_manager.get_root_tasks(after_key, PAGE_SIZE)),
+            on_done=on_page, on_error=self.show_error
+        )
+
+    def _on_cell_double_clicked(self, row, column):
+        if 0 <= row < len(self.flat_tasks):
+            self.toggle_task_expanded(self.flat_tasks[row])
+
+    def toggle_task_expanded(self, task):
+        """Expands a task (loading its children on demand) or collapses it."""
+        if not task.get('child_count'):
+            return
+        if task.get('_expanded'):
+            self._collapse_task(task)
+            return
+        
+        generation = self.page_generation
+        def on_children(children):
+            if generation != self.page_generation or task.get('_expanded') or task not in self.flat_tasks:
+                return
+            task['_expanded'] = True
+            row = self.flat_tasks.index(task)
+            self._render_task_row(row, task)
+            for offset, child in enumerate(children, start=1):
+                child['_level'] = task['_level'] + 1
+                self.flat_tasks.insert(row + offset, child)
+                self.task_table.insertRow(row + offset)
+                self._render_task_row(row + offset, child)
+        self.runner.submit(self.task_manager.get_children, task['id'], on_done=on_children, on_error=self.show_error)
+
+    def _collapse_task(self, task):
+        task['_expanded'] = False
+        row = self.flat_tasks.index(task)
+        end = row + 1
+        while end < len(self.flat_tasks) and self.flat_tasks[end]['_level'] > task['_level']:
+            end += 1
+        for child_row in range(end - 1, row, -1):
+            self.task_table.removeRow(child_row)
+        del self.flat_tasks[row + 1:end]
+        self._render_task_row(row, task)
+
+    def _on_table_scrolled(self, value):
+        # 接近底部（或首页不足一屏）时加载下一页
+        scroll_bar = self.task_table.verticalScrollBar()
+        if value >= scroll_bar.maximum() - 5:
+            self.load_more_tasks()
+
+    def display_search_results(self, results):
+        """Display ranked search results as a flat list."""
+        for task in results:
+            task['_level'] = 0
+        self.flat_tasks = results
+        self._render_rows()
+
+    def display_tasks(self, tasks):
+        """Display the given task tree in the table."""
+        self.tasks = []
         self.flat_tasks = []
+        self.append_tasks(tasks)
+
+    def append_tasks(self, tasks):
+        """Appends a task tree below the rows already shown."""
+        self.tasks.extend(tasks)
+        first_row = len(self.flat_tasks)
+        
+        # 展开任务层级为平面列表
         def flatten_tasks(tasks, level=0):
             for task in tasks:
                 task['_level'] = level  # 添加层级信息
@@ -558,105 +825,191 @@ class TaskManagerApp(QMainWindow):
                 if 'children' in task:
                     flatten_tasks(task['children'], level + 1)
         
-        flatten_tasks(self.tasks)
+        flatten_tasks(tasks)
+        self._render_rows(first_row)
+        
+        # Update progress display
+        self.update_progress_display()
+
+    def _render_rows(self, first_row=0):
+        """Renders self.flat_tasks (from ``first_row`` on) into the table."""
         self.task_table.setRowCount(len(self.flat_tasks))
         
-        for row, task in enumerate(self.flat_tasks):
+        for row in range(first_row, len(self.flat_tasks)):
+            task = self.flat_tasks[row]
             try:
                 logger.debug(f"处理任务: ID={task['id']}, 标题={task['title']}, 父任务ID={task.get('parent_id')}")
-                
-                # 标准化状态并设置样式
-                status = task['status'].replace('_', ' ').title()
-                status_style = self.status_styles.get(status, {})
-                logger.debug(f"任务状态: {status}, 样式: {status_style}")
-                
-                # 设置标题
-                title_item = QTableWidgetItem()
-                indent = "    " * task['_level']
-                arrow = "→ " if task['_level'] > 0 else ""
-                title_item.setText(f"{indent}{arrow}{task['title']}")
-                
-                # 设置父/子任务样式
-                if task['_level'] > 0:
-                    title_item.setForeground(QColor("#666666"))
-                    title_item.setIcon(QIcon(':/icons/subtask.png'))
-                else:
-                    font = title_item.font()
-                    font.setBold(True)
-                    title_item.setFont(font)
-                
-                self.task_table.setItem(row, 0, title_item)
-                
-                # 设置描述
-                desc_item = QTableWidgetItem(task.get('description', '') or '')
-                desc_item.setForeground(QColor("#666666"))
-                self.task_table.setItem(row, 1, desc_item)
-                
-                # 设置状态
-                status_item = QTableWidgetItem(status)
-                status_item.setForeground(QColor(status_style.get('color', 'black')))
-                self.task_table.setItem(row, 2, status_item)
-                
-                # 根据状态设置行背景颜色
-                for j in range(self.task_table.columnCount()):
-                    item = self.task_table.item(row, j)
-                    if item:
-                        if task['status'] == 'not_started':
-                            item.setBackground(QColor('#FFEBEE'))  # 浅红色
-                            item.setForeground(QColor(status_style.get('text_color', '#D32F2F')))  # 红色字体
-                        elif task['status'] == 'in_progress':
-                            item.setBackground(QColor('#FFF3E0'))  # 浅橙色
-                            item.setForeground(QColor('#2196F3'))  # 蓝色字体
-                        elif task['status'] == 'completed':
-                            item.setBackground(QColor('#E8F5E9'))  # 浅绿色
-                            item.setForeground(QColor(status_style.get('text_color', '#2E7D32')))  # 绿色字体
-        
-                # Due date
-                due_date = task.get('due_date', '')
-                due_date_item = QTableWidgetItem(due_date if due_date else "")
-                if due_date:
-                    due_date_item.setForeground(QColor("#1976D2"))
-                self.task_table.setItem(row, 3, due_date_item)
-
+                self._render_task_row(row, task)
             except Exception as e:
                 logger.error(f"处理任务时出错: {e}", exc_info=True)
                 continue  # 跳过处理出错的任务，继续处理下一个
                 
         logger.info("任务显示更新完成")
         
-        # Update progress display
-        self.update_progress_display()
-        
         # Resize columns to content
         self.task_table.resizeColumnsToContents()
         self.task_table.horizontalHeader().setStretchLastSection(True)
+        self.refresh_schedule()
+
+    def _render_task_row(self, row, task):
+        """Fills one table row from a task dict."""
+        # 标准化状态并设置样式
+        status = task['status'].replace('_', ' ').title()
+        status_style = self.status_styles.get(status, {})
+        logger.debug(f"任务状态: {status}, 样式: {status_style}")
+        
+        # 设置标题
+        title_item = QTableWidgetItem()
+        indent = "    " * task['_level']
+        arrow = "→ " if task['_level'] > 0 else ""
+        expander = ""
+        if task.get('child_count'):
+            expander = "▼ " if task.get('_expanded') else "▶ "
+        progress = ""
+        if task.get('child_count'):
+            # 例如 "(7/12)"：直接子任务的完成数，悬停显示整棵子树的完成百分比
+            progress = f"  ({task['completed_count']}/{task['child_count']})"
+            title_item.setToolTip(f"{task['percent_complete']:.0f}% of {task['descendant_count']} subtasks completed")
+        title_item.setText(f"{indent}{arrow}{expander}{task['title']}{progress}")
+        
+        # 设置父/子任务样式
+        if task['_level'] > 0:
+            title_item.setForeground(QColor("#666666"))
+            title_item.setIcon(QIcon(':/icons/subtask.png'))
+        else:
+            font = title_item.font()
+            font.setBold(True)
+            title_item.setFont(font)
+        
+        self.task_table.setItem(row, 0, title_item)
+        
+        # 设置描述
+        desc_item = QTableWidgetItem(task.get('description', '') or '')
+        desc_item.setForeground(QColor("#666666"))
+        self.task_table.setItem(row, 1, desc_item)
+        
+        # 设置状态
+        status_item = QTableWidgetItem(status)
+        status_item.setForeground(QColor(status_style.get('color', 'black')))
+        self.task_table.setItem(row, 2, status_item)
+        
+        # 根据状态设置行背景颜色
+        for j in range(self.task_table.columnCount()):
+            item = self.task_table.item(row, j)
+            if item:
+                if task['status'] == 'not_started':
+                    item.setBackground(QColor('#FFEBEE'))  # 浅红色
+                    item.setForeground(QColor(status_style.get('text_color', '#D32F2F')))  # 红色字体
+                elif task['status'] == 'in_progress':
+                    item.setBackground(QColor('#FFF3E0'))  # 浅橙色
+                    item.setForeground(QColor('#2196F3'))  # 蓝色字体
+                elif task['status'] == 'completed':
+                    item.setBackground(QColor('#E8F5E9'))  # 浅绿色
+                    item.setForeground(QColor(status_style.get('text_color', '#2E7D32')))  # 绿色字体
+
+        # Due date
+        due_date = task.get('due_date', '')
+        due_date_item = QTableWidgetItem(due_date if due_date else "")
+        if due_date:
+            due_day = task.get('due_day')
+            overdue = due_day is not None and due_day < database.to_epoch_day(date.today()) \
+                and task['status'] != 'completed'
+            due_date_item.setForeground(QColor("#D32F2F" if overdue else "#1976D2"))
+            if overdue:
+                due_date_item.setToolTip("Overdue")
+        self.task_table.setItem(row, 3, due_date_item)
+
+        # 最早完成日期；关键路径上的任务标红加粗
+        entry = self.schedule.get(task['id'])
+        finish_item = QTableWidgetItem()
+        if entry and task['status'] != 'completed':
+            finish_item.setText(entry['earliest_finish'].isoformat())
+            finish_item.setToolTip(
+                f"Latest finish {entry['latest_finish'].isoformat()}, slack {entry['slack']} day(s)"
+            )
+            if entry['critical']:
+                font = finish_item.font()
+                font.setBold(True)
+                finish_item.setFont(font)
+                finish_item.setForeground(QColor("#D32F2F"))
+                finish_item.setToolTip(finish_item.toolTip() + " (critical path)")
+        self.task_table.setItem(row, 4, finish_item)
+
+        # 有未完成的依赖：整行置灰
+        if task.get('blocked'):
+            for j in range(self.task_table.columnCount()):
+                item = self.task_table.item(row, j)
+                if item:
+                    item.setBackground(QColor('#ECEFF1'))
+                    item.setForeground(QColor('#78909C'))
+            status_item.setText(f"{status} (Blocked)")
+            status_item.setToolTip("Waiting on unfinished dependencies")
+
+    def refresh_task_rows(self, task_ids, status):
+        """Re-renders only the rows of the given tasks after a status change.
+
+        ``task_ids`` are whole subtrees, so their own rollups follow from ``status``.
+        """
+        task_ids = set(task_ids)
+        done = status == 'completed'
+        for row, task in enumerate(self.flat_tasks):
+            if task['id'] in task_ids:
+                task['status'] = status
+                # 整棵子树都改成了同一状态
+                task['completed_count'] = task.get('child_count', 0) if done else 0
+                task['completed_descendant_count'] = task.get('descendant_count', 0) if done else 0
+                task['percent_complete'] = 100 if done else 0
+                self._render_task_row(row, task)
+        self.update_progress_display()
+
+    def _ancestors_of(self, task_ids):
+        """Fresh rows (with rollups) of every ancestor of ``task_ids``; runs on the worker thread."""
+        return {ancestor['id']: ancestor for task_id in task_ids
+                for ancestor in self.task_manager.get_ancestors(task_id)}
+
+    def refresh_rollup_rows(self, tasks_by_id):
+        """Re-renders the shown rows among ``tasks_by_id`` with their fresh "(done/total)" and progress."""
+        for row, task in enumerate(self.flat_tasks):
+            fresh = tasks_by_id.get(task['id'])
+            if fresh:
+                for key in rollups.COLUMNS + ('percent_complete',):
+                    task[key] = fresh[key]
+                self._render_task_row(row, task)
 
     def add_task(self):
         """Add a new task."""
         title = self.task_title_input.text().strip()
         description = self.task_description_input.toPlainText().strip()
+        due_date = self.task_due_input.text().strip() or None
         
         if not title:
             QMessageBox.warning(self, "Error", "Title is required.")
             return
+        if due_date and database.to_epoch_day(due_date) is None:
+            QMessageBox.warning(self, "Error", "Due date must look like YYYY-MM-DD.")
+            return
         
-        self.task_manager.add_task(
-            title=title,
-            description=description,
-            priority="medium",
-            status="not_started",
-            due_date=None,
-            depends_on=None,
-            parent_id=None
+        self.runner.watch(
+            self.writes.submit(
+                self.task_manager.add_task,
+                title=title,
+                description=description,
+                priority="medium",
+                status="not_started",
+                due_date=due_date,
+                depends_on=None,
+                parent_id=None,
+            ),
+            on_done=lambda task_id: self.load_tasks(then=self._select_last_row),
+            on_error=self.show_error
         )
         
         # Clear inputs
         self.task_title_input.clear()
         self.task_description_input.clear()
-        
-        # Refresh the task list
-        self.load_tasks()
-        
+        self.task_due_input.clear()
+
+    def _select_last_row(self):
         # Scroll to the bottom of the table
         self.task_table.scrollToBottom()
         
@@ -679,28 +1032,142 @@ class TaskManagerApp(QMainWindow):
         
         logger.debug(f"待更新任务ID列表: {task_ids}")
         
-        for task_id in task_ids:
-            self.task_manager.update_task_status(task_id, status)
-        
-        self.load_tasks()
+        def on_updated(affected_ids):
+            # 只刷新受影响的行，无需重新加载整个表格
+            self.refresh_task_rows(affected_ids, status)
+            # 祖先行的 "(完成/总数)" 和进度也随之变化
+            self.runner.submit(self._ancestors_of, task_ids, on_done=self.refresh_rollup_rows,
+                               on_error=self.show_error)
+            # 状态变化可能解除（或恢复）依赖它们的任务的阻塞
+            self.runner.submit(self.task_manager.get_blocked_ids, on_done=self.refresh_blocked_rows)
+            self.refresh_schedule()
+
+        self.runner.watch(self.writes.submit(self.task_manager.update_tasks_status, task_ids, status),
+                          on_done=on_updated, on_error=self.show_error)
+
+    def refresh_blocked_rows(self, blocked_ids):
+        """Re-renders the rows whose blocked state changed."""
+        for row, task in enumerate(self.flat_tasks):
+            blocked = task['id'] in blocked_ids
+            if task.get('blocked', False) != blocked:
+                task['blocked'] = blocked
+                self._render_task_row(row, task)
+
+    def refresh_schedule(self):
+        """Fetches the schedule of the shown tasks and re-renders rows whose entry changed."""
+        task_ids = [task['id'] for task in self.flat_tasks]
+        if not task_ids:
+            return
+
+        def on_schedule(schedule):
+            for row, task in enumerate(self.flat_tasks):
+                entry = schedule.get(task['id'])
+                if self.schedule.get(task['id']) != entry:
+                    self.schedule[task['id']] = entry
+                    self._render_task_row(row, task)
+        self.runner.submit(self.task_manager.get_schedule, task_ids, on_done=on_schedule,
+                           on_error=lambda message: logger.error(f"计算关键路径失败: {message}"))
 
     def clear_tasks(self):
-        """Clear all tasks without confirmation."""
-        try:
-            database.execute("DELETE FROM tasks")
-            self.load_tasks()  # Refresh task list
-            
-            # Show temporary success message
-            self.total_label.setText("✓ All tasks cleared")
-            self.total_label.setStyleSheet("color: #2e7d32; font-weight: bold;")
-            
-            # Reset the total label after 2 seconds
-            QTimer.singleShot(2000, lambda: (
-                self.total_label.setText("Total: 0"),
-                self.total_label.setStyleSheet("color: #666;")
-            ))
-        except Exception as e:
-            QMessageBox.warning(self, "Error", f"Failed to clear tasks: {e}")
+        """Clears all tasks after confirmation; a snapshot is taken first so it can be undone."""
+        answer = QMessageBox.question(
+            self, "Clear Tasks",
+            "Delete all tasks? A backup is taken first and can be restored with ⟲."
+        )
+        if answer != QMessageBox.StandardButton.Yes:
+            return
+
+        def on_cleared(success):
+            if not success:
+                QMessageBox.warning(self, "Error", "Failed to clear tasks")
+                return
+            self.reminders.reload()
+            self.load_tasks(then=self._show_cleared_message)
+
+        self.backup_now(then=lambda: self.runner.submit(
+            self.task_manager.clear_tasks, on_done=on_cleared, on_error=self.show_error
+        ))
+
+    def backup_now(self, then=None):
+        """Takes a snapshot on the backup thread, then calls ``then()`` on the GUI thread."""
+        def on_progress(status, remaining, total):
+            if total:
+                self.backup_progress.emit(f"Backing up... {100 * (total - remaining) // total}%")
+
+        def on_done(path):
+            self.statusBar().showMessage(f"Backup saved: {path.name}", 5000)
+            if then:
+                then()
+        self.backup_runner.submit(self.task_manager.backup, progress=on_progress,
+                                  on_done=on_done, on_error=self.show_error)
+
+    def auto_backup(self):
+        """Takes a periodic snapshot if anything changed since the last one."""
+        def on_cursor(cursor):
+            if cursor != self.last_backup_cursor:
+                self.backup_now(then=lambda: setattr(self, 'last_backup_cursor', cursor))
+        self.runner.submit(self.task_manager.get_change_cursor, on_done=on_cursor)
+
+    def restore_backup(self):
+        """Lets the user pick a snapshot and replaces the database with it."""
+        def on_snapshots(paths):
+            if not paths:
+                QMessageBox.information(self, "Restore", "No backups yet.")
+                return
+            names = [path.name for path in paths]
+            name, ok = QInputDialog.getItem(self, "Restore Backup", "Replace all tasks with:", names, 0, False)
+            if not ok:
+                return
+
+            def on_restored(_):
+                self.runner.submit(self.task_manager.get_shards,
+                                   on_done=lambda shards: setattr(self, 'shard_roots', set(shards)))
+                self.reminders.reload()
+                self.load_tasks()
+            self.runner.submit(self.task_manager.restore_backup, paths[names.index(name)],
+                               on_done=on_restored, on_error=self.show_error)
+        self.runner.submit(self.task_manager.list_backups, on_done=on_snapshots, on_error=self.show_error)
+
+    def _show_cleared_message(self):
+        # Show temporary success message
+        self.total_label.setText("✓ All tasks cleared")
+        self.total_label.setStyleSheet("color: #2e7d32; font-weight: bold;")
+        
+        # Reset the total label after 2 seconds
+        QTimer.singleShot(2000, lambda: (
+            self.total_label.setText("Total: 0"),
+            self.total_label.setStyleSheet("color: #666;")
+        ))
+
+    def export_tasks(self):
+        """Streams every task to a JSON Lines or CSV file chosen by the user."""
+        path, _ = QFileDialog.getSaveFileName(self, "Export Tasks", "tasks.jsonl",
+                                              "JSON Lines (*.jsonl);;CSV (*.csv)")
+        if not path:
+            return
+        self.runner.submit(
+            self.task_manager.export_tasks, path,
+            on_progress=lambda count: self.transfer_progress.emit(f"⏳ Exported {count}..."),
+            on_done=lambda count: QMessageBox.information(self, "Export", f"Exported {count} tasks."),
+            on_error=self.show_error
+        )
+
+    def import_tasks(self):
+        """Imports tasks from a file written by Export, keeping parents and dependencies."""
+        path, _ = QFileDialog.getOpenFileName(self, "Import Tasks", "",
+                                              "Task files (*.jsonl *.csv)")
+        if not path:
+            return
+
+        def on_imported(result):
+            self.load_tasks()
+            QMessageBox.information(self, "Import", f"Imported {result['tasks']} tasks.")
+        self.runner.submit(
+            self.task_manager.import_tasks, path,
+            on_progress=lambda count: self.transfer_progress.emit(f"⏳ Imported {count}..."),
+            on_done=on_imported,
+            on_error=lambda message: (self.load_tasks(), self.show_error(message))
+        )
 
     def batch_import_tasks(self):
         """Imports tasks in bulk from the batch import text box."""
@@ -710,11 +1177,9 @@ class TaskManagerApp(QMainWindow):
             return
         
         lines = text.split('\n')
-        current_parent_id = None
-        tasks_added = 0
+        task_tree = []
         
         for line in lines:
-            original_line = line
             line = line.rstrip()  # 保留左侧空格，去除右侧空格
             if not line:
                 continue
@@ -725,36 +1190,21 @@ class TaskManagerApp(QMainWindow):
             title = line.strip()
             
             if is_subtask:
-                if current_parent_id is None:
+                if not task_tree:
                     QMessageBox.warning(self, "错误", "子任务前必须有父任务！")
                     return
-                # 添加子任务
-                self.task_manager.add_task(
-                    title=title,
-                    description='',
-                    priority='medium',
-                    status='not_started',
-                    due_date=None,
-                    depends_on=None,
-                    parent_id=current_parent_id
-                )
+                task_tree[-1]['children'].append({'title': title})
             else:
-                # 添加父任务
-                current_parent_id = self.task_manager.add_task(
-                    title=title,
-                    description='',
-                    priority='medium',
-                    status='not_started',
-                    due_date=None,
-                    depends_on=None,
-                    parent_id=None
-                )
-            tasks_added += 1
-        
-        # 刷新任务列表
-        self.load_tasks()
+                task_tree.append({'title': title, 'children': []})
+        
+        def on_imported(task_ids):
+            # 刷新任务列表
+            self.load_tasks()
+            QMessageBox.information(self, "成功", f"成功导入 {len(task_ids)} 个任务！")
+        
+        # 整棵任务树在一个事务内写入
+        self.runner.submit(self.task_manager.add_tasks, task_tree, on_done=on_imported, on_error=self.show_error)
         self.batch_import_text.clear()
-        QMessageBox.information(self, "成功", f"成功导入 {tasks_added} 个任务！")
 
     def toggle_pin(self):
         flags = self.windowFlags()
@@ -798,10 +1248,48 @@ class TaskManagerApp(QMainWindow):
         delete_action = QAction(delete_text, self)
         delete_action.triggered.connect(self.delete_selected_tasks)
         menu.addAction(delete_action)
+
+        # 提醒
+        remind_menu = menu.addMenu("Remind Me")
+        now = datetime.now()
+        tomorrow_morning = (now + timedelta(days=1)).replace(hour=9, minute=0, second=0, microsecond=0)
+        for label, when in (("In 15 Minutes", now + timedelta(minutes=15)),
+                            ("In 1 Hour", now + timedelta(hours=1)),
+                            ("Tomorrow 9:00", tomorrow_morning)):
+            action = QAction(label, self)
+            action.triggered.connect(lambda checked=False, when=when: self.remind_selected_tasks(when))
+            remind_menu.addAction(action)
+
+        # 单个根任务：整个项目移到独立的数据库文件，或移回主库
+        rows = [row.row() for row in selected_rows if row.row() < len(self.flat_tasks)]
+        if len(rows) == 1 and self.flat_tasks[rows[0]].get('parent_id') is None:
+            root_id = self.flat_tasks[rows[0]]['id']
+            menu.addSeparator()
+            if root_id in self.shard_roots:
+                shard_action = QAction("Move Project Back to Main File", self)
+                shard_action.triggered.connect(lambda: self.move_project(root_id, separate=False))
+            else:
+                shard_action = QAction("Move Project to Its Own File", self)
+                shard_action.triggered.connect(lambda: self.move_project(root_id, separate=True))
+            menu.addAction(shard_action)
         
         # Show menu at cursor position
         menu.exec(self.task_table.viewport().mapToGlobal(position))
 
+    def move_project(self, root_id, separate):
+        """Moves a top-level project into a shard file of its own (``separate``) or back into the main file."""
+        def on_moved(_):
+            self.runner.submit(self.task_manager.get_shards,
+                               on_done=lambda shards: setattr(self, 'shard_roots', set(shards)))
+            self.reminders.reload()
+            self.load_tasks()
+            self.statusBar().showMessage("Project moved to its own file" if separate
+                                         else "Project moved back to the main file", 5000)
+
+        move = self.task_manager.split_project if separate else self.task_manager.merge_project
+        # ATTACH 不能在批量事务中执行：在写线程上单独执行，排在已排队的编辑之后；工作线程不等待
+        self.runner.watch(self.writes.submit_alone(move, root_id), on_done=on_moved, on_error=self.show_error)
+
     def delete_selected_tasks(self):
         """Delete all selected tasks without confirmation."""
         selected_rows = self.task_table.selectionModel().selectedRows()
@@ -813,15 +1301,19 @@ class TaskManagerApp(QMainWindow):
         task_ids = [self.flat_tasks[row.row()]['id'] for row in selected_rows if row.row() < len(self.flat_tasks)]
         
         if task_ids:
-            # Delete tasks
-            for task_id in task_ids:
-                self.task_manager.delete_task(task_id)
-            
-            # Refresh the task list
-            self.load_tasks()
+            def on_deleted(success):
+                if not success:
+                    QMessageBox.warning(self, "错误", "删除任务失败！")
+                    return
+                # Refresh the task list
+                self.load_tasks()
+                
+                # Show success message
+                QMessageBox.information(self, "成功", f"已删除 {len(task_ids)} 个任务！")
             
-            # Show success message
-            QMessageBox.information(self, "成功", f"已删除 {len(task_ids)} 个任务！")
+            # Delete tasks (with their subtrees) in one statement
+            self.runner.watch(self.writes.submit(self.task_manager.delete_tasks, task_ids),
+                              on_done=on_deleted, on_error=self.show_error)
 
     def update_task_display(self):
         """更新任务显示，包含详细的日志记录"""
@@ -1004,6 +1496,22 @@ class TaskManagerApp(QMainWindow):
             logger.error(f"更新任务显示时出错: {e}", exc_info=True)
             raise
 
+    def remind_selected_tasks(self, when):
+        """Schedules a reminder at ``when`` for every selected task."""
+        for row in self.task_table.selectionModel().selectedRows():
+            if row.row() < len(self.flat_tasks):
+                self.reminders.add_reminder(self.flat_tasks[row.row()]['id'], when, on_error=self.show_error)
+        self.statusBar().showMessage(f"Reminder set for {when:%Y-%m-%d %H:%M}", 5000)
+
+    def show_reminder(self, reminder):
+        """Notifies about a due reminder without blocking the window."""
+        message = f'"{reminder["title"]}" is due ({reminder["reminder_time"]})'
+        if self.tray_icon:
+            self.tray_icon.show()
+            self.tray_icon.showMessage("Task Reminder", message, QSystemTrayIcon.MessageIcon.Information)
+        self.statusBar().showMessage(message)
+        QApplication.alert(self)
+
     def _show_status_sync_notification(self, parent_task, new_status):
         """Shows a notification when child tasks are synced to a new status."""
         QMessageBox.information(self, 'Status Sync', f'Child tasks of "{parent_task["title"]}" have been synced to "{new_status}".')
@@ -0,0 +1,99 @@
+"""Starts storage maintenance on a background thread once the app has been idle for a while."""
+import logging
+import time
+
+from PyQt6.QtCore import QEvent, QObject, QTimer, pyqtSignal
+from PyQt6.QtWidgets import QApplication
+
+from db import maintenance
+
+logger = logging.getLogger(__name__)
+
+# 多久没有用户输入、也没有待处理的后台工作算作空闲，以及检查间隔
+IDLE_MS = 2 * 60 * 1000
+CHECK_MS = 30 * 1000
+
+# 自上次 ANALYZE 以来累计的变更数超过它才再次 ANALYZE
+ANALYZE_AFTER_CHANGES = 1000
+
+USER_EVENTS = frozenset({
+    QEvent.Type.KeyPress,
+    QEvent.Type.MouseButtonPress,
+    QEvent.Type.MouseMove,
+    QEvent.Type.Wheel,
+})
+
+
+class MaintenanceScheduler(QObject):
+    """Runs ``TaskManager.run_maintenance`` when nothing has happened for IDLE_MS.
+
+    The run goes through ``runner``, a TaskRunner with its own thread, so the
+    event loop only checks a timestamp; ``runner`` and every runner in
+    ``watched`` must have no pending work. Each run stops after ``budget``
+    seconds. Another run starts on a later idle check if the database has
+    changed since, or if the last run ran out of time with pages left to free.
+    """
+
+    finished = pyqtSignal(dict)
+
+    def __init__(self, task_manager, runner, watched=(), budget=maintenance.BUDGET, parent=None):
+        super().__init__(parent)
+        self.task_manager = task_manager
+        self.runner = runner
+        self.watched = tuple(watched)
+        self.budget = budget
+        self._last_input = time.monotonic()
+        self._running = False
+        self._done_cursor = None      # 上次维护完整结束时的变更游标
+        self._analyzed_cursor = None  # 上次 ANALYZE 时的变更游标
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self._on_timeout)
+
+    def start(self):
+        # 监听整个应用的输入事件，任意窗口上的操作都会推迟维护
+        QApplication.instance().installEventFilter(self)
+        self._timer.start(CHECK_MS)
+
+    def stop(self):
+        self._timer.stop()
+        app = QApplication.instance()
+        if app is not None:
+            app.removeEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        if event.type() in USER_EVENTS:
+            self._last_input = time.monotonic()
+        return False
+
+    def is_idle(self):
+        if self._running or any(runner.busy for runner in (self.runner,) + self.watched):
+            return False
+        return (time.monotonic() - self._last_input) * 1000 >= IDLE_MS
+
+    def _on_timeout(self):
+        if not self.is_idle():
+            return
+        self._running = True
+
+        def on_error(message):
+            self._running = False
+            logger.error(f"存储维护失败: {message}")
+
+        def on_cursor(cursor):
+            if cursor == self._done_cursor:
+                self._running = False
+                return
+            analyze = self._analyzed_cursor is None or cursor - self._analyzed_cursor >= ANALYZE_AFTER_CHANGES
+
+            def on_done(result):
+                self._running = False
+                if result['analyzed']:
+                    self._analyzed_cursor = cursor
+                # 预算用完时还有页可回收：不记为完成，下次空闲继续
+                if not result['reclaimable_pages']:
+                    self._done_cursor = cursor
+                logger.debug(f"存储维护完成: {result}")
+                self.finished.emit(result)
+            self.runner.submit(self.task_manager.run_maintenance, self.budget, analyze,
+                               on_done=on_done, on_error=on_error)
+        self.runner.submit(self.task_manager.get_change_cursor, on_done=on_cursor, on_error=on_error)
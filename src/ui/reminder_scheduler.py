@@ -0,0 +1,99 @@
+"""Fires task reminders on the GUI thread with a single QTimer."""
+import logging
+from datetime import datetime
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from db import database
+from logic.reminders import ReminderQueue
+
+logger = logging.getLogger(__name__)
+
+# 定时器最长间隔；到点后重新计算，系统休眠或改时钟也不会错过太久
+MAX_TIMER_MS = 60 * 60 * 1000
+
+
+class ReminderScheduler(QObject):
+    """Keeps the next-due reminders in a ReminderQueue and arms one timer for the earliest.
+
+    Database access goes through the window's TaskRunner; ``reminder_due`` is
+    emitted with the dict returned by ``TaskManager.fire_reminders``.
+    """
+
+    reminder_due = pyqtSignal(dict)
+
+    def __init__(self, task_manager, runner, parent=None):
+        super().__init__(parent)
+        self.task_manager = task_manager
+        self.runner = runner
+        self.queue = ReminderQueue()
+        self._refilling = False
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._on_timeout)
+
+    def start(self):
+        """Loads the first page of pending reminders and arms the timer."""
+        self._refill()
+
+    def stop(self):
+        self._timer.stop()
+
+    def reload(self):
+        """Drops the in-memory queue and loads it again, e.g. after a restore."""
+        self.queue = ReminderQueue()
+        self._refilling = False
+        self._refill()
+
+    def add_reminder(self, task_id, reminder_time, on_error=None):
+        """Stores a reminder and re-arms the timer if it is now the earliest."""
+        reminder_time = database.format_reminder_time(reminder_time)
+
+        def on_added(reminder_id):
+            self.queue.add(reminder_id, task_id, reminder_time)
+            self._arm()
+        self.runner.submit(self.task_manager.add_reminder, task_id, reminder_time,
+                           on_done=on_added, on_error=on_error)
+
+    def remove_reminder(self, reminder_id, on_error=None):
+        self.queue.discard(reminder_id)
+        self._arm()
+        self.runner.submit(self.task_manager.delete_reminder, reminder_id, on_error=on_error)
+
+    def _refill(self):
+        if self._refilling:
+            return
+        self._refilling = True
+
+        def on_rows(rows):
+            self._refilling = False
+            self.queue.load(rows)
+            logger.debug(f"已载入 {len(rows)} 条待触发提醒")
+            self._arm()
+
+        def on_error(message):
+            self._refilling = False
+            logger.error(f"载入提醒失败: {message}")
+
+        self.runner.submit(self.task_manager.get_pending_reminders, self.queue.horizon, self.queue.window,
+                           on_done=on_rows, on_error=on_error)
+
+    def _arm(self):
+        next_time = self.queue.next_time()
+        if next_time is None:
+            self._timer.stop()
+            if self.queue.needs_refill:
+                self._refill()
+            return
+        delay = datetime.strptime(next_time, database.REMINDER_TIME_FORMAT) - datetime.now()
+        self._timer.start(int(min(max(delay.total_seconds() * 1000, 0), MAX_TIMER_MS)))
+
+    def _on_timeout(self):
+        due = self.queue.pop_due(database.format_reminder_time(datetime.now()))
+        if due:
+            def on_fired(reminders):
+                for reminder in reminders:
+                    self.reminder_due.emit(reminder)
+            self.runner.submit(self.task_manager.fire_reminders, [reminder[0] for reminder in due],
+                               on_done=on_fired)
+        self._arm()
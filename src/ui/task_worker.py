@@ -0,0 +1,137 @@
+"""Background execution of TaskManager calls for the Qt window."""
+import logging
+import itertools
+
+from PyQt6.QtCore import QObject, QThread, pyqtSignal, pyqtSlot
+
+logger = logging.getLogger(__name__)
+
+
+class TaskWorker(QObject):
+    """Lives in a QThread and runs database calls on that thread's connection."""
+
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+
+    @pyqtSlot(int, object, object, object)
+    def run(self, request_id, func, args, kwargs):
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"后台任务执行失败: {e}", exc_info=True)
+            self.failed.emit(request_id, str(e))
+        else:
+            self.finished.emit(request_id, result)
+
+    @pyqtSlot()
+    def stop(self):
+        # 与请求走同一个队列：排在它之前的请求都已执行完
+        self.thread().quit()
+
+
+class TaskRunner(QObject):
+    """Submits work to a single TaskWorker thread and routes results back to the GUI thread.
+
+    Requests run one at a time in submission order, so a write followed by a
+    reload always sees the write.
+    """
+
+    busy_changed = pyqtSignal(bool)
+    _requested = pyqtSignal(int, object, object, object)
+    _resolved = pyqtSignal(int, object)
+    _stopping = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._ids = itertools.count(1)
+        self._callbacks = {}
+        self._futures = {}  # watch() 登记的、尚未完成的 Future
+
+        self._thread = QThread()
+        self._worker = TaskWorker()
+        self._worker.moveToThread(self._thread)
+        self._requested.connect(self._worker.run)
+        self._worker.finished.connect(self._on_finished)
+        self._worker.failed.connect(self._on_failed)
+        self._resolved.connect(self._on_resolved)
+        self._stopping.connect(self._worker.stop)
+        self._thread.start()
+
+    @property
+    def busy(self):
+        return bool(self._callbacks)
+
+    def submit(self, func, *args, on_done=None, on_error=None, **kwargs):
+        """Runs ``func(*args, **kwargs)`` on the worker thread.
+
+        ``on_done(result)`` / ``on_error(message)`` are called on the GUI thread.
+        """
+        request_id = next(self._ids)
+        was_busy = self.busy
+        self._callbacks[request_id] = (on_done, on_error)
+        if not was_busy:
+            self.busy_changed.emit(True)
+        self._requested.emit(request_id, func, args, kwargs)
+        return request_id
+
+    def watch(self, future, on_done=None, on_error=None):
+        """Routes a concurrent.futures.Future (e.g. from WriteQueue) to GUI-thread callbacks.
+
+        Counts as pending work for ``busy_changed`` until the future resolves.
+        """
+        request_id = next(self._ids)
+        was_busy = self.busy
+        self._callbacks[request_id] = (on_done, on_error)
+        self._futures[request_id] = future
+        if not was_busy:
+            self.busy_changed.emit(True)
+        # 回调在写线程上执行，经信号排队回到界面线程
+        future.add_done_callback(lambda done: self._resolved.emit(request_id, done))
+        return request_id
+
+    def _pop(self, request_id):
+        callbacks = self._callbacks.pop(request_id, (None, None))
+        if not self._callbacks:
+            self.busy_changed.emit(False)
+        return callbacks
+
+    @pyqtSlot(int, object)
+    def _on_finished(self, request_id, result):
+        on_done, _ = self._pop(request_id)
+        if on_done:
+            on_done(result)
+
+    @pyqtSlot(int, str)
+    def _on_failed(self, request_id, message):
+        _, on_error = self._pop(request_id)
+        if on_error:
+            on_error(message)
+
+    @pyqtSlot(int, object)
+    def _on_resolved(self, request_id, future):
+        self._futures.pop(request_id, None)
+        if future.cancelled():
+            self._on_failed(request_id, "Cancelled")
+            return
+        error = future.exception()
+        if error is None:
+            self._on_finished(request_id, future.result())
+        else:
+            self._on_failed(request_id, str(error))
+
+    def shutdown(self):
+        """Runs the requests already submitted, then stops the worker thread.
+
+        Watched futures that have not started yet are cancelled, so whoever
+        else waits on them is released, and their callbacks are dropped. A
+        future that is already running completes on its own thread and is
+        reported as usual.
+        """
+        cancelled = [request_id for request_id, future in self._futures.items() if future.cancel()]
+        for request_id in cancelled:
+            del self._futures[request_id]
+            del self._callbacks[request_id]
+        if cancelled and not self._callbacks:
+            self.busy_changed.emit(False)
+        self._stopping.emit()
+        self._thread.wait()
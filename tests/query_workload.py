@@ -0,0 +1,150 @@
+"""A workload that drives every TaskManager call the app makes against the configured database.
+
+``db.query_audit.record`` traces the SQL it runs, so the query-plan audit
+covers what the app actually executes rather than a hand-kept list. Add a
+call here when adding one to TaskManager. The check_* and rebuild_*
+maintenance tools are left out: they compare or recompute whole derived
+tables and scan by design.
+
+The workload adds tasks, splits a project into a shard, exports,
+imports and finally clears everything, so run it on a scratch database.
+
+Run ``python tests/query_workload.py [--apply]`` to record it on a copy of
+the configured database and print the audit report (with that database's
+planner statistics); ``--apply`` creates the suggested indexes in the
+configured database itself.
+"""
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from db import database, query_audit, shards
+from logic.task_manager import TaskManager
+
+
+def run(tmp_dir, task_manager=None):
+    """Runs the workload; ``tmp_dir`` receives the export files."""
+    tm = task_manager or TaskManager()
+    today = date.today()
+
+    # 写入：单个、批量（带子树）、依赖
+    root = tm.add_task("workload root", due_date=str(today))
+    first, second = tm.add_tasks([
+        {'title': 'first', 'priority': 'high', 'due_date': str(today - timedelta(days=2))},
+        {'title': 'second', 'children': [{'title': 'leaf', 'due_date': str(today + timedelta(days=3))}]},
+    ], parent_id=root)[:2]
+    leaf = tm.get_children(second)[0]['id']
+    other = tm.add_task("workload other", depends_on=first, parent_id=root)
+    tm.add_dependency(second, first)
+    tm.add_dependency(leaf, first)
+    tm.remove_dependency(leaf, first)
+
+    # 读取：整棵树、分页与过滤、层级、到期
+    tm.invalidate_cache()
+    tm.get_tasks()
+    page = tm.get_tasks_page(limit=2)
+    tm.get_tasks_page(after_key=page['next_key'], limit=2)
+    for column, value in (('status', 'not_started'), ('priority', 'high'), ('parent_id', root)):
+        tm.get_tasks_page(limit=10, filters={column: value})
+    tm.get_tasks_page(limit=10, filters={'parent_id': root}, include_descendants=True)
+    tm.get_children(root, limit=1)
+    tm.get_children(root, after_key=first)
+    tm.get_root_tasks(limit=10)
+    tm.get_due_between(today - timedelta(days=7), today + timedelta(days=7), limit=10)
+    tm.get_overdue(limit=10)
+    tm.get_descendant_ids(root)
+    tm.get_descendant_ids(root, max_depth=1)
+    tm.get_ancestors(leaf)
+    tm.get_depth(leaf)
+    tm.search("leaf")
+    tm.search("fir")
+    for scope in ('roots', 'leaves', 'all'):
+        tm.get_stats(scope)
+    tm.calculate_progress()
+
+    # 依赖图与调度
+    tm.get_dependencies(second)
+    tm.get_dependents(first)
+    tm.get_blocked_ids()
+    tm.get_topological_order()
+    tm.get_schedule(today=today)
+    tm.get_schedule([first, second], today=today)
+    tm.get_critical_path(today=today)
+    tm.get_earliest_finish(second, today=today)
+
+    # 提醒
+    reminder = tm.add_reminder(first, (datetime.now() + timedelta(hours=1)).isoformat(timespec='seconds'))
+    tm.add_reminder(second, datetime.now().isoformat(timespec='seconds'))
+    pending = tm.get_pending_reminders(limit=1)
+    tm.get_pending_reminders(after=(pending[0][2], pending[0][0]))
+    tm.fire_reminders([pending[0][0]])
+    tm.get_reminders(after_id=tm.get_reminders(limit=1)[0][0])
+    tm.delete_reminder(reminder)
+
+    # 修改：移动、状态、变更日志
+    tm.move_task(other, second)
+    tm.move_task(other, root)
+    cursor = tm.get_change_cursor()
+    tm.update_task_status(second, 'in_progress')
+    tm.update_tasks_status([first, other], 'completed')
+    tm.get_changes_since(cursor)
+    tm.compact_changes(keep=1)
+
+    # 分片：拆分后的跨文件读写，再合并回来
+    tm.split_project(root)
+    tm.get_shards()
+    tm.invalidate_cache()
+    tm.get_tasks()
+    tm.get_tasks_page(limit=10, include_descendants=True)
+    tm.get_children(root)
+    tm.get_due_between(today - timedelta(days=7), today + timedelta(days=7))
+    tm.get_overdue()
+    tm.search("leaf")
+    tm.get_stats('all')
+    tm.update_task_status(leaf, 'completed')
+    tm.add_task("sharded child", parent_id=second)
+    tm.add_reminder(leaf, datetime.now().isoformat(timespec='seconds'))
+    tm.get_pending_reminders()
+    tm.get_topological_order()
+    tm.export_tasks(os.path.join(tmp_dir, 'workload.jsonl'))
+    tm.merge_project(root)
+
+    # 导出、导入、删除
+    for format in ('jsonl', 'csv'):
+        path = os.path.join(tmp_dir, f'workload.{format}')
+        tm.export_tasks(path)
+        tm.import_tasks(path)
+    tm.delete_task(leaf)
+    tm.delete_tasks([first, other])
+    tm.cleanup_orphans()
+    tm.split_project(root)
+    tm.delete_task(root)
+    tm.clear_tasks()
+    shards.close_all()
+
+
+if __name__ == '__main__':
+    database.create_table()
+    original = database.DATABASE_PATH
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        # 在副本上跑工作负载：计划基于真实数据的统计信息，又不改动原库
+        copy = os.path.join(tmp_dir, 'audit.db')
+        with sqlite3.connect(copy) as dest:
+            database.get_connection().backup(dest)
+        database.configure(path=copy)
+        with query_audit.record() as statements:
+            run(tmp_dir)
+        text = query_audit.report(database.get_connection(), statements)
+        suggestions = query_audit.advise(database.get_connection(), statements)
+    finally:
+        database.configure(path=original)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    print(text)
+    if '--apply' in sys.argv:
+        query_audit.apply_suggestions(suggestions)
@@ -0,0 +1,133 @@
+import os
+import sys
+import json
+import shutil
+import asyncio
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from db import database
+from api.server import ApiServer
+
+
+def encode(method, path, body=None, close=False):
+    data = b'' if body is None else json.dumps(body).encode()
+    connection = "Connection: close\r\n" if close else ""
+    return f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n{connection}Content-Length: {len(data)}\r\n\r\n".encode() + data
+
+
+async def read_response(reader):
+    status = await reader.readline()
+    headers = {}
+    while (line := await reader.readline()) != b'\r\n':
+        name, _, value = line.decode().partition(':')
+        headers[name.lower()] = value.strip()
+    return int(status.split()[1]), json.loads(await reader.readexactly(int(headers['content-length'])))
+
+
+class TestApiServer(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.original_path = database.DATABASE_PATH
+        database.configure(path=os.path.join(self.tmp_dir, 'tasks.db'))
+        database.create_table()
+        self.server = await ApiServer().start(port=0)
+        self.reader, self.writer = await asyncio.open_connection(*self.server.address[:2])
+
+    async def asyncTearDown(self):
+        self.writer.close()
+        await self.server.close()
+        database.configure(path=self.original_path)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    async def request(self, method, path, body=None):
+        self.writer.write(encode(method, path, body))
+        return await read_response(self.reader)
+
+    async def test_crud_round_trip(self):
+        status, body = await self.request('POST', '/tasks', {'title': 'alpha', 'priority': 'high'})
+        self.assertEqual(status, 201)
+        alpha = body['id']
+        status, body = await self.request('POST', '/tasks/bulk', {'tasks': [{'title': 'beta', 'children': [{'title': 'gamma'}]}],
+                                                                  'parent_id': alpha})
+        beta, gamma = body['ids']
+
+        self.assertEqual((await self.request('PUT', f'/tasks/{beta}/status', {'status': 'completed'}))[1],
+                         {'updated': [beta, gamma]})
+        status, page = await self.request('GET', f'/tasks/{alpha}/children')
+        self.assertEqual([task['id'] for task in page['tasks']], [beta])
+        self.assertIsNone(page['next_key'])
+        self.assertEqual([task['title'] for task in (await self.request('GET', '/tasks/search?q=gamma'))[1]], ['gamma'])
+        self.assertEqual((await self.request('GET', '/stats?scope=all'))[1]['completed'], 2)
+        status, page = await self.request('GET', f'/tasks/page?parent_id={alpha}&descendants=1')
+        self.assertEqual(page['tasks'][0]['children'][0]['id'], gamma)
+
+        self.assertEqual(await self.request('DELETE', f'/tasks/{beta}'), (200, {'deleted': True}))
+        status, tree = await self.request('GET', '/tasks')
+        self.assertEqual([(task['id'], task.get('children', [])) for task in tree], [(alpha, [])])
+
+    async def test_pipelined_requests_answer_in_order_and_share_commits(self):
+        count = 200
+        self.writer.write(b''.join(encode('POST', '/tasks', {'title': f'task {n}'}) for n in range(count))
+                          + encode('GET', '/stats?scope=all')
+                          + encode('POST', '/tasks/status', {'ids': [1, 2], 'status': 'in_progress'})
+                          + encode('GET', '/tasks/roots?limit=2', close=True))
+        responses = [await read_response(self.reader) for _ in range(count + 3)]
+        self.assertEqual([body['id'] for _, body in responses[:count]], list(range(1, count + 1)))
+        # 读操作看到它之前的全部写入
+        self.assertEqual(responses[count][1]['total'], count)
+        self.assertEqual(responses[count + 2][1]['next_key'], 2)
+        self.assertEqual([task['status'] for task in responses[count + 2][1]['tasks']], ['in_progress'] * 2)
+        self.assertLess(self.server.writes.commits, count)
+        self.assertEqual(await self.reader.read(), b'')
+
+    async def test_batch_runs_items_in_order(self):
+        status, body = await self.request('POST', '/batch', {'requests': [
+            {'method': 'POST', 'path': '/tasks', 'body': {'title': 'first'}},
+            {'method': 'POST', 'path': '/tasks', 'body': {'title': 'second', 'parent_id': 1}},
+            {'method': 'GET', 'path': '/tasks/1/children'},
+            {'method': 'POST', 'path': '/tasks', 'body': {'title': ''}},
+            {'method': 'GET', 'path': '/missing'},
+            {'method': 'GET', 'path': '/tasks'},
+        ]})
+        self.assertEqual(status, 200)
+        responses = body['responses']
+        self.assertEqual([response['status'] for response in responses], [201, 201, 200, 400, 404, 200])
+        self.assertEqual([task['title'] for task in responses[2]['body']['tasks']], ['second'])
+        self.assertEqual(responses[5]['body'][0]['children'][0]['title'], 'second')
+
+        status, body = await self.request('POST', '/batch', {'requests': [{'method': 'POST', 'path': '/batch'}]})
+        self.assertEqual(status, 400)
+
+    async def test_errors(self):
+        self.assertEqual((await self.request('GET', '/nowhere'))[0], 404)
+        self.assertEqual((await self.request('PATCH', '/tasks'))[0], 405)
+        self.assertEqual((await self.request('POST', '/tasks', {'title': 'x', 'owner': 'me'}))[0], 400)
+        self.assertEqual((await self.request('POST', '/tasks', {'title': 'orphan', 'parent_id': 999}))[0], 400)
+        self.assertEqual((await self.request('GET', '/tasks/roots?limit=0'))[0], 400)
+        self.writer.write(b"POST /tasks HTTP/1.1\r\nContent-Length: 3\r\n\r\n{x}")
+        self.assertEqual((await read_response(self.reader))[0], 400)
+        # 连接仍可用；报文格式错误时服务端应答后关闭连接
+        self.assertEqual((await self.request('GET', '/stats'))[0], 200)
+        self.writer.write(b"garbage\r\n\r\n")
+        self.assertEqual((await read_response(self.reader))[0], 400)
+        self.assertEqual(await self.reader.read(), b'')
+
+    @unittest.skipUnless(hasattr(asyncio, 'start_unix_server'), "Unix sockets not available")
+    async def test_unix_socket(self):
+        path = os.path.join(self.tmp_dir, 'api.sock')
+        server = await ApiServer(self.server.task_manager, self.server.writes).start(path=path)
+        try:
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.write(encode('POST', '/tasks', {'title': 'over the socket'}, close=True))
+            self.assertEqual(await read_response(reader), (201, {'id': 1}))
+            writer.close()
+        finally:
+            await server.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+
+# 与 main.py 一致，把 src 加入路径，使 logic 与 db 共用同一个 database 模块
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from db import database, migrations
+
+
+class TestConnectionManager(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.original_path = database.DATABASE_PATH
+        database.configure(path=os.path.join(self.tmp_dir, 'tasks.db'))
+        database.create_table()
+
+    def tearDown(self):
+        database.configure(path=self.original_path)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_connection_is_reused_per_thread(self):
+        conn = database.get_connection()
+        self.assertIs(conn, database.get_connection())
+
+        other = []
+        thread = threading.Thread(target=lambda: other.append(database.get_connection()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(conn, other[0])
+
+    def test_pragmas_applied(self):
+        conn = database.get_connection()
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+        self.assertEqual(conn.execute("PRAGMA busy_timeout").fetchone()[0], 5000)
+        self.assertEqual(conn.execute("PRAGMA temp_store").fetchone()[0], 2)
+
+    def test_custom_pragmas(self):
+        database.configure(pragmas={'synchronous': 'FULL'})
+        self.assertEqual(database.fetch_all("PRAGMA synchronous")[0][0], 2)
+
+    def test_transaction_rolls_back_on_error(self):
+        with self.assertRaises(ValueError):
+            with database.transaction() as conn:
+                conn.execute("INSERT INTO tasks (title) VALUES ('rolled back')")
+                raise ValueError()
+        self.assertEqual(database.fetch_all("SELECT COUNT(*) FROM tasks")[0][0], 0)
+
+        task_id = database.insert_task("Kept", "", "medium", "not_started", None, None)
+        self.assertEqual(database.fetch_all("SELECT title FROM tasks WHERE id = ?", (task_id,)), [("Kept",)])
+
+
+class TestMigrations(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.original_path = database.DATABASE_PATH
+        database.configure(path=os.path.join(self.tmp_dir, 'tasks.db'))
+
+    def tearDown(self):
+        database.configure(path=self.original_path)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_fresh_database_reaches_latest_version(self):
+        self.assertEqual(database.create_table(), migrations.LATEST_VERSION)
+        tables = {row[0] for row in database.fetch_all("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.assertTrue({'tasks', 'reminders'} <= tables)
+
+        task_id = database.insert_task("Task", "", "medium", "not_started", None, None)
+        database.add_reminder(task_id, "2025-02-21 18:00")
+        self.assertEqual(len(database.get_reminders()), 1)
+
+    def test_upgrade_legacy_database(self):
+        # 旧版本创建的数据库：有 tasks 表，user_version 为 0，且存在孤立任务
+        conn = database.create_connection()
+        conn.execute("PRAGMA foreign_keys = OFF")
+        for statement in migrations.MIGRATIONS[0][2]:
+            conn.execute(statement)
+        conn.execute("INSERT INTO tasks (id, title) VALUES (1, 'Root')")
+        conn.execute("INSERT INTO tasks (id, title, parent_id) VALUES (2, 'Orphan', 99)")
+        conn.execute("INSERT INTO tasks (id, title, parent_id) VALUES (3, 'Orphan child', 2)")
+        conn.close()
+
+        self.assertEqual(database.create_table(), migrations.LATEST_VERSION)
+        self.assertEqual(database.fetch_all("SELECT id FROM tasks"), [(1,)])
+
+    def test_failed_migration_rolls_back(self):
+        def broken(conn):
+            conn.execute("CREATE TABLE half_done (id INTEGER)")
+            raise RuntimeError("boom")
+
+        original = migrations.MIGRATIONS
+        migrations.MIGRATIONS = original + [(migrations.LATEST_VERSION + 1, "broken", [broken])]
+        try:
+            with self.assertRaises(RuntimeError):
+                migrations.migrate(database.get_connection(), migrations.LATEST_VERSION + 1)
+        finally:
+            migrations.MIGRATIONS = original
+        self.assertEqual(migrations.get_version(database.get_connection()), migrations.LATEST_VERSION)
+        self.assertEqual(database.fetch_all("SELECT name FROM sqlite_master WHERE name = 'half_done'"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,1300 @@
+import os
+import sys
+import json
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from db import backup, check, database, maintenance, rollups, shards, stats
+from logic.task_manager import TaskManager
+from logic.reminders import ReminderQueue
+from logic.dependency_graph import Schedule, topological_order
+from logic.write_queue import WriteQueue
+from db.dependencies import DependencyCycleError
+
+
+class TaskManagerTestCase(unittest.TestCase):
+    """Runs each test against a fresh database file."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.original_path = database.DATABASE_PATH
+        database.configure(path=os.path.join(self.tmp_dir, 'tasks.db'))
+        database.create_table()
+        self.tm = TaskManager()
+
+    def tearDown(self):
+        database.configure(path=self.original_path)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+class TestBulkInsert(TaskManagerTestCase):
+
+    def test_add_tasks_resolves_parents(self):
+        ids = self.tm.add_tasks([
+            {'title': 'Plan', 'children': [
+                {'title': 'Step 1', 'children': [{'title': 'Step 1.1'}]},
+                {'title': 'Step 2'},
+            ]},
+            {'title': 'Other'},
+        ])
+        self.assertEqual(len(ids), 5)
+        rows = dict((row[0], row[1:]) for row in database.fetch_all("SELECT id, title, parent_id FROM tasks"))
+        plan, step1, step11, step2, other = ids
+        self.assertEqual(rows[plan], ('Plan', None))
+        self.assertEqual(rows[step1], ('Step 1', plan))
+        self.assertEqual(rows[step11], ('Step 1.1', step1))
+        self.assertEqual(rows[step2], ('Step 2', plan))
+        self.assertEqual(rows[other], ('Other', None))
+
+    def test_add_tasks_is_atomic(self):
+        with self.assertRaises(Exception):
+            self.tm.add_tasks([{'title': 'Parent', 'children': [{'title': None}]}])
+        self.assertEqual(database.fetch_all("SELECT COUNT(*) FROM tasks")[0][0], 0)
+
+    def test_parse_batch_tasks(self):
+        self.assertTrue(self.tm.parse_batch_tasks("Trip\nBook hotel\n\nPack"))
+        tasks = self.tm.get_tasks()
+        self.assertEqual(len(tasks), 1)
+        self.assertEqual([c['title'] for c in tasks[0]['children']], ['Book hotel', 'Pack'])
+
+
+class TestStatusPropagation(TaskManagerTestCase):
+
+    def test_update_reaches_every_descendant(self):
+        ids = self.tm.add_tasks([
+            {'title': 'A', 'children': [
+                {'title': 'B', 'children': [{'title': 'C', 'children': [{'title': 'D'}]}]},
+            ]},
+            {'title': 'Untouched'},
+        ])
+        affected = self.tm.update_task_status(ids[1], 'completed')
+        self.assertEqual(sorted(affected), sorted(ids[1:4]))
+        statuses = dict(database.fetch_all("SELECT id, status FROM tasks"))
+        self.assertEqual(statuses[ids[0]], 'not_started')
+        self.assertTrue(all(statuses[i] == 'completed' for i in ids[1:4]))
+        self.assertEqual(statuses[ids[4]], 'not_started')
+
+    def test_update_missing_task(self):
+        self.assertEqual(self.tm.update_task_status(12345, 'completed'), [])
+
+
+class TestCascadingDelete(TaskManagerTestCase):
+
+    def _tree(self):
+        return self.tm.add_tasks([
+            {'title': 'A', 'children': [{'title': 'B', 'children': [{'title': 'C'}]}]},
+            {'title': 'D', 'children': [{'title': 'E'}]},
+            {'title': 'F'},
+        ])
+
+    def _remaining(self):
+        return {row[0] for row in database.fetch_all("SELECT id FROM tasks")}
+
+    def test_delete_task_removes_grandchildren(self):
+        a, b, c, d, e, f = self._tree()
+        self.tm.delete_task(a)
+        self.assertEqual(self._remaining(), {d, e, f})
+
+    def test_delete_tasks_multiple_roots(self):
+        a, b, c, d, e, f = self._tree()
+        self.assertTrue(self.tm.delete_tasks([b, d]))
+        self.assertEqual(self._remaining(), {a, f})
+
+    def test_foreign_keys_enforced(self):
+        self.assertEqual(database.fetch_all("PRAGMA foreign_keys")[0][0], 1)
+        with self.assertRaises(Exception):
+            self.tm.add_task("Dangling", parent_id=999)
+
+    def test_cleanup_orphans(self):
+        a, b, c, d, e, f = self._tree()
+        # 模拟旧版本只删除一层留下的孤立任务
+        conn = database.create_connection()
+        conn.execute("PRAGMA foreign_keys = OFF")
+        conn.execute("DELETE FROM tasks WHERE id = ?", (a,))
+        conn.close()
+
+        self.assertEqual(self.tm.cleanup_orphans(), 2)
+        self.assertEqual(self._remaining(), {d, e, f})
+
+
+def _shape(tasks):
+    return [(task['id'], task['title'], task['status'], _shape(task.get('children', []))) for task in tasks]
+
+
+class TestTaskCache(TaskManagerTestCase):
+
+    def assertCacheMatchesDatabase(self):
+        self.assertEqual(_shape(self.tm.get_tasks()), _shape(TaskManager().get_tasks()))
+
+    def test_get_tasks_hits_cache(self):
+        self.tm.add_task("A")
+        first = self.tm.get_tasks()
+        self.assertIs(self.tm.get_tasks(), first)
+        self.assertEqual(self.tm.cache_stats()['misses'], 1)
+        self.assertEqual(self.tm.cache_stats()['hits'], 1)
+
+    def test_mutations_update_cache_in_place(self):
+        self.tm.get_tasks()
+        a, b, c, d = self.tm.add_tasks([
+            {'title': 'A', 'children': [{'title': 'B', 'children': [{'title': 'C'}]}]},
+            {'title': 'D'},
+        ])
+        self.tm.add_task("E", parent_id=d)
+        self.assertCacheMatchesDatabase()
+
+        self.tm.update_task_status(a, 'completed')
+        self.assertCacheMatchesDatabase()
+
+        self.tm.delete_task(b)
+        self.assertCacheMatchesDatabase()
+
+        self.tm.delete_tasks([a, d])
+        self.assertCacheMatchesDatabase()
+        self.assertEqual(self.tm.cache_stats()['misses'], 1)
+        self.assertEqual(self.tm.cache_stats()['size'], 0)
+
+    def test_json_snapshot_during_concurrent_writes(self):
+        parent = self.tm.add_task("parent")
+        self.tm.add_tasks([{'title': f'child {n}'} for n in range(200)], parent_id=parent)
+        stop = threading.Event()
+
+        def write():
+            while not stop.is_set():
+                ids = self.tm.add_tasks([{'title': 'churn'} for _ in range(20)], parent_id=parent)
+                self.tm.delete_tasks(ids)
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            for _ in range(50):
+                children = json.loads(self.tm.get_tasks_json())[0]['children']
+                # 每批写入要么全部可见要么完全不可见
+                self.assertIn(len(children) - 200, (0, 20))
+        finally:
+            stop.set()
+            writer.join()
+
+    def test_invalidate_reloads(self):
+        self.tm.get_tasks()
+        database.insert_task("Written elsewhere", "", "medium", "not_started", None, None)
+        self.assertEqual(self.tm.get_tasks(), [])
+        self.tm.invalidate_cache()
+        self.assertEqual(len(self.tm.get_tasks()), 1)
+        self.assertEqual(self.tm.cache_stats()['misses'], 2)
+
+
+class TestChangeLog(TaskManagerTestCase):
+
+    def test_changes_since_cursor(self):
+        a = self.tm.add_task("A")
+        cursor = self.tm.get_change_cursor()
+
+        b = self.tm.add_task("B", parent_id=a)
+        self.tm.update_task_status(a, 'completed')
+        self.tm.delete_task(b)
+
+        result = self.tm.get_changes_since(cursor)
+        self.assertFalse(result['reset'])
+        changes = {change['id']: change for change in result['changes']}
+        self.assertEqual(changes[a]['op'], 'update')
+        self.assertEqual(changes[a]['task']['status'], 'completed')
+        self.assertEqual(changes[b]['op'], 'delete')
+        self.assertIsNone(changes[b]['task'])
+
+        self.assertEqual(self.tm.get_changes_since(result['cursor'])['changes'], [])
+
+    def test_compaction_forces_reset_for_stale_cursors(self):
+        self.tm.add_tasks([{'title': f'T{i}'} for i in range(10)])
+        self.assertEqual(self.tm.compact_changes(keep=3), 7)
+        self.assertTrue(self.tm.get_changes_since(0)['reset'])
+
+        result = self.tm.get_changes_since(7)
+        self.assertFalse(result['reset'])
+        self.assertEqual(len(result['changes']), 3)
+
+
+class TestSearch(TaskManagerTestCase):
+
+    def test_prefix_search_ranked(self):
+        report = self.tm.add_task("Quarterly report", "finance numbers")
+        review = self.tm.add_task("Review", "report draft for the quarterly meeting")
+        self.tm.add_task("Groceries", "milk")
+
+        results = self.tm.search("quart rep")
+        self.assertEqual([task['id'] for task in results], [report, review])
+        self.assertEqual(self.tm.search("groc")[0]['title'], "Groceries")
+        self.assertEqual(self.tm.search("   "), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        task_id = self.tm.add_task("Old title")
+        database.execute("UPDATE tasks SET title = 'Renamed' WHERE id = ?", (task_id,))
+        self.assertEqual(self.tm.search("old"), [])
+        self.assertEqual(len(self.tm.search("renamed")), 1)
+
+        self.tm.delete_task(task_id)
+        self.assertEqual(self.tm.search("renamed"), [])
+
+    def test_special_characters_are_quoted(self):
+        self.tm.add_task('Fix "AND" OR bug-42')
+        self.assertEqual(len(self.tm.search('bug-42 "and')), 1)
+
+
+class TestPagination(TaskManagerTestCase):
+
+    def test_pages_cover_all_rows_once(self):
+        ids = self.tm.add_tasks([{'title': f'T{i}'} for i in range(25)])
+        seen, key = [], None
+        while True:
+            page = self.tm.get_tasks_page(key, limit=10)
+            seen.extend(task['id'] for task in page['tasks'])
+            key = page['next_key']
+            if key is None:
+                break
+        self.assertEqual(seen, ids)
+
+    def test_filters_and_descendants(self):
+        a, a1, a11, b, c = self.tm.add_tasks([
+            {'title': 'A', 'children': [{'title': 'A1', 'children': [{'title': 'A11'}]}]},
+            {'title': 'B', 'status': 'completed'},
+            {'title': 'C'},
+        ])
+        page = self.tm.get_tasks_page(limit=2, filters={'parent_id': None}, include_descendants=True)
+        self.assertEqual([task['id'] for task in page['tasks']], [a, b])
+        self.assertEqual(page['tasks'][0]['children'][0]['children'][0]['id'], a11)
+        self.assertEqual(page['next_key'], b)
+
+        page = self.tm.get_tasks_page(filters={'status': 'completed'})
+        self.assertEqual([task['id'] for task in page['tasks']], [b])
+        self.assertIsNone(page['next_key'])
+
+        with self.assertRaises(ValueError):
+            self.tm.get_tasks_page(filters={'title': 'A'})
+
+
+class TestLazyChildren(TaskManagerTestCase):
+
+    def test_roots_and_children_with_counts(self):
+        a, a1, a11, a2, b = self.tm.add_tasks([
+            {'title': 'A', 'children': [{'title': 'A1', 'children': [{'title': 'A11'}]}, {'title': 'A2'}]},
+            {'title': 'B'},
+        ])
+        roots = self.tm.get_root_tasks()
+        self.assertEqual([(t['id'], t['child_count']) for t in roots], [(a, 2), (b, 0)])
+        self.assertNotIn('children', roots[0])
+
+        children = self.tm.get_children(a)
+        self.assertEqual([(t['id'], t['child_count']) for t in children], [(a1, 1), (a2, 0)])
+        self.assertEqual([t['id'] for t in self.tm.get_children(a, after_key=a1)], [a2])
+        self.assertEqual([t['id'] for t in self.tm.get_root_tasks(limit=1)], [a])
+
+
+class TestHierarchyIndex(TaskManagerTestCase):
+
+    def _tree(self):
+        return self.tm.add_tasks([
+            {'title': 'A', 'children': [{'title': 'B', 'children': [{'title': 'C'}]}]},
+            {'title': 'D'},
+        ])
+
+    def test_subtree_ancestors_depth(self):
+        a, b, c, d = self._tree()
+        self.assertEqual(sorted(self.tm.get_descendant_ids(a)), [b, c])
+        self.assertEqual(self.tm.get_descendant_ids(a, max_depth=1), [b])
+        self.assertEqual([t['id'] for t in self.tm.get_ancestors(c)], [a, b])
+        self.assertEqual(self.tm.get_depth(c), 2)
+        self.assertEqual(self.tm.get_depth(d), 0)
+
+    def test_move_subtree(self):
+        a, b, c, d = self._tree()
+        self.tm.move_task(b, d)
+        self.assertEqual([t['id'] for t in self.tm.get_ancestors(c)], [d, b])
+        self.assertEqual(self.tm.get_descendant_ids(a), [])
+        self.assertEqual(self.tm.check_hierarchy_index(), {'missing': 0, 'extra': 0})
+
+        with self.assertRaises(Exception):
+            self.tm.move_task(d, c)
+        self.assertEqual(self.tm.get_tasks()[1]['children'][0]['id'], b)
+
+    def test_check_and_rebuild(self):
+        a, b, c, d = self._tree()
+        self.tm.delete_task(b)
+        self.assertEqual(self.tm.check_hierarchy_index(), {'missing': 0, 'extra': 0})
+
+        database.execute("DELETE FROM task_closure WHERE descendant = ?", (a,))
+        self.assertEqual(self.tm.check_hierarchy_index()['missing'], 1)
+        self.assertEqual(self.tm.rebuild_hierarchy_index(), 2)
+        self.assertEqual(self.tm.check_hierarchy_index(), {'missing': 0, 'extra': 0})
+
+
+class TestProgressStats(TaskManagerTestCase):
+
+    def test_scopes(self):
+        a, a1, a2, b = self.tm.add_tasks([
+            {'title': 'A', 'children': [{'title': 'A1', 'status': 'completed'}, {'title': 'A2'}]},
+            {'title': 'B', 'status': 'completed'},
+        ])
+        self.assertEqual(self.tm.get_stats('roots')['total'], 2)
+        self.assertEqual(self.tm.get_stats('roots')['completed'], 1)
+        self.assertEqual(self.tm.get_stats('leaves')['total'], 3)
+        self.assertEqual(self.tm.get_stats('leaves')['completed'], 2)
+        self.assertEqual(self.tm.get_stats('all')['not_started'], 2)
+        self.assertEqual(self.tm.calculate_progress(), 50)
+
+        with self.assertRaises(ValueError):
+            self.tm.get_stats('parents')
+
+    def test_counters_stay_consistent_under_random_edits(self):
+        rng = random.Random(7)
+        ids = []
+        for _ in range(300):
+            action = rng.random()
+            if action < 0.45 or not ids:
+                parent = rng.choice(ids) if ids and rng.random() < 0.7 else None
+                ids.append(self.tm.add_task("T", status=rng.choice(stats.STATUSES), parent_id=parent))
+            elif action < 0.7:
+                self.tm.update_task_status(rng.choice(ids), rng.choice(stats.STATUSES))
+            elif action < 0.8:
+                task_id, parent = rng.choice(ids), rng.choice(ids + [None])
+                try:
+                    self.tm.move_task(task_id, parent)
+                except Exception:
+                    pass  # 移到自己的子树下会被拒绝
+            elif action < 0.88:
+                try:
+                    self.tm.add_dependency(rng.choice(ids), rng.choice(ids))
+                except DependencyCycleError:
+                    pass
+            else:
+                self.tm.delete_task(rng.choice(ids))
+                alive = {row[0] for row in database.fetch_all("SELECT id FROM tasks")}
+                ids = [task_id for task_id in ids if task_id in alive]
+        self.assertEqual(self.tm.check_stats(), {})
+        self.assertEqual(self.tm.check_hierarchy_index(), {'missing': 0, 'extra': 0})
+        self.assertEqual(self.tm.check_rollups(), [])
+        self.assertEqual(self.tm.check_dependencies(), [])
+
+
+def _rollups(tasks):
+    flat = {}
+    for task in tasks:
+        flat[task['id']] = (task['child_count'], task['completed_count'],
+                            task['descendant_count'], task['completed_descendant_count'])
+        flat.update(_rollups(task.get('children', [])))
+    return flat
+
+
+class TestRollups(TaskManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.a, self.a1, self.a11, self.a2, self.b = self.tm.add_tasks([
+            {'title': 'A', 'children': [
+                {'title': 'A1', 'children': [{'title': 'A1.1', 'status': 'completed'}]},
+                {'title': 'A2', 'status': 'completed'},
+            ]},
+            {'title': 'B'},
+        ])
+
+    def test_counts_follow_edits(self):
+        rollup = _rollups(self.tm.get_tasks())
+        self.assertEqual(rollup[self.a], (2, 1, 3, 2))
+        self.assertEqual(rollup[self.a1], (1, 1, 1, 1))
+        self.assertEqual(rollup[self.b], (0, 0, 0, 0))
+        self.assertAlmostEqual(self.tm.get_tasks()[0]['percent_complete'], 200 / 3)
+
+        self.tm.update_task_status(self.a1, 'completed')
+        self.assertEqual(_rollups(self.tm.get_tasks())[self.a], (2, 2, 3, 3))
+        # 窗口据此重绘祖先行
+        ancestor = self.tm.get_ancestors(self.a11)[0]
+        self.assertEqual([ancestor[column] for column in rollups.COLUMNS] + [ancestor['percent_complete']],
+                         [2, 2, 3, 3, 100])
+
+        self.tm.move_task(self.a1, self.b)
+        rollup = _rollups(self.tm.get_tasks())
+        self.assertEqual(rollup[self.a], (1, 1, 1, 1))
+        self.assertEqual(rollup[self.b], (1, 1, 2, 2))
+
+        self.tm.delete_task(self.a11)
+        self.assertEqual(_rollups(self.tm.get_tasks())[self.b], (1, 1, 1, 1))
+        self.assertEqual(self.tm.check_rollups(), [])
+
+    def test_cache_refreshes_ancestors(self):
+        self.tm.get_tasks()
+        self.tm.add_task("A1.2", status='completed', parent_id=self.a1)
+        self.tm.update_task_status(self.a2, 'not_started')
+        self.tm.delete_tasks([self.a11])
+        self.assertEqual(_rollups(self.tm.get_tasks()), _rollups(TaskManager().get_tasks()))
+        self.assertEqual(self.tm.get_root_tasks()[0]['descendant_count'], 3)
+
+    def test_check_and_rebuild(self):
+        database.execute("UPDATE task_rollups SET child_count = 7 WHERE task_id = ?", (self.b,))
+        self.assertEqual(self.tm.check_rollups(), [self.b])
+        self.tm.rebuild_rollups()
+        self.assertEqual(self.tm.check_rollups(), [])
+
+
+class TestReminders(TaskManagerTestCase):
+
+    def test_pending_pages_in_time_order(self):
+        task_id = self.tm.add_task("Call")
+        times = ["2025-03-01 09:00", "2025-01-01T08:30:00", "2025-02-01 10:00:00", "2025-02-01 10:00:00"]
+        ids = [self.tm.add_reminder(task_id, when) for when in times]
+        first = self.tm.get_pending_reminders(limit=2)
+        self.assertEqual(first, [(ids[1], task_id, "2025-01-01 08:30:00"), (ids[2], task_id, "2025-02-01 10:00:00")])
+        rest = self.tm.get_pending_reminders(after=(first[-1][2], first[-1][0]), limit=2)
+        self.assertEqual([row[0] for row in rest], [ids[3], ids[0]])
+
+    def test_fire_marks_and_skips_deleted_tasks(self):
+        keep, gone = self.tm.add_task("Keep"), self.tm.add_task("Gone")
+        r1 = self.tm.add_reminder(keep, "2025-01-01 09:00")
+        r2 = self.tm.add_reminder(gone, "2025-01-01 09:00")
+        self.tm.delete_task(gone)
+        fired = self.tm.fire_reminders([r1, r2])
+        self.assertEqual([(r['id'], r['title']) for r in fired], [(r1, "Keep")])
+        self.assertEqual(self.tm.fire_reminders([r1]), [])
+        self.assertEqual(self.tm.get_pending_reminders(), [])
+
+    def test_all_reminders_are_paged_by_id(self):
+        task_id = self.tm.add_task("Call")
+        ids = [self.tm.add_reminder(task_id, f"2025-01-0{n + 1} 09:00") for n in range(5)]
+        self.tm.fire_reminders(ids[:1])
+        first = self.tm.get_reminders(limit=3)
+        self.assertEqual([row[0] for row in first], ids[:3])
+        self.assertEqual([row[0] for row in self.tm.get_reminders(after_id=first[-1][0])], ids[3:])
+
+
+class TestReminderQueue(TaskManagerTestCase):
+
+    def drain(self, queue, now="9999"):
+        fired = []
+        while True:
+            if queue.needs_refill:
+                queue.load(self.tm.get_pending_reminders(queue.horizon, queue.window))
+            due = queue.pop_due(now)
+            if not due:
+                return fired
+            fired.extend(reminder[0] for reminder in due)
+            self.tm.fire_reminders(reminder[0] for reminder in due)
+
+    def test_only_a_window_is_held_in_memory(self):
+        task_id = self.tm.add_task("Many")
+        rows = [(task_id, f"2025-01-01 00:{minute // 60:02d}:{minute % 60:02d}", 0) for minute in range(2000)]
+        database.get_connection().executemany(
+            "INSERT INTO reminders (task_id, reminder_time, fired) VALUES (?, ?, ?)", rows)
+        queue = ReminderQueue(window=100)
+        queue.load(self.tm.get_pending_reminders(limit=queue.window))
+        self.assertEqual(len(queue), 100)
+        self.assertEqual(queue.next_time(), "2025-01-01 00:00:00")
+        self.assertEqual(len(self.drain(queue)), 2000)
+        self.assertFalse(queue.needs_refill)
+
+    def test_add_and_discard_rearm(self):
+        task_id = self.tm.add_task("T")
+        ids = [self.tm.add_reminder(task_id, f"2025-01-0{day} 09:00") for day in range(1, 6)]
+        queue = ReminderQueue(window=2)
+        queue.load(self.tm.get_pending_reminders(limit=queue.window))
+
+        early = self.tm.add_reminder(task_id, "2024-12-31 09:00")
+        queue.add(early, task_id, "2024-12-31 09:00:00")
+        late = self.tm.add_reminder(task_id, "2025-02-01 09:00")
+        queue.add(late, task_id, "2025-02-01 09:00:00")  # 超出已载入范围，留在数据库
+        self.assertEqual(queue.next_time(), "2024-12-31 09:00:00")
+
+        queue.discard(early)
+        self.tm.delete_reminder(early)
+        self.assertEqual(queue.next_time(), "2025-01-01 09:00:00")
+        self.assertEqual(queue.pop_due("2025-01-01 12:00:00"), [(ids[0], task_id, "2025-01-01 09:00:00")])
+        self.tm.fire_reminders([ids[0]])
+        self.assertEqual(self.drain(queue), ids[1:] + [late])
+
+
+class TestDueDates(TaskManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.ids = self.tm.add_tasks([
+            {'title': 'Late', 'due_date': '2025-01-05'},
+            {'title': 'Done', 'due_date': '2025/01/06', 'status': 'completed'},
+            {'title': 'Today', 'due_date': '2025-01-10 17:30'},
+            {'title': 'Soon', 'due_date': '2025-01-14T09:00:00'},
+            {'title': 'Free-form', 'due_date': 'next friday'},
+            {'title': 'Undated'},
+        ])
+
+    def test_due_day_is_normalized(self):
+        due_days = dict(database.fetch_all("SELECT title, due_day FROM tasks"))
+        self.assertEqual(due_days['Late'], database.to_epoch_day(date(2025, 1, 5)))
+        self.assertEqual(due_days['Done'] - due_days['Late'], 1)
+        self.assertEqual(database.from_epoch_day(due_days['Today']), date(2025, 1, 10))
+        self.assertIsNone(due_days['Free-form'])
+        self.assertIsNone(due_days['Undated'])
+        cached = {task['title']: task['due_day'] for task in self.tm.get_tasks()}
+        self.assertEqual(cached, {task['title']: task['due_day'] for task in TaskManager().get_tasks()})
+
+    def test_due_between_and_overdue(self):
+        between = self.tm.get_due_between('2025-01-06', date(2025, 1, 14))
+        self.assertEqual([task['title'] for task in between], ['Done', 'Today', 'Soon'])
+        overdue = self.tm.get_overdue(date(2025, 1, 10))
+        self.assertEqual([task['title'] for task in overdue], ['Late'])
+        self.assertEqual(len(self.tm.get_overdue('2030-01-01')), 3)
+        with self.assertRaises(ValueError):
+            self.tm.get_overdue('soon')
+
+
+class TestDependencies(TaskManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.design, self.build, self.test, self.ship = self.tm.add_tasks(
+            [{'title': title} for title in ('Design', 'Build', 'Test', 'Ship')]
+        )
+        self.tm.add_dependency(self.build, self.design)
+        self.tm.add_dependency(self.test, self.build)
+        self.tm.add_dependency(self.ship, self.test)
+        self.tm.add_dependency(self.ship, self.build)
+
+    def flags(self):
+        return {task['id']: (task['blocked'], task['ready']) for task in self.tm.get_tasks()}
+
+    def test_cycles_are_rejected(self):
+        with self.assertRaises(DependencyCycleError):
+            self.tm.add_dependency(self.design, self.ship)
+        with self.assertRaises(ValueError):
+            self.tm.add_dependency(self.test, self.test)
+        self.assertEqual(sorted(self.tm.get_dependencies(self.ship)), [self.build, self.test])
+
+    def test_topological_order(self):
+        extra = self.tm.add_task("Docs", depends_on=self.design)
+        order = self.tm.get_topological_order()
+        self.assertEqual(sorted(order), sorted([self.design, self.build, self.test, self.ship, extra]))
+        for task_id in order:
+            for dependency in self.tm.get_dependencies(task_id):
+                self.assertLess(order.index(dependency), order.index(task_id))
+
+    def test_completion_unblocks_dependents(self):
+        self.tm.get_tasks()
+        self.assertEqual(self.tm.get_blocked_ids(), {self.build, self.test, self.ship})
+        self.assertEqual(self.flags()[self.design], (False, True))
+
+        self.tm.update_task_status(self.design, 'completed')
+        self.tm.update_task_status(self.build, 'completed')
+        self.assertEqual(self.tm.get_blocked_ids(), {self.ship})
+        self.assertEqual(self.flags()[self.test], (False, True))
+        self.assertEqual(self.flags()[self.build], (False, False))
+
+        self.tm.update_task_status(self.build, 'in_progress')
+        self.assertEqual(self.tm.get_blocked_ids(), {self.test, self.ship})
+        self.tm.delete_task(self.build)
+        self.assertEqual(self.tm.get_blocked_ids(), {self.ship})
+        self.assertEqual(self.flags(), {task['id']: (task['blocked'], task['ready'])
+                                        for task in TaskManager().get_tasks()})
+
+    def test_delete_refreshes_only_dependents(self):
+        self.tm.update_task_status(self.design, 'completed')
+        self.tm.get_tasks()
+        statements = []
+        database.set_trace(statements.append)
+        try:
+            self.tm.delete_tasks([self.build])
+        finally:
+            database.set_trace(None)
+        # 只重读被删任务的依赖方，不重读整个阻塞集合
+        self.assertFalse([sql for sql in statements if 'FROM task_blocked' in sql and 'WHERE' not in sql])
+        self.assertEqual(self.flags(), {task['id']: (task['blocked'], task['ready'])
+                                        for task in TaskManager().get_tasks()})
+        self.assertEqual(self.flags()[self.test], (False, True))
+
+    def test_check_and_rebuild(self):
+        self.assertEqual(self.tm.check_dependencies(), [])
+        database.execute("DELETE FROM task_blocked WHERE task_id = ?", (self.ship,))
+        self.assertEqual(self.tm.check_dependencies(), [self.ship])
+        self.tm.get_tasks()
+        self.tm.rebuild_dependencies()
+        self.assertEqual(self.tm.check_dependencies(), [])
+        self.assertTrue(self.flags()[self.ship][0])
+
+
+class TestSchedule(TaskManagerTestCase):
+
+    TODAY = date(2026, 1, 5)
+
+    def setUp(self):
+        super().setUp()
+        self.design, self.build, self.test, self.ship, self.docs = self.tm.add_tasks([
+            {'title': 'Design'}, {'title': 'Build'}, {'title': 'Test'},
+            {'title': 'Ship', 'due_date': '2026-01-08'}, {'title': 'Docs'},
+        ])
+        self.tm.add_dependency(self.build, self.design)
+        self.tm.add_dependency(self.test, self.build)
+        self.tm.add_dependency(self.ship, self.test)
+        self.tm.add_dependency(self.ship, self.build)
+
+    def test_critical_path_and_slack(self):
+        schedule = self.tm.get_schedule(today=self.TODAY)
+        self.assertEqual(schedule[self.ship]['earliest_start'], date(2026, 1, 8))
+        self.assertEqual(schedule[self.ship]['earliest_finish'], date(2026, 1, 8))
+        self.assertEqual(schedule[self.build]['latest_finish'], date(2026, 1, 6))
+        self.assertEqual({task_id: entry['slack'] for task_id, entry in schedule.items()},
+                         {self.design: 0, self.build: 0, self.test: 0, self.ship: 0, self.docs: 3})
+        self.assertEqual([task_id for task_id in schedule if schedule[task_id]['critical']],
+                         [self.design, self.build, self.test, self.ship])
+        self.assertEqual(self.tm.get_critical_path(today=self.TODAY),
+                         [self.design, self.build, self.test, self.ship])
+
+    def test_edits_update_the_cached_schedule(self):
+        self.tm.get_schedule(today=self.TODAY)
+        self.tm.update_task_status(self.design, 'completed')
+        self.assertEqual(self.tm.get_schedule([self.ship], today=self.TODAY)[self.ship]['slack'], 1)
+        self.assertEqual(self.tm.get_critical_path(today=self.TODAY), [self.build, self.test, self.ship])
+
+        self.tm.remove_dependency(self.test, self.build)
+        self.tm.add_dependency(self.build, self.docs)
+        release = self.tm.add_tasks([{'title': 'Release', 'children': [{'title': 'Notes'}]}])[0]
+        notes = self.tm.get_descendant_ids(release)[0]
+        self.tm.add_dependency(notes, self.ship)
+        self.assertEqual(self.tm.get_earliest_finish(release, today=self.TODAY), date(2026, 1, 8))
+        self.assertEqual(self.tm.get_schedule(today=self.TODAY), TaskManager().get_schedule(today=self.TODAY))
+
+    def test_missed_deadline_gives_negative_slack(self):
+        self.tm.add_dependency(self.design, self.docs)
+        schedule = self.tm.get_schedule(today=self.TODAY)
+        self.assertEqual(schedule[self.ship]['slack'], -1)
+        self.assertTrue(schedule[self.docs]['critical'])
+
+    def test_incremental_updates_match_a_full_recompute(self):
+        rng = random.Random(19)
+        tasks = [(task_id, 'not_started', rng.choice([None, 20, 25, 30])) for task_id in range(200)]
+        edges = {(task_id, rng.randrange(task_id)) for task_id in range(1, 200) for _ in range(2)}
+        status = {task_id: 'not_started' for task_id, _, _ in tasks}
+        schedule = Schedule(tasks, edges, 10)
+        for step in range(300):
+            action = rng.random()
+            if action < 0.4:
+                task_id, new_status = rng.randrange(len(tasks)), rng.choice(['completed', 'in_progress'])
+                status[task_id] = new_status
+                schedule.set_status([task_id], new_status)
+            elif action < 0.6 and edges:
+                edge = rng.choice(sorted(edges))
+                edges.discard(edge)
+                schedule.remove_edge(*edge)
+            elif action < 0.9:
+                task_id, depends_on = rng.sample(range(len(tasks)), 2)
+                try:
+                    topological_order(status, edges | {(task_id, depends_on)})
+                except ValueError:
+                    continue  # 会形成环，TaskManager 会拒绝
+                edges.add((task_id, depends_on))
+                schedule.add_edge(task_id, depends_on)
+            else:
+                task_id = len(tasks)
+                tasks.append((task_id, 'not_started', rng.choice([None, 15])))
+                status[task_id] = 'not_started'
+                schedule.add_tasks([tasks[-1]])
+            fresh = Schedule([(task_id, status[task_id], due) for task_id, _, due in tasks], edges, 10)
+            for name in ('start', 'finish', 'latest'):
+                self.assertEqual(getattr(schedule, name), getattr(fresh, name), (step, name))
+            self.assertEqual(schedule.critical_path(), fresh.critical_path())
+
+
+class TestExportImport(TaskManagerTestCase):
+
+    # 吞吐量测试的任务数，可用环境变量调大（例如 1000000）
+    TRANSFER_TASKS = int(os.environ.get('TODO_TRANSFER_TASKS', 10000))
+
+    def setUp(self):
+        super().setUp()
+        self.other_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.other_dir, ignore_errors=True)
+
+    def snapshot(self, tm):
+        """Tasks keyed by title, with parent and dependencies by title as well."""
+        tasks = {}
+
+        def walk(nodes):
+            for task in nodes:
+                tasks[task['id']] = task
+                walk(task.get('children', []))
+        walk(tm.get_tasks())
+        return {
+            task['title']: (
+                task['description'], task['status'], task['due_date'],
+                tasks[task['parent_id']]['title'] if task['parent_id'] else None,
+                sorted(tasks[dependency]['title'] for dependency in tm.get_dependencies(task_id)),
+            ) for task_id, task in tasks.items()
+        }
+
+    def build_sample(self):
+        ids = self.tm.add_tasks([
+            {'title': 'Spec', 'description': 'line one\nline two, "quoted"', 'due_date': '2026-03-01',
+             'children': [{'title': 'Draft'}, {'title': 'Review', 'status': 'completed'}]},
+            {'title': 'Build 构建'},
+            {'title': 'Late root'},
+        ])
+        spec, draft, review, build, late = ids
+        self.tm.add_dependency(build, spec)
+        self.tm.add_dependency(draft, review)
+        # 移到 id 更大的任务下：导出文件中子任务排在父任务之前
+        self.tm.move_task(spec, late)
+        return ids
+
+    def test_round_trip_preserves_hierarchy_and_dependencies(self):
+        self.build_sample()
+        expected = self.snapshot(self.tm)
+        for format in ('jsonl', 'csv'):
+            path = os.path.join(self.other_dir, f'tasks.{format}')
+            self.assertEqual(self.tm.export_tasks(path), len(expected))
+
+            database.configure(path=os.path.join(self.other_dir, f'{format}.db'))
+            database.create_table()
+            target = TaskManager()
+            result = target.import_tasks(path)
+            self.assertEqual((result['tasks'], result['dependencies']), (len(expected), 2))
+            self.assertEqual(self.snapshot(target), expected)
+            self.assertEqual(target.check_hierarchy_index(), {'missing': 0, 'extra': 0})
+            self.assertEqual(target.check_rollups(), [])
+            self.assertEqual(target.check_dependencies(), [])
+            database.configure(path=os.path.join(self.tmp_dir, 'tasks.db'))
+
+    def test_import_into_the_same_database_remaps_ids(self):
+        ids = self.build_sample()
+        path = os.path.join(self.other_dir, 'tasks.jsonl')
+        self.tm.export_tasks(path)
+        progress = []
+        result = self.tm.import_tasks(path, chunk_size=2, on_progress=progress.append)
+        self.assertEqual(progress[-1], len(ids))
+        self.assertGreater(result['id_offset'], 0)
+        spec = ids[0] + result['id_offset']
+        self.assertEqual(self.tm.get_ancestors(spec)[0]['id'], ids[-1] + result['id_offset'])
+        self.assertEqual(self.tm.get_dependencies(ids[3] + result['id_offset']), [spec])
+        self.assertEqual(self.tm.get_stats('all')['total'], 2 * len(ids))
+        self.assertEqual(self.tm.check_rollups(), [])
+
+    def test_references_outside_the_file_are_dropped(self):
+        # 被依赖的任务已删除：导出时不再带出失效的 depends_on
+        first = self.tm.add_task("Gone")
+        self.tm.add_task("Waits", depends_on=first)
+        self.tm.delete_task(first)
+        path = os.path.join(self.other_dir, 'stale.jsonl')
+        self.tm.export_tasks(path)
+        with open(path, encoding='utf-8') as file:
+            self.assertEqual([json.loads(line)['depends_on'] for line in file], [None])
+
+        # 手写的部分文件：引用早于首个 id 的任务（1）和范围内缺失的任务（6）
+        path = os.path.join(self.other_dir, 'partial.jsonl')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({'id': 5, 'title': 'Y', 'depends_on': 1, 'parent_id': 1, 'dependencies': [1]}) + '\n')
+            file.write(json.dumps({'id': 7, 'title': 'Z', 'depends_on': 6, 'parent_id': 6,
+                                   'dependencies': [6, 5]}) + '\n')
+        self.tm.clear_tasks()
+        unrelated = self.tm.add_tasks([{'title': f'unrelated {n}'} for n in range(6)])
+        result = self.tm.import_tasks(path)
+        y, z = 5 + result['id_offset'], 7 + result['id_offset']
+        self.assertGreater(y, max(unrelated))
+
+        tasks = {task['id']: task for task in self.tm.get_tasks()}
+        self.assertEqual([(tasks[task_id]['parent_id'], tasks[task_id]['depends_on']) for task_id in (y, z)],
+                         [(None, None), (None, None)])
+        self.assertEqual(self.tm.get_dependencies(y), [])
+        self.assertEqual(self.tm.get_dependencies(z), [y])
+        self.assertEqual(self.tm.get_blocked_ids(), {z})
+        self.assertEqual(result['dependencies'], 1)
+
+    def test_cyclic_dependencies_are_dropped(self):
+        # 手写文件：1 -> 3 -> 2 -> 1 成环；5 排在父任务 6 之前，其 depends_on 列与 7 的依赖成环
+        rows = [
+            {'id': 1, 'title': 'A', 'dependencies': [3]},
+            {'id': 2, 'title': 'B', 'dependencies': [1]},
+            {'id': 3, 'title': 'C', 'dependencies': [2]},
+            {'id': 5, 'title': 'D', 'parent_id': 6, 'depends_on': 7},
+            {'id': 6, 'title': 'E'},
+            {'id': 7, 'title': 'F', 'dependencies': [5]},
+        ]
+        path = os.path.join(self.other_dir, 'cyclic.jsonl')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(json.dumps(row) + '\n' for row in rows)
+        with self.assertLogs('logic.transfer', 'WARNING') as logs:
+            result = self.tm.import_tasks(path)
+        self.assertEqual(len(logs.output), 2)
+
+        a, b, c, d, e, f = (row['id'] + result['id_offset'] for row in rows)
+        self.assertEqual(result['dependencies'], 3)
+        self.assertEqual([self.tm.get_dependencies(task_id) for task_id in (a, b, c, d, f)],
+                         [[], [a], [b], [], [d]])
+        self.assertEqual(self.tm.get_ancestors(d)[0]['id'], e)
+        self.assertEqual(len(self.tm.get_topological_order()), len(rows))
+        self.assertEqual(self.tm.check_dependencies(), [])
+
+    def test_unknown_format_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.tm.export_tasks(os.path.join(self.other_dir, 'tasks.xml'))
+
+    def test_streaming_throughput_in_bounded_memory(self):
+        count = self.TRANSFER_TASKS
+        self.tm.add_tasks({'title': f'task {n}', 'description': 'x' * 40,
+                           'children': [{'title': f'task {n}.1'}]} for n in range(count // 2))
+        path = os.path.join(self.other_dir, 'tasks.jsonl')
+
+        tracemalloc.start()
+        try:
+            start = time.perf_counter()
+            exported = self.tm.export_tasks(path)
+            export_seconds = time.perf_counter() - start
+            _, export_peak = tracemalloc.get_traced_memory()
+
+            database.configure(path=os.path.join(self.other_dir, 'import.db'))
+            database.create_table()
+            tracemalloc.reset_peak()
+            start = time.perf_counter()
+            result = TaskManager().import_tasks(path)
+            import_seconds = time.perf_counter() - start
+            _, import_peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            database.configure(path=os.path.join(self.tmp_dir, 'tasks.db'))
+
+        self.assertEqual(exported, count)
+        self.assertEqual(result['tasks'], count)
+        print(f"\nexport: {count / export_seconds:,.0f} tasks/s, peak {export_peak / 2**20:.1f} MiB; "
+              f"import: {count / import_seconds:,.0f} tasks/s, peak {import_peak / 2**20:.1f} MiB")
+        # 峰值由块大小决定，与任务总数无关
+        self.assertLess(export_peak, 8 * 2**20)
+        self.assertLess(import_peak, 16 * 2**20)
+
+
+class TestBackup(TaskManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.backup_dir = os.path.join(self.tmp_dir, 'backups')
+
+    def titles(self):
+        return sorted(task['title'] for task in self.tm.get_tasks())
+
+    def test_snapshot_and_restore(self):
+        first = self.tm.add_tasks([{'title': 'Keep me', 'children': [{'title': 'Child'}]}])[0]
+        self.tm.add_reminder(first, '2026-01-01 09:00')
+        snapshot = self.tm.backup(self.backup_dir)
+        self.tm.clear_tasks()
+        self.tm.add_task("Added later")
+
+        self.tm.restore_backup(snapshot)
+        self.assertEqual(self.titles(), ['Keep me'])
+        self.assertEqual(self.tm.get_descendant_ids(first), [first + 1])
+        self.assertEqual(len(self.tm.get_reminders()), 1)
+        self.assertEqual(self.tm.check_rollups(), [])
+        self.assertEqual(self.tm.get_stats('all')['total'], 2)
+
+    def test_default_directory_follows_configured_database(self):
+        self.tm.add_task("Task")
+        snapshot = self.tm.backup()
+        self.assertEqual(snapshot.parent, Path(self.tmp_dir) / 'backups')
+        self.assertEqual(self.tm.list_backups(), [snapshot])
+
+    def test_snapshots_rotate(self):
+        self.tm.add_task("Task")
+        paths = [backup.create_snapshot(self.backup_dir, keep=3) for _ in range(5)]
+        self.assertEqual(backup.list_snapshots(self.backup_dir), paths[:1:-1])
+
+    def test_damaged_snapshot_is_rejected(self):
+        self.tm.add_task("Task")
+        snapshot = self.tm.backup(self.backup_dir)
+        with open(snapshot, 'r+b') as file:
+            file.seek(os.path.getsize(snapshot) // 2)
+            file.write(b'garbage')
+        with self.assertRaises(Exception):
+            self.tm.restore_backup(snapshot)
+        self.assertEqual(self.titles(), ['Task'])
+
+    def test_backup_throughput_and_writer_pauses(self):
+        self.tm.add_tasks({'title': f'task {n}', 'description': 'x' * 200} for n in range(20000))
+        conn = database.get_connection()
+        size = conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+
+        steps = []
+        result = {}
+
+        def run_backup():
+            start = time.perf_counter()
+            result['path'] = backup.create_snapshot(self.backup_dir, pages=16,
+                                                    progress=lambda *counts: steps.append(counts))
+            result['seconds'] = time.perf_counter() - start
+        thread = threading.Thread(target=run_backup)
+        thread.start()
+
+        # 模拟界面线程：备份期间持续写入，记录最长的单次操作耗时
+        pauses = []
+        while thread.is_alive():
+            start = time.perf_counter()
+            self.tm.add_task("written during backup")
+            pauses.append(time.perf_counter() - start)
+        thread.join()
+
+        print(f"\nbackup: {size / 2**20:.1f} MiB in {result['seconds']:.2f} s "
+              f"({size / 2**20 / result['seconds']:.1f} MiB/s, {len(steps)} steps); "
+              f"{len(pauses)} writes meanwhile, longest {max(pauses) * 1000:.1f} ms")
+        self.assertGreater(len(steps), 1)
+        self.assertGreater(len(pauses), 1)
+        self.assertLess(max(pauses), 0.25)
+
+        self.tm.restore_backup(result['path'])
+        self.assertGreaterEqual(self.tm.get_stats('all')['total'], 20000)
+        self.assertEqual(self.tm.check_hierarchy_index(), {'missing': 0, 'extra': 0})
+
+
+class TestWriteQueue(TaskManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.writes = WriteQueue(self.tm)
+
+    def tearDown(self):
+        self.writes.close()
+        super().tearDown()
+
+    def test_burst_is_committed_in_few_transactions(self):
+        ids = self.tm.add_tasks([{'title': f'task {n}'} for n in range(50)])
+        statuses = ['in_progress', 'completed', 'not_started']
+        futures = [self.writes.submit(self.tm.update_task_status, ids[n % 50], statuses[n % 3])
+                   for n in range(600)]
+        self.writes.flush()
+
+        self.assertEqual([future.result() for future in futures[:2]], [[ids[0]], [ids[1]]])
+        stats = self.writes.stats()
+        # flush 自己也排入一个空操作
+        self.assertEqual(stats['writes'], len(futures) + 1)
+        self.assertLessEqual(stats['commits'], 10)
+        expected = {ids[n % 50]: statuses[n % 3] for n in range(600)}
+        self.assertEqual({task['id']: task['status'] for task in TaskManager().get_tasks()}, expected)
+        self.assertEqual(self.tm.get_stats('all')['completed'], list(expected.values()).count('completed'))
+
+    def test_failing_write_does_not_abort_its_batch(self):
+        first, second = self.tm.add_tasks([{'title': 'First'}, {'title': 'Second'}])
+        self.tm.add_dependency(second, first)
+        added = self.writes.submit(self.tm.add_task, "Added")
+        cycle = self.writes.submit(self.tm.add_dependency, first, second)
+        deleted = self.writes.submit(self.tm.delete_task, second)
+        self.writes.flush()
+
+        with self.assertRaises(DependencyCycleError):
+            cycle.result()
+        self.assertIsNone(deleted.result())
+        self.assertEqual(sorted(task['title'] for task in TaskManager().get_tasks()), ['Added', 'First'])
+        self.assertEqual(self.tm.get_dependencies(first), [])
+        self.assertEqual(added.result(), max(task['id'] for task in self.tm.get_tasks()))
+
+    def test_cache_shows_only_committed_writes(self):
+        self.tm.get_tasks()
+        started, release = threading.Event(), threading.Event()
+
+        def hold_batch_open():
+            started.set()
+            release.wait(5)
+        self.writes.submit(self.tm.add_task, "Pending")
+        self.writes.submit(hold_batch_open)
+        self.assertTrue(started.wait(5))
+
+        seen = []
+        reader = threading.Thread(target=lambda: seen.append([task['title'] for task in self.tm.get_tasks()]))
+        reader.start()
+        reader.join(0.2)
+        # 批次未提交：读线程等待，而不是读到缓存里未提交的任务
+        self.assertEqual(seen, [])
+        release.set()
+        reader.join(5)
+        self.assertEqual(seen, [['Pending']])
+
+    def test_failed_delete_is_rolled_back(self):
+        parent, child = self.tm.add_tasks([{'title': 'Parent', 'children': [{'title': 'Child'}]}])
+        self.tm.get_tasks()
+
+        def fail(task_ids):
+            raise sqlite3.OperationalError("disk I/O error")
+        self.tm._cache_refresh_rollups = fail
+        deleted = self.writes.submit(self.tm.delete_tasks, [child])
+        with self.assertRaises(sqlite3.OperationalError):
+            deleted.result(5)
+        del self.tm._cache_refresh_rollups
+
+        self.assertEqual(self.tm.get_descendant_ids(parent), [child])
+        self.assertEqual(self.tm.get_tasks()[0]['children'][0]['id'], child)
+
+    def test_submit_alone_runs_between_batches_outside_a_transaction(self):
+        root = self.tm.add_task("Project")
+        before = [self.writes.submit(self.tm.add_task, f"step {n}", parent_id=root) for n in range(5)]
+        seen = {}
+
+        def split():
+            seen['in_transaction'] = database.get_connection().in_transaction
+            seen['steps'] = len(self.tm.get_descendant_ids(root))
+            return self.tm.split_project(root)
+        moved = self.writes.submit_alone(split)
+        after = self.writes.submit(self.tm.add_task, "late step", parent_id=root)
+        after.result(5)
+
+        self.assertTrue(all(future.done() for future in before))
+        self.assertEqual(seen, {'in_transaction': False, 'steps': 5})
+        self.assertTrue(moved.result().exists())
+        # 之后排队的写入落到了分片中
+        self.assertEqual(list(self.tm.get_shards()), [root])
+        self.assertEqual(len(self.tm.get_descendant_ids(root)), 6)
+
+    def test_close_commits_pending_writes(self):
+        futures = [self.writes.submit(self.tm.add_task, f"task {n}") for n in range(20)]
+        self.writes.close()
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertEqual(self.tm.get_stats('all')['total'], 20)
+        with self.assertRaises(RuntimeError):
+            self.writes.submit(self.tm.add_task, "late")
+
+
+class TestClearAndMaintenance(TaskManagerTestCase):
+
+    def populate(self, count):
+        ids = self.tm.add_tasks([{'title': f'alpha {n}', 'description': 'x' * 200,
+                                  'children': [{'title': f'beta {n}'}]} for n in range(count)])
+        self.tm.add_dependency(ids[2], ids[0])
+        self.tm.add_reminder(ids[0], '2026-01-01 09:00')
+        return ids
+
+    def test_check_and_rebuild_derived_tables(self):
+        ids = self.populate(5)
+        self.assertTrue(all(check.is_consistent(result) for result in check.check().values()))
+
+        database.execute("DELETE FROM task_closure WHERE descendant = ? AND depth = 1", (ids[1],))
+        database.execute("UPDATE task_stats SET total = 0")
+        database.execute("DELETE FROM task_blocked")
+        results = check.check()
+        self.assertEqual([table for table, result in results.items() if not check.is_consistent(result)],
+                         ['task_closure', 'task_stats', 'task_blocked'])
+
+        # 按依赖顺序重建：闭包先于依赖它的 rollups
+        check.rebuild(['task_rollups', 'task_stats', 'task_blocked', 'task_closure'])
+        self.assertTrue(all(check.is_consistent(result) for result in check.check().values()))
+        self.assertEqual(self.tm.get_blocked_ids(), {ids[2]})
+        with self.assertRaises(ValueError):
+            check.check(['tasks'])
+
+    def test_clear_empties_derived_tables_and_keeps_triggers(self):
+        ids = self.populate(50)
+        cursor = self.tm.get_change_cursor()
+        self.assertTrue(self.tm.clear_tasks())
+
+        for table in ('tasks', 'reminders', 'task_dependencies', 'task_blocked', 'task_closure', 'task_rollups'):
+            self.assertEqual(database.fetch_all(f"SELECT COUNT(*) FROM {table}")[0][0], 0, table)
+        self.assertEqual(self.tm.get_stats('all')['total'], 0)
+        self.assertEqual(self.tm.search('alpha'), [])
+        self.assertTrue(self.tm.get_changes_since(cursor)['reset'])
+        self.assertEqual(database.fetch_all("PRAGMA foreign_keys")[0][0], 1)
+
+        # 触发器已重建：新写入照常维护各派生表，id 不重复使用
+        parent, child, other = self.tm.add_tasks([{'title': 'gamma', 'children': [{'title': 'delta'}]},
+                                                  {'title': 'epsilon'}])
+        self.assertGreater(parent, max(ids))
+        self.tm.add_dependency(other, child)
+        self.assertEqual(self.tm.get_blocked_ids(), {other})
+        self.assertEqual(self.tm.get_descendant_ids(parent), [child])
+        self.assertEqual([task['title'] for task in self.tm.search('gamma')], ['gamma'])
+        self.assertEqual(self.tm.check_rollups(), [])
+        self.assertEqual(self.tm.check_stats(), {})
+        self.assertEqual(self.tm.check_dependencies(), [])
+        self.assertFalse(self.tm.get_changes_since(self.tm.get_change_cursor() - 1)['reset'])
+
+    def test_clear_joins_an_outer_transaction(self):
+        self.populate(10)
+        with database.transaction():
+            self.assertTrue(self.tm.clear_tasks())
+        self.assertEqual(self.tm.get_stats('all')['total'], 0)
+        self.assertEqual(self.tm.get_tasks(), [])
+
+    def test_maintenance_returns_freed_pages_within_budget(self):
+        self.populate(2000)
+        conn = database.get_connection()
+        self.assertTrue(maintenance.is_incremental(conn))
+        self.tm.clear_tasks()
+        freed = maintenance.free_pages(conn)
+        self.assertGreater(freed, 0)
+
+        # 预算为 0：只执行 optimize（它可能占用少量空闲页），不开始其余步骤
+        result = self.tm.run_maintenance(budget=0)
+        self.assertEqual((result['analyzed'], result['vacuumed_pages']), (False, 0))
+        self.assertGreater(result['reclaimable_pages'], 0)
+
+        # WAL 模式下主文件在检查点时才写入和截断
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        size = os.path.getsize(database.DATABASE_PATH)
+        result = self.tm.run_maintenance(budget=10)
+        # 所有步骤都在预算内完成
+        self.assertLess(result['seconds'], 10)
+        self.assertTrue(result['analyzed'])
+        self.assertEqual(result['reclaimable_pages'], 0)
+        self.assertGreater(result['vacuumed_pages'], 0)
+        self.assertTrue(database.has_table('sqlite_stat1'))
+        self.tm.add_task("After maintenance")
+        self.assertEqual(self.tm.get_stats('all')['total'], 1)
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.assertLess(os.path.getsize(database.DATABASE_PATH), size)
+
+
+class TestShards(TaskManagerTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.alpha = self.tm.add_tasks([{'title': 'alpha project',
+                                         'children': [{'title': 'alpha step', 'children': [{'title': 'alpha detail'}]}]}])
+        self.beta = self.tm.add_tasks([{'title': 'beta project', 'children': [{'title': 'beta step'}]}])
+        self.tm.add_dependency(self.alpha[2], self.alpha[1])
+        self.reminder = self.tm.add_reminder(self.alpha[1], '2030-01-01T09:00:00')
+
+    def tearDown(self):
+        shards.close_all()
+        super().tearDown()
+
+    def test_split_and_merge_keep_ids_and_derived_tables(self):
+        path = self.tm.split_project(self.alpha[0])
+        self.assertTrue(path.exists())
+        self.assertEqual(self.tm.get_shards(), {self.alpha[0]: path})
+        self.assertEqual(database.fetch_all("SELECT COUNT(*) FROM tasks")[0][0], 2)
+
+        shard = self.tm._shard_managers()[self.alpha[0]]
+        self.assertEqual(shard.get_descendant_ids(self.alpha[0]), self.alpha[1:])
+        self.assertEqual(shard.get_blocked_ids(), {self.alpha[2]})
+        for manager in (self.tm, shard):
+            self.assertEqual(manager.check_stats(), {})
+            self.assertEqual(manager.check_rollups(), [])
+
+        self.tm.merge_project(self.alpha[0])
+        self.assertFalse(path.exists())
+        self.assertEqual(self.tm.get_shards(), {})
+        self.assertEqual(sorted(row[0] for row in database.fetch_all("SELECT id FROM tasks")),
+                         sorted(self.alpha + self.beta))
+        self.assertEqual(self.tm.get_dependencies(self.alpha[2]), [self.alpha[1]])
+        self.assertEqual([row[0] for row in self.tm.get_pending_reminders()], [self.reminder])
+        self.assertEqual(self.tm.check_stats(), {})
+        self.assertEqual(self.tm.check_rollups(), [])
+
+    def test_writes_are_routed_and_ids_stay_unique(self):
+        self.tm.split_project(self.alpha[0])
+        in_shard = self.tm.add_task("alpha extra", parent_id=self.alpha[1])
+        in_main = self.tm.add_task("gamma project")
+        bulk = self.tm.add_tasks([{'title': 'alpha bulk'}], parent_id=self.alpha[0])
+        ids = self.alpha + self.beta + [in_shard, in_main] + bulk
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual(self.tm.get_children(self.alpha[1])[-1]['id'], in_shard)
+        self.assertEqual(database.fetch_all("SELECT COUNT(*) FROM tasks WHERE id = ?", (in_shard,))[0][0], 0)
+
+        affected = self.tm.update_tasks_status([self.alpha[0], self.beta[0]], 'completed')
+        self.assertEqual(set(affected), set(self.alpha + self.beta + [in_shard] + bulk))
+        self.assertEqual(self.tm.get_stats()['completed'], 2)
+        self.assertTrue(self.tm.delete_tasks([self.alpha[1], self.beta[1]]))
+        self.assertEqual(self.tm.get_descendant_ids(self.alpha[0]), bulk)
+
+        # 合并后分片分配过的 id 与主库中的不冲突
+        self.tm.merge_project(self.alpha[0])
+        self.assertGreater(self.tm.add_task("after merge"), max(ids))
+
+    def test_cross_project_views_include_shards(self):
+        self.tm.update_task_status(self.alpha[2], 'completed')
+        due = date(2030, 5, 1)
+        self.tm.add_task("alpha deadline", due_date=due, parent_id=self.alpha[0])
+        before = ([task['id'] for task in self.tm.get_root_tasks()], self.tm.get_stats('all'),
+                  sorted(task['id'] for task in self.tm.search('alpha')), self.tm.get_pending_reminders(),
+                  self.tm.get_due_between(due, due))
+
+        self.tm.split_project(self.alpha[0])
+        after = ([task['id'] for task in self.tm.get_root_tasks()], self.tm.get_stats('all'),
+                 sorted(task['id'] for task in self.tm.search('alpha')), self.tm.get_pending_reminders(),
+                 self.tm.get_due_between(due, due))
+        self.assertEqual(after, before)
+
+        fired = self.tm.fire_reminders([self.reminder])
+        self.assertEqual([reminder['id'] for reminder in fired], [self.reminder])
+        self.assertEqual(self.tm.get_pending_reminders(), [])
+
+    def test_dependencies_cannot_cross_shards(self):
+        self.tm.add_dependency(self.beta[1], self.alpha[1])
+        with self.assertRaises(ValueError):
+            self.tm.split_project(self.alpha[0])
+        with self.assertRaises(ValueError):
+            self.tm.split_project(self.alpha[1])
+        self.tm.remove_dependency(self.beta[1], self.alpha[1])
+
+        self.tm.split_project(self.alpha[0])
+        with self.assertRaises(ValueError):
+            self.tm.add_dependency(self.beta[1], self.alpha[1])
+        with self.assertRaises(ValueError):
+            self.tm.move_task(self.beta[1], self.alpha[0])
+
+    def test_clear_deletes_shards(self):
+        path = self.tm.split_project(self.alpha[0])
+        self.assertTrue(self.tm.clear_tasks())
+        self.assertEqual(self.tm.get_root_tasks(), [])
+        self.assertEqual(self.tm.get_stats()['total'], 0)
+        self.assertEqual(self.tm.get_pending_reminders(), [])
+        self.assertEqual(self.tm.get_shards(), {})
+        self.assertFalse(path.exists())
+
+    def test_deleting_a_project_root_deletes_its_shard(self):
+        path = self.tm.split_project(self.alpha[0])
+        self.assertTrue(self.tm.delete_tasks([self.alpha[0], self.beta[1]]))
+        self.assertEqual(self.tm.get_shards(), {})
+        self.assertFalse(path.exists())
+        self.assertEqual([task['id'] for task in self.tm.get_root_tasks()], [self.beta[0]])
+
+        path = self.tm.split_project(self.beta[0])
+        self.tm.delete_task(self.beta[0])
+        self.assertFalse(path.exists())
+        self.assertEqual(self.tm.get_root_tasks(), [])
+
+    def test_cross_project_reads_keep_shards_attached(self):
+        self.tm.split_project(self.alpha[0])
+        self.tm.get_stats()
+        statements = []
+        shards._view_manager().get_connection().set_trace_callback(statements.append)
+        for _ in range(3):
+            self.tm.get_root_tasks()
+            self.tm.get_stats()
+            self.tm.search('alpha')
+        self.assertFalse([sql for sql in statements if 'ATTACH' in sql])
+
+        # 登记表变化后只 ATTACH 新增的分片
+        self.tm.split_project(self.beta[0])
+        self.assertEqual(len(self.tm.get_root_tasks()), 2)
+        self.assertEqual(len([sql for sql in statements if sql.startswith('ATTACH')]), 2)
+        self.tm.merge_project(self.beta[0])
+        self.assertEqual(len(self.tm.get_root_tasks()), 2)
+
+    def test_export_backup_and_pages_include_shards(self):
+        self.tm.split_project(self.alpha[0])
+        everything = sorted(self.alpha + self.beta)
+        page = self.tm.get_tasks_page(limit=3, filters={'parent_id': None}, include_descendants=True)
+        self.assertEqual([task['id'] for task in page['tasks']], [self.alpha[0], self.beta[0]])
+        self.assertEqual(page['tasks'][0]['children'][0]['id'], self.alpha[1])
+        self.assertEqual([task['id'] for task in self.tm.get_tasks_page(limit=4)['tasks']], everything[:4])
+        self.assertEqual([task['id'] for task in self.tm.get_tasks()], [self.alpha[0], self.beta[0]])
+
+        path = os.path.join(self.tmp_dir, 'tasks.jsonl')
+        self.assertEqual(self.tm.export_tasks(path), len(everything))
+
+        snapshot = self.tm.backup(os.path.join(self.tmp_dir, 'backups'))
+        self.tm.clear_tasks()
+        self.tm.restore_backup(snapshot)
+        self.assertEqual(self.tm.get_shards(), {})
+        self.assertEqual(sorted(row[0] for row in database.fetch_all("SELECT id FROM tasks")), everything)
+        self.assertEqual([row[0] for row in self.tm.get_pending_reminders()], [self.reminder])
+        self.assertEqual(self.tm.check_stats(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from db import database, query_audit
+from logic.task_manager import PAGE_FILTERS, TaskManager
+import query_workload
+
+
+class TestQueryPlans(unittest.TestCase):
+    """Fails the build when a statement the app runs regresses to a scan."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.original_path = database.DATABASE_PATH
+        database.configure(path=os.path.join(self.tmp_dir, 'tasks.db'))
+        database.create_table()
+        self.conn = database.get_connection()
+
+    def tearDown(self):
+        database.configure(path=self.original_path)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_statements_the_app_runs_use_indexes(self):
+        with query_audit.record() as statements:
+            query_workload.run(self.tmp_dir)
+        # 拆分、合并、导入和清空都已覆盖
+        self.assertGreater(len(statements), 100)
+        findings = query_audit.audit(self.conn, statements)
+        self.assertEqual(findings, [], query_audit.report(self.conn, statements))
+
+    def test_recording_traces_every_connection(self):
+        database.execute("INSERT INTO tasks (title) VALUES ('one')")
+        with query_audit.record() as statements:
+            database.fetch_all("SELECT title FROM tasks WHERE description = ?", ('x',))
+            database.fetch_all("SELECT title FROM tasks WHERE description = ?", ('y',))
+            database.fetch_all("SELECT /* full scan */ title FROM tasks")
+            thread = threading.Thread(target=database.fetch_all, args=("SELECT title FROM tasks WHERE id = 1",))
+            thread.start()
+            thread.join()
+        database.fetch_all("SELECT priority FROM tasks WHERE description = 'z'")
+
+        self.assertEqual(sorted(statements), [
+            "SELECT /* full scan */ title FROM tasks",
+            "SELECT title FROM tasks WHERE description = ?",
+            "SELECT title FROM tasks WHERE id = ?",
+        ])
+        findings = query_audit.audit(self.conn, statements)
+        self.assertEqual([(finding.name, finding.kind) for finding in findings],
+                         [("SELECT title FROM tasks WHERE description = ?", 'full_scan')])
+
+    def test_page_filters_use_their_index(self):
+        with query_audit.record() as statements:
+            for column in PAGE_FILTERS:
+                TaskManager().get_tasks_page(limit=10, filters={column: 1})
+        # 主键上的 id 范围不算扫描，但过滤值稀少时会读遍整张表
+        for column in PAGE_FILTERS:
+            details = [detail for sql in statements if f"{column} = ?" in sql
+                       for detail in query_audit.explain(self.conn, sql)]
+            self.assertTrue(any(f"({column}=? AND rowid>?)" in detail for detail in details), details)
+
+    def test_scan_and_temp_btree_are_flagged(self):
+        statements = {'bad': query_audit.Statement("SELECT * FROM tasks WHERE due_date = ? ORDER BY title", False)}
+        kinds = {finding.kind for finding in query_audit.audit(self.conn, statements)}
+        self.assertEqual(kinds, {'full_scan', 'temp_btree'})
+
+    def test_full_scan_marker_still_reports_temp_btree(self):
+        statements = {'marked': query_audit.Statement("SELECT /* full scan */ * FROM tasks ORDER BY title", True)}
+        kinds = [finding.kind for finding in query_audit.audit(self.conn, statements)]
+        self.assertEqual(kinds, ['temp_btree'])
+
+    def test_advisor_creates_composite_index(self):
+        sql = "SELECT id FROM tasks WHERE status = ? ORDER BY due_date"
+        suggestion = query_audit.suggest_index(self.conn, sql)
+        self.assertEqual(suggestion, "CREATE INDEX IF NOT EXISTS idx_tasks_status_due_date ON tasks(status, due_date)")
+
+        query_audit.apply_suggestions([suggestion])
+        statements = {'fixed': query_audit.Statement(sql, False)}
+        self.assertEqual(query_audit.audit(self.conn, statements), [])
+        self.assertIsNone(query_audit.suggest_index(self.conn, sql))
+
+
+if __name__ == '__main__':
+    unittest.main()